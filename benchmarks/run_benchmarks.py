@@ -0,0 +1,251 @@
+"""
+Times the ingest, load, spatial-join and map-rendering stages on synthetic
+data and writes the results as JSON, so runs can be compared across commits.
+Runs fully offline.
+
+    python -m benchmarks.run_benchmarks --scale 10k
+    python -m benchmarks.run_benchmarks --scale 1m --compare benchmarks/results/<baseline>.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import SCALES, TABLE_SHARES, iter_records, park_polygons
+from line_jb.data_ingestion.insert_manager import InsertManager
+from line_jb.geospatial.geo_processor import GeoProcessor
+from line_jb.geospatial.map_renderer import MapRenderer
+
+# Keep per-chunk INFO logs (configured by the line_jb modules) out of the timings
+logging.getLogger().setLevel(logging.WARNING)
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "db", "schema.sql")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# ==========================
+# MEASUREMENT
+# ==========================
+def _current_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return _lifetime_peak_rss_mb() # No /proc (e.g. macOS): the best available stand-in
+
+def _lifetime_peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if platform.system() == "Darwin" else 1024)
+
+class Stage:
+    """
+    Context manager timing one benchmark stage and sampling its peak RSS
+    from a background thread. Fill in rows/output_bytes inside the block.
+    """
+    def __init__(self, results, name, interval=0.02):
+        self.results = results
+        self.record = {"stage": name}
+        self.interval = interval
+        self._done = threading.Event()
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, _current_rss_mb())
+
+    def __enter__(self):
+        self.peak = _current_rss_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        self._start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._start
+        self._done.set()
+        self._thread.join()
+        self.peak = max(self.peak, _current_rss_mb())
+        record = self.record
+        record.setdefault("seconds", elapsed)
+        record["wall_seconds"] = round(elapsed, 4)
+        record["seconds"] = round(record["seconds"], 4)
+        record["peak_rss_mb"] = round(self.peak, 1)
+        if record.get("rows") and record["seconds"] > 0:
+            record["rows_per_sec"] = round(record["rows"] / record["seconds"], 1)
+        self.results.append(record)
+        print(f"  {record['stage']:<45} {record['seconds']:>9.2f}s  "
+              f"{record.get('rows_per_sec', 0):>12,.0f} rows/s  {record['peak_rss_mb']:>8.1f} MB")
+        return False
+
+class TimedIterator:
+    """Wraps a generator and accumulates the time spent producing items, to separate it from the consumer."""
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+        self.seconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            return next(self.iterator)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+def _db_bytes(db_path):
+    return sum(os.path.getsize(p) for p in (db_path, f"{db_path}-wal") if os.path.exists(p))
+
+def _environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__), check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                                    text=True, cwd=os.path.dirname(__file__)).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "sqlite": sqlite3.sqlite_version,
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "geopandas": gpd.__version__,
+    }
+
+# ==========================
+# STAGES
+# ==========================
+def bench_inserts(results, db_path, base_rows, tables, seed):
+    inserter = InsertManager(db_path, schema_path=SCHEMA_PATH)
+    for table_name in tables:
+        rows = max(1, int(base_rows * TABLE_SHARES[table_name]))
+        size_before = _db_bytes(db_path)
+        with Stage(results, f"insert_generic:{table_name}") as record:
+            records = TimedIterator(iter_records(table_name, rows, seed=seed))
+            stats = inserter.insert_dataset(table_name, records)
+            # Synthetic generation is not part of what is being measured
+            record.update(rows=stats["attempted"], seconds=stats["seconds"] - records.seconds,
+                          generate_seconds=round(records.seconds, 4),
+                          write_seconds=round(stats["write_seconds"], 4),
+                          output_bytes=_db_bytes(db_path) - size_before)
+
+def bench_geoprocessing(results, db_path, seed, park_count, map_path):
+    processor = GeoProcessor(db_path)
+    with Stage(results, "load_data_as_geodataframe:nyc_311_requests") as record:
+        complaints = processor.load_data_as_geodataframe(
+            "nyc_311_requests", columns=["unique_key", "created_date", "complaint_type", "borough"]
+        )
+        record["rows"] = len(complaints)
+
+    parks = park_polygons(park_count, seed=seed)
+    with Stage(results, "calculate_historical_event_density") as record:
+        # 311 points stand in for events: the same points-in-parks join, at a larger scale
+        with_counts = processor.calculate_historical_event_density(parks, complaints)
+        record.update(rows=len(complaints), parks=len(parks), matched=int(with_counts["event_count"].sum()))
+    with Stage(results, "calculate_event_density_partitioned") as record:
+        processor.calculate_event_density_partitioned(parks, complaints, partition_col="borough")
+        record.update(rows=len(complaints), parks=len(parks))
+
+    renderer = MapRenderer()
+    with Stage(results, "add_geodataframe_layer:nyc_311_requests") as record:
+        renderer.add_geodataframe_layer(complaints, "311 Requests", color="orange",
+                                        popup_fields=["complaint_type", "created_date"])
+        record["rows"] = len(complaints)
+    with Stage(results, "add_geodataframe_layer:parks") as record:
+        renderer.add_geodataframe_layer(with_counts, "Parks", color="green", popup_fields=["name", "event_count"])
+        record["rows"] = len(with_counts)
+    with Stage(results, "save_map") as record:
+        renderer.save_map(map_path)
+        record["output_bytes"] = os.path.getsize(map_path)
+
+# ==========================
+# COMPARISON
+# ==========================
+def compare(baseline_path, current):
+    """Prints per-stage new/old ratios of time, throughput, memory and output size against a saved run."""
+    with open(baseline_path) as f:
+        saved = json.load(f)
+    baseline = {s["stage"]: s for s in saved["stages"]}
+    print(f"\nCompared with {baseline_path} (new / old):")
+    if saved.get("base_rows") != current["base_rows"]:
+        print(f"  Note: row counts differ ({saved.get('base_rows')} vs {current['base_rows']}); compare rows_per_sec.")
+    for stage in current["stages"]:
+        old = baseline.get(stage["stage"])
+        if not old:
+            continue
+        ratios = []
+        for key in ("seconds", "rows_per_sec", "peak_rss_mb", "output_bytes"):
+            if old.get(key) and stage.get(key) is not None:
+                ratios.append(f"{key} x{stage[key] / old[key]:.2f}")
+        print(f"  {stage['stage']:<45} {'  '.join(ratios)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=list(SCALES), default="10k", help="311 rows; other tables scale with it")
+    parser.add_argument("--rows", type=int, help="Explicit 311 row count (overrides --scale)")
+    parser.add_argument("--tables", nargs="+", choices=list(TABLE_SHARES), default=list(TABLE_SHARES))
+    parser.add_argument("--parks", type=int, default=2000, help="Number of synthetic park polygons")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Where the benchmark database is built (default: a temp dir)")
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/<time>_<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--keep", action="store_true", help="Keep the database and map afterwards")
+    args = parser.parse_args()
+
+    base_rows = args.rows or SCALES[args.scale]
+    workdir = args.workdir or tempfile.mkdtemp(prefix="line_jb_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    db_path = os.path.join(workdir, "bench.db")
+    for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+    results = []
+    print(f"Benchmarking with {base_rows:,} 311 rows in {workdir}")
+    with Stage(results, "initialize_database"):
+        InsertManager.initialize_database(db_path, SCHEMA_PATH)
+    bench_inserts(results, db_path, base_rows, args.tables, args.seed)
+    if "nyc_311_requests" in args.tables:
+        bench_geoprocessing(results, db_path, args.seed, args.parks, os.path.join(workdir, "map.html"))
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "scale": args.scale if not args.rows else None,
+        "base_rows": base_rows,
+        "seed": args.seed,
+        "environment": _environment(),
+        "max_rss_mb": round(_lifetime_peak_rss_mb(), 1),
+        "stages": results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}_{report['environment']['commit'] or 'nocommit'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(args.compare, report)
+    if not args.keep and not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
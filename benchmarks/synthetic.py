@@ -0,0 +1,151 @@
+"""
+Synthetic NYC-shaped records for benchmarking, generated offline.
+
+Records look like the raw Socrata rows the fetchers return (the fields in
+DATASET_SPECS), so they go through the real conversion and insert path.
+Points cluster around the five boroughs, timestamps follow a daily cycle
+over one year, and park polygons are scattered with the same distribution.
+Everything is seeded, so a given (table, rows, seed) is reproducible.
+"""
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+import shapely.affinity
+from line_jb.data_ingestion.dataset_specs import DATASET_SPECS
+
+# Named row counts for the main table; other tables are scaled by TABLE_SHARES
+SCALES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+
+# Rows per 311 request, roughly as in the real datasets
+TABLE_SHARES = {
+    "nyc_311_requests": 1.0,
+    "nyc_311_resolutions": 0.1,
+    "nyc_permitted_events_historical": 0.2,
+    "nyc_permitted_events_future": 0.01,
+    "nyc_parks_events": 0.02,
+    "linknyc_status": 0.002,
+    "nyc_sidewalk_status": 0.1,
+    "nyc_tree_points": 0.1,
+    "social_posts": 0.05,
+}
+
+# (name, latitude, longitude, sd_lat, sd_lon, share of points)
+BOROUGHS = [
+    ("MANHATTAN", 40.7831, -73.9712, 0.035, 0.018, 0.27),
+    ("BROOKLYN", 40.6500, -73.9496, 0.040, 0.045, 0.30),
+    ("QUEENS", 40.7282, -73.7949, 0.045, 0.070, 0.23),
+    ("BRONX", 40.8448, -73.8648, 0.030, 0.035, 0.15),
+    ("STATEN ISLAND", 40.5795, -74.1502, 0.035, 0.045, 0.05),
+]
+NYC_BOUNDS = (-74.2591, 40.4774, -73.7004, 40.9176) # min_lon, min_lat, max_lon, max_lat
+
+# Relative activity by hour of day (quiet overnight, busy late morning and evening)
+HOURLY_WEIGHTS = np.array([3, 2, 1.5, 1, 1, 1.5, 3, 5, 7, 8, 9, 9, 9, 8, 8, 8, 8, 8, 8, 8, 7, 6, 5, 4])
+START_DATE = pd.Timestamp("2024-01-01")
+
+# Plausible values for fields where a made-up vocabulary would distort the benchmark
+VOCABULARIES = {
+    "complaint_type": ["Noise - Residential", "Illegal Parking", "Blocked Driveway", "HEAT/HOT WATER",
+                       "Noise - Street/Sidewalk", "Street Condition", "UNSANITARY CONDITION", "Rodent",
+                       "Dirty Condition", "Water System", "Noise - Commercial", "Sanitation Condition",
+                       "Graffiti", "Sidewalk Condition", "Abandoned Vehicle", "Illegal Dumping"],
+    "agency": ["NYPD", "HPD", "DSNY", "DOT", "DEP", "DOHMH", "DPR"],
+    "status": ["Closed", "Open", "In Progress", "Pending"],
+    "event_type": ["Special Event", "Sport - Adult", "Sport - Youth", "Production Event", "Street Event",
+                   "Parade", "Farmers Market", "Religious Event"],
+    "event_agency": ["Parks Department", "Street Activity Permit Office", "Mayor's Office of Media & Entertainment"],
+    "category": ["Arts", "Fitness", "Nature", "Kids", "Music", "Tours"],
+    "genusspecies": ["Platanus x acerifolia", "Gleditsia triacanthos", "Pyrus calleryana", "Quercus palustris",
+                     "Tilia cordata", "Acer platanoides", "Zelkova serrata"],
+    "tpcondition": ["Excellent", "Good", "Fair", "Poor", "Critical", "Dead"],
+    "wifi_status": ["up", "up", "up", "down"],
+    "tablet_status": ["up", "up", "up", "down"],
+    "phone_status": ["up", "up", "up", "down"],
+    "hashtag": ["nyc", "newyorkcity", "brooklyn", "manhattan", "queens", "bronx", "nycparks", "nycfood"],
+    "platform": ["instagram"],
+}
+BOROUGH_FIELDS = {"borough", "event_borough", "boro"}
+LOCATION_FIELDS = {"location", "event_location", "incident_address", "address"}
+
+# Columns that must be unique per row (the upsert conflict targets)
+UNIQUE_FIELDS = {"unique_key", "event_id", "site_id", "bblid", "objectid", "post_id", "event_name"}
+
+def nyc_points(rng, n):
+    """(lons, lats, borough names) drawn from a mixture around the five boroughs, clipped to NYC."""
+    shares = np.array([b[5] for b in BOROUGHS])
+    which = rng.choice(len(BOROUGHS), size=n, p=shares / shares.sum())
+    centers = np.array([b[1:5] for b in BOROUGHS])[which]
+    lats = rng.normal(centers[:, 0], centers[:, 2])
+    lons = rng.normal(centers[:, 1], centers[:, 3])
+    min_lon, min_lat, max_lon, max_lat = NYC_BOUNDS
+    return (np.clip(lons, min_lon, max_lon), np.clip(lats, min_lat, max_lat),
+            np.array([b[0] for b in BOROUGHS], dtype=object)[which])
+
+def timestamps(rng, n, days=365):
+    """Timestamps over `days` days from START_DATE, following HOURLY_WEIGHTS within each day."""
+    day = rng.integers(0, days, size=n)
+    hour = rng.choice(24, size=n, p=HOURLY_WEIGHTS / HOURLY_WEIGHTS.sum())
+    seconds = rng.integers(0, 3600, size=n)
+    return START_DATE + pd.to_timedelta(day * 86400 + hour * 3600 + seconds, unit="s")
+
+def _column_values(rng, column, n, offset, points, times_text):
+    """Raw values for one ColumnSpec, vectorized over a chunk of n rows."""
+    field = column.source_field
+    if field in UNIQUE_FIELDS:
+        return (np.arange(offset, offset + n) + 1).astype(str).astype(object)
+    if field == "latitude":
+        return points[1]
+    if field == "longitude":
+        return points[0]
+    if field == "geometry":
+        wkt_coords = np.char.add(np.char.mod("%.6f ", points[0]), np.char.mod("%.6f", points[1]))
+        return np.char.add(np.char.add("POINT (", wkt_coords), ")").astype(object)
+    if field in BOROUGH_FIELDS:
+        return points[2]
+    if field in LOCATION_FIELDS:
+        return np.char.add(rng.integers(1, 999, size=n).astype(str),
+                           np.char.add(" STREET ", rng.integers(1, 220, size=n).astype(str))).astype(object)
+    if field in VOCABULARIES:
+        return np.asarray(VOCABULARIES[field], dtype=object)[rng.integers(0, len(VOCABULARIES[field]), size=n)]
+    if field == "content":
+        tags = np.asarray(VOCABULARIES["hashtag"], dtype=object)[rng.integers(0, len(VOCABULARIES["hashtag"]), size=n)]
+        return ("Out and about #" + tags).astype(object)
+    if column.type == "datetime" or field.endswith(("_date", "date", "date_time", "_at", "_on")):
+        return times_text
+    if field == "year":
+        return rng.integers(2020, 2025, size=n)
+    if field == "month":
+        return rng.integers(1, 13, size=n)
+    if column.type == "int":
+        return rng.integers(0, 500, size=n)
+    if column.type == "float":
+        return np.round(rng.uniform(0, 100, size=n), 3)
+    return np.char.add(f"{field} ", rng.integers(0, 50, size=n).astype(str)).astype(object)
+
+def iter_records(table_name, rows, seed=0, chunksize=50000):
+    """Yields `rows` raw records for a DATASET_SPECS table, generated chunk by chunk."""
+    columns = DATASET_SPECS[table_name]
+    rng = np.random.default_rng([seed, sum(map(ord, table_name))])
+    fields = {}
+    for offset in range(0, rows, chunksize):
+        n = min(chunksize, rows - offset)
+        points = nyc_points(rng, n)
+        times_text = timestamps(rng, n).strftime("%Y-%m-%dT%H:%M:%S.000").to_numpy(dtype=object)
+        for column in columns:
+            fields[column.source_field] = _column_values(rng, column, n, offset, points, times_text)
+        yield from pd.DataFrame(fields).to_dict("records")
+
+def park_polygons(count=2000, seed=0):
+    """
+    GeoDataFrame (EPSG:4326) of `count` park-like polygons placed like the
+    points, with log-normal sizes from pocket parks to a few large ones.
+    """
+    rng = np.random.default_rng([seed, 7])
+    lons, lats, boroughs = nyc_points(rng, count)
+    radius_deg = np.clip(rng.lognormal(mean=-6.5, sigma=1.0, size=count), 0.0003, 0.02)
+    circles = shapely.buffer(shapely.points(lons, lats), radius_deg, quad_segs=2)
+    # Stretch east-west, as NYC blocks are longer that way
+    geometries = [shapely.affinity.scale(c, xfact=rng.uniform(1, 2.5), yfact=1.0) for c in circles]
+    return gpd.GeoDataFrame({"name": [f"Park {i}" for i in range(count)], "borough": boroughs},
+                            geometry=geometries, crs="EPSG:4326")
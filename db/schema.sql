@@ -12,6 +12,9 @@ CREATE TABLE IF NOT EXISTS nyc_parks_events (
     attendance TEXT,
     audience TEXT,
     source TEXT,
+    latitude REAL,
+    longitude REAL,
+    park_id INTEGER,
     CONSTRAINT unique_event UNIQUE(event_name, date_and_time, location)
 );
 
@@ -29,7 +32,10 @@ CREATE TABLE IF NOT EXISTS nyc_permitted_events_historical (
 	event_street_side TEXT,
 	street_closure_type TEXT,
 	community_board TEXT,
-	police_precinct TEXT
+	police_precinct TEXT,
+	latitude REAL,
+	longitude REAL,
+	park_id INTEGER
 );
 
 -- NYC Permitted Events (Occurring Within the Next Month)
@@ -46,7 +52,10 @@ CREATE TABLE IF NOT EXISTS nyc_permitted_events_future (
 	event_street_side TEXT,
 	street_closure_type TEXT,
 	community_board TEXT,
-	police_precinct TEXT
+	police_precinct TEXT,
+	latitude REAL,
+	longitude REAL,
+	park_id INTEGER
 );
 
 -- NYC 311 Service Requests
@@ -70,9 +79,31 @@ CREATE TABLE IF NOT EXISTS nyc_311_requests (
 	resolution_action_updated_date TEXT,
 	borough TEXT,
 	latitude REAL,
-	longitude REAL
+	longitude REAL,
+	created_epoch INTEGER
+);
+
+-- Social media posts fetched by hashtag (see line_jb/data_ingestion/social_ingest.py)
+CREATE TABLE IF NOT EXISTS social_posts (
+	id INTEGER PRIMARY KEY AUTOINCREMENT,
+	platform TEXT,
+	post_id TEXT,
+	hashtag TEXT,
+	username TEXT,
+	content TEXT,
+	posted_at TEXT,
+	like_count INTEGER,
+	comment_count INTEGER,
+	media_type INTEGER,
+	url TEXT,
+	latitude REAL,
+	longitude REAL,
+	fetched_at TEXT,
+	UNIQUE (platform, post_id)
 );
 
+CREATE INDEX IF NOT EXISTS social_posts_posted_at ON social_posts(posted_at);
+
 -- NYC 311 Resolution Satisfaction Survey Responses
 CREATE TABLE IF NOT EXISTS nyc_311_resolutions (
 	id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -172,6 +203,324 @@ CREATE TABLE IF NOT EXISTS nyc_tree_points (
 	planteddate TEXT,
 	riskrating TEXT,
 	riskratingdate TEXT,
-	location TEXT
+	location TEXT,
+	longitude REAL,
+	latitude REAL
+);
+
+
+
+-- Incremental sync bookkeeping: per-dataset high-water mark of the last committed fetch
+CREATE TABLE IF NOT EXISTS sync_state (
+	dataset_name TEXT PRIMARY KEY,
+	watermark_column TEXT,
+	watermark TEXT,
+	rows_synced INTEGER DEFAULT 0,
+	updated_at TEXT
+);
+
+-- Spatial index (R*Tree) over 311 request points, kept in sync with the table by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS nyc_311_requests_rtree USING rtree(
+	id,
+	min_lon, max_lon,
+	min_lat, max_lat
+);
+
+CREATE TRIGGER IF NOT EXISTS nyc_311_requests_rtree_insert AFTER INSERT ON nyc_311_requests
+WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+BEGIN
+	INSERT OR REPLACE INTO nyc_311_requests_rtree VALUES (NEW.id, NEW.longitude, NEW.longitude, NEW.latitude, NEW.latitude);
+END;
+
+CREATE TRIGGER IF NOT EXISTS nyc_311_requests_rtree_update AFTER UPDATE OF latitude, longitude ON nyc_311_requests
+BEGIN
+	DELETE FROM nyc_311_requests_rtree WHERE id = OLD.id;
+	INSERT INTO nyc_311_requests_rtree
+	SELECT NEW.id, NEW.longitude, NEW.longitude, NEW.latitude, NEW.latitude
+	WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+END;
+
+CREATE TRIGGER IF NOT EXISTS nyc_311_requests_rtree_delete AFTER DELETE ON nyc_311_requests
+BEGIN
+	DELETE FROM nyc_311_requests_rtree WHERE id = OLD.id;
+END;
+
+-- Spatial index (R*Tree) over LinkNYC kiosk points, kept in sync with the table by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS linknyc_status_rtree USING rtree(
+	id,
+	min_lon, max_lon,
+	min_lat, max_lat
+);
+
+CREATE TRIGGER IF NOT EXISTS linknyc_status_rtree_insert AFTER INSERT ON linknyc_status
+WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+BEGIN
+	INSERT OR REPLACE INTO linknyc_status_rtree VALUES (NEW.id, NEW.longitude, NEW.longitude, NEW.latitude, NEW.latitude);
+END;
+
+CREATE TRIGGER IF NOT EXISTS linknyc_status_rtree_update AFTER UPDATE OF latitude, longitude ON linknyc_status
+BEGIN
+	DELETE FROM linknyc_status_rtree WHERE id = OLD.id;
+	INSERT INTO linknyc_status_rtree
+	SELECT NEW.id, NEW.longitude, NEW.longitude, NEW.latitude, NEW.latitude
+	WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+END;
+
+CREATE TRIGGER IF NOT EXISTS linknyc_status_rtree_delete AFTER DELETE ON linknyc_status
+BEGIN
+	DELETE FROM linknyc_status_rtree WHERE id = OLD.id;
+END;
+
+-- Spatial index (R*Tree) over street tree points (decoded from their WKT geometry at ingest), kept in sync with the table by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS nyc_tree_points_rtree USING rtree(
+	id,
+	min_lon, max_lon,
+	min_lat, max_lat
+);
+
+CREATE TRIGGER IF NOT EXISTS nyc_tree_points_rtree_insert AFTER INSERT ON nyc_tree_points
+WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+BEGIN
+	INSERT OR REPLACE INTO nyc_tree_points_rtree VALUES (NEW.id, NEW.longitude, NEW.longitude, NEW.latitude, NEW.latitude);
+END;
+
+CREATE TRIGGER IF NOT EXISTS nyc_tree_points_rtree_update AFTER UPDATE OF latitude, longitude ON nyc_tree_points
+BEGIN
+	DELETE FROM nyc_tree_points_rtree WHERE id = OLD.id;
+	INSERT INTO nyc_tree_points_rtree
+	SELECT NEW.id, NEW.longitude, NEW.longitude, NEW.latitude, NEW.latitude
+	WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+END;
+
+CREATE TRIGGER IF NOT EXISTS nyc_tree_points_rtree_delete AFTER DELETE ON nyc_tree_points
+BEGIN
+	DELETE FROM nyc_tree_points_rtree WHERE id = OLD.id;
+END;
+
+-- Park polygons used to assign events to parks (loaded from OSM by ParkIndex)
+CREATE TABLE IF NOT EXISTS parks (
+	park_id INTEGER PRIMARY KEY AUTOINCREMENT,
+	osm_key TEXT UNIQUE,
+	name TEXT,
+	geometry_wkb BLOB
+);
+
+-- Per-park event totals, maintained incrementally as events are assigned
+CREATE TABLE IF NOT EXISTS park_event_counts (
+	park_id INTEGER,
+	dataset_name TEXT,
+	event_count INTEGER DEFAULT 0,
+	PRIMARY KEY (park_id, dataset_name)
+);
+
+-- Events still waiting for a park assignment (park_id 0 means "in no park")
+CREATE INDEX IF NOT EXISTS nyc_parks_events_park_pending ON nyc_parks_events(park_id) WHERE park_id IS NULL;
+CREATE INDEX IF NOT EXISTS nyc_permitted_events_historical_park_pending ON nyc_permitted_events_historical(park_id) WHERE park_id IS NULL;
+CREATE INDEX IF NOT EXISTS nyc_permitted_events_future_park_pending ON nyc_permitted_events_future(park_id) WHERE park_id IS NULL;
+
+-- Resolved coordinates per distinct event location string (see line_jb/geospatial/geocoder.py)
+CREATE TABLE IF NOT EXISTS geocode_cache (
+	location TEXT PRIMARY KEY,
+	latitude REAL,
+	longitude REAL,
+	match_type TEXT,
+	geocoded_at TEXT
+);
+
+-- Lookups of event rows by location when geocoded coordinates are written back
+CREATE INDEX IF NOT EXISTS nyc_parks_events_location ON nyc_parks_events(location);
+CREATE INDEX IF NOT EXISTS nyc_permitted_events_historical_location ON nyc_permitted_events_historical(event_location);
+CREATE INDEX IF NOT EXISTS nyc_permitted_events_future_location ON nyc_permitted_events_future(event_location);
+
+-- A changed location invalidates the event's coordinates and park assignment
+CREATE TRIGGER IF NOT EXISTS nyc_parks_events_relocate AFTER UPDATE OF location ON nyc_parks_events
+WHEN OLD.location IS NOT NEW.location
+BEGIN
+	UPDATE park_event_counts SET event_count = event_count - 1
+	WHERE park_id = OLD.park_id AND dataset_name = 'nyc_parks_events';
+	UPDATE nyc_parks_events SET latitude = NULL, longitude = NULL, park_id = NULL WHERE rowid = NEW.rowid;
+END;
+
+-- A changed location invalidates the event's coordinates and park assignment
+CREATE TRIGGER IF NOT EXISTS nyc_permitted_events_historical_relocate AFTER UPDATE OF event_location ON nyc_permitted_events_historical
+WHEN OLD.event_location IS NOT NEW.event_location
+BEGIN
+	UPDATE park_event_counts SET event_count = event_count - 1
+	WHERE park_id = OLD.park_id AND dataset_name = 'nyc_permitted_events_historical';
+	UPDATE nyc_permitted_events_historical SET latitude = NULL, longitude = NULL, park_id = NULL WHERE rowid = NEW.rowid;
+END;
+
+-- A changed location invalidates the event's coordinates and park assignment
+CREATE TRIGGER IF NOT EXISTS nyc_permitted_events_future_relocate AFTER UPDATE OF event_location ON nyc_permitted_events_future
+WHEN OLD.event_location IS NOT NEW.event_location
+BEGIN
+	UPDATE park_event_counts SET event_count = event_count - 1
+	WHERE park_id = OLD.park_id AND dataset_name = 'nyc_permitted_events_future';
+	UPDATE nyc_permitted_events_future SET latitude = NULL, longitude = NULL, park_id = NULL WHERE rowid = NEW.rowid;
+END;
+
+-- Time-decayed nuisance score per OSM street edge (see line_jb/geospatial/street_scoring.py).
+-- log_decay_sum is log(sum(weight * exp(rate * (t - epoch)))), kept in the log domain so it
+-- cannot overflow however short the half-life; it is decayed to the query time on read.
+CREATE TABLE IF NOT EXISTS edge_nuisance (
+	u INTEGER,
+	v INTEGER,
+	key INTEGER,
+	log_decay_sum REAL,
+	complaints INTEGER DEFAULT 0,
+	PRIMARY KEY (u, v, key)
+);
+
+-- Recent complaints, kiosk outages and risky trees near each located event
+-- (see line_jb/geospatial/proximity.py). Keyed for per-event lookups.
+CREATE TABLE IF NOT EXISTS event_nearby (
+	event_table TEXT,
+	event_rowid INTEGER,
+	item_table TEXT,
+	item_id INTEGER,
+	distance_ft REAL,
+	item_time INTEGER,
+	PRIMARY KEY (event_table, event_rowid, item_table, item_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS event_nearby_item_time ON event_nearby(item_table, item_time);
+
+-- Event coordinates that event_nearby was computed for; a mismatch means the event moved
+CREATE TABLE IF NOT EXISTS event_nearby_events (
+	event_table TEXT,
+	event_rowid INTEGER,
+	latitude REAL,
+	longitude REAL,
+	PRIMARY KEY (event_table, event_rowid)
+);
+
+CREATE INDEX IF NOT EXISTS event_nearby_item ON event_nearby(item_table, item_id);
+
+-- Already matched items that were updated in place or deleted since; the next
+-- refresh recomputes their pairs. Only rows up to the id kept in sync_state
+-- ('event_nearby:<table>') are recorded, later ones are picked up as new items.
+CREATE TABLE IF NOT EXISTS event_nearby_dirty_items (
+	item_table TEXT,
+	item_id INTEGER,
+	PRIMARY KEY (item_table, item_id)
+) WITHOUT ROWID;
+
+-- Upserted rows re-fire these with unchanged values, hence the change checks
+CREATE TRIGGER IF NOT EXISTS nyc_311_nearby_update
+AFTER UPDATE OF created_date, latitude, longitude ON nyc_311_requests
+WHEN OLD.id <= COALESCE((SELECT CAST(watermark AS INTEGER) FROM sync_state
+		WHERE dataset_name = 'event_nearby:nyc_311_requests'), 0)
+	AND (OLD.created_date IS NOT NEW.created_date OR OLD.latitude IS NOT NEW.latitude
+	OR OLD.longitude IS NOT NEW.longitude)
+BEGIN
+	INSERT OR IGNORE INTO event_nearby_dirty_items (item_table, item_id) VALUES ('nyc_311_requests', OLD.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS nyc_311_nearby_delete AFTER DELETE ON nyc_311_requests
+WHEN OLD.id <= COALESCE((SELECT CAST(watermark AS INTEGER) FROM sync_state
+		WHERE dataset_name = 'event_nearby:nyc_311_requests'), 0)
+BEGIN
+	INSERT OR IGNORE INTO event_nearby_dirty_items (item_table, item_id) VALUES ('nyc_311_requests', OLD.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS nyc_tree_points_nearby_update
+AFTER UPDATE OF riskrating, latitude, longitude ON nyc_tree_points
+WHEN OLD.id <= COALESCE((SELECT CAST(watermark AS INTEGER) FROM sync_state
+		WHERE dataset_name = 'event_nearby:nyc_tree_points'), 0)
+	AND (OLD.riskrating IS NOT NEW.riskrating OR OLD.latitude IS NOT NEW.latitude
+	OR OLD.longitude IS NOT NEW.longitude)
+BEGIN
+	INSERT OR IGNORE INTO event_nearby_dirty_items (item_table, item_id) VALUES ('nyc_tree_points', OLD.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS nyc_tree_points_nearby_delete AFTER DELETE ON nyc_tree_points
+WHEN OLD.id <= COALESCE((SELECT CAST(watermark AS INTEGER) FROM sync_state
+		WHERE dataset_name = 'event_nearby:nyc_tree_points'), 0)
+BEGIN
+	INSERT OR IGNORE INTO event_nearby_dirty_items (item_table, item_id) VALUES ('nyc_tree_points', OLD.id);
+END;
+
+-- 311 request counts (see line_jb/analytics/rollups.py), so trend and peak-time
+-- queries never scan nyc_311_requests. New rows are folded in per inserted batch
+-- up to the id kept in sync_state ('rollup:nyc_311_requests'); the triggers below
+-- correct the counts when an already counted row is updated or deleted. Buckets are
+-- integer epoch seconds of the local wall-clock time; geo cells are 0.01 degree
+-- squares numbered CAST((lat + 90) * 100) * 100000 + CAST((lon + 180) * 100).
+CREATE TABLE IF NOT EXISTS nyc_311_hourly (
+	hour_start INTEGER,
+	complaint_type TEXT,
+	borough TEXT,
+	request_count INTEGER DEFAULT 0,
+	PRIMARY KEY (hour_start, complaint_type, borough)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS nyc_311_daily_cells (
+	day_start INTEGER,
+	complaint_type TEXT,
+	borough TEXT,
+	cell_id INTEGER,
+	request_count INTEGER DEFAULT 0,
+	PRIMARY KEY (day_start, complaint_type, borough, cell_id)
+) WITHOUT ROWID;
+
+-- The insert trigger is replaced by per-batch folding; the other two are recreated
+-- so databases built with the earlier unguarded versions pick up the id check
+DROP TRIGGER IF EXISTS nyc_311_rollup_insert;
+DROP TRIGGER IF EXISTS nyc_311_rollup_update;
+DROP TRIGGER IF EXISTS nyc_311_rollup_delete;
+
+-- Upserted rows re-fire this with unchanged values, hence the change check
+CREATE TRIGGER IF NOT EXISTS nyc_311_rollup_update
+AFTER UPDATE OF created_epoch, complaint_type, borough, latitude, longitude ON nyc_311_requests
+WHEN OLD.id <= COALESCE((SELECT CAST(watermark AS INTEGER) FROM sync_state
+		WHERE dataset_name = 'rollup:nyc_311_requests'), 0)
+	AND (OLD.created_epoch IS NOT NEW.created_epoch OR OLD.complaint_type IS NOT NEW.complaint_type
+	OR OLD.borough IS NOT NEW.borough OR OLD.latitude IS NOT NEW.latitude OR OLD.longitude IS NOT NEW.longitude)
+BEGIN
+	UPDATE nyc_311_hourly SET request_count = request_count - 1
+	WHERE hour_start = OLD.created_epoch - OLD.created_epoch % 3600
+		AND complaint_type = COALESCE(OLD.complaint_type, 'N/A') AND borough = COALESCE(OLD.borough, 'N/A');
+	UPDATE nyc_311_daily_cells SET request_count = request_count - 1
+	WHERE day_start = OLD.created_epoch - OLD.created_epoch % 86400
+		AND complaint_type = COALESCE(OLD.complaint_type, 'N/A') AND borough = COALESCE(OLD.borough, 'N/A')
+		AND cell_id = CAST((OLD.latitude + 90) * 100 AS INTEGER) * 100000 + CAST((OLD.longitude + 180) * 100 AS INTEGER);
+	INSERT INTO nyc_311_hourly (hour_start, complaint_type, borough, request_count)
+	SELECT NEW.created_epoch - NEW.created_epoch % 3600, COALESCE(NEW.complaint_type, 'N/A'),
+		COALESCE(NEW.borough, 'N/A'), 1
+	WHERE NEW.created_epoch IS NOT NULL
+	ON CONFLICT(hour_start, complaint_type, borough) DO UPDATE SET request_count = request_count + 1;
+	INSERT INTO nyc_311_daily_cells (day_start, complaint_type, borough, cell_id, request_count)
+	SELECT NEW.created_epoch - NEW.created_epoch % 86400, COALESCE(NEW.complaint_type, 'N/A'),
+		COALESCE(NEW.borough, 'N/A'),
+		CAST((NEW.latitude + 90) * 100 AS INTEGER) * 100000 + CAST((NEW.longitude + 180) * 100 AS INTEGER), 1
+	WHERE NEW.created_epoch IS NOT NULL AND NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+	ON CONFLICT(day_start, complaint_type, borough, cell_id) DO UPDATE SET request_count = request_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS nyc_311_rollup_delete AFTER DELETE ON nyc_311_requests
+WHEN OLD.id <= COALESCE((SELECT CAST(watermark AS INTEGER) FROM sync_state
+		WHERE dataset_name = 'rollup:nyc_311_requests'), 0)
+BEGIN
+	UPDATE nyc_311_hourly SET request_count = request_count - 1
+	WHERE hour_start = OLD.created_epoch - OLD.created_epoch % 3600
+		AND complaint_type = COALESCE(OLD.complaint_type, 'N/A') AND borough = COALESCE(OLD.borough, 'N/A');
+	UPDATE nyc_311_daily_cells SET request_count = request_count - 1
+	WHERE day_start = OLD.created_epoch - OLD.created_epoch % 86400
+		AND complaint_type = COALESCE(OLD.complaint_type, 'N/A') AND borough = COALESCE(OLD.borough, 'N/A')
+		AND cell_id = CAST((OLD.latitude + 90) * 100 AS INTEGER) * 100000 + CAST((OLD.longitude + 180) * 100 AS INTEGER);
+END;
+
+-- "Trending now" alerts from the streaming detector (see line_jb/analytics/streaming.py)
+CREATE TABLE IF NOT EXISTS trend_events (
+	id INTEGER PRIMARY KEY AUTOINCREMENT,
+	source TEXT,
+	trend_key TEXT,
+	bucket_start INTEGER,
+	observed INTEGER,
+	expected REAL,
+	score REAL,
+	detected_at TEXT,
+	UNIQUE (source, trend_key, bucket_start)
 );
 
+CREATE INDEX IF NOT EXISTS trend_events_bucket ON trend_events(bucket_start);
@@ -0,0 +1,218 @@
+import logging
+import sqlite3
+import geopandas as gpd
+import pandas as pd
+import shapely
+
+logging.basicConfig(level=logging.INFO)
+
+# Bucket widths in seconds; weeks start on Monday (1970-01-05 is the first one)
+FREQ_SECONDS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+WEEK_OFFSET = 4 * 86400
+# Side of a geo cell in degrees; must match the cell_id expression in db/schema.sql
+CELL_DEG = 0.01
+
+def to_epoch(value):
+    """Epoch seconds for a date/datetime (string or Timestamp), read as local wall-clock time."""
+    return pd.Timestamp(value).tz_localize(None).value // 10**9
+
+ROLLUP_STATE_KEY = "rollup:nyc_311_requests"
+_CELL_ID_SQL = "CAST((latitude + 90) * 100 AS INTEGER) * 100000 + CAST((longitude + 180) * 100 AS INTEGER)"
+
+class ComplaintRollups:
+    """
+    Maintains and queries the 311 rollup tables (nyc_311_hourly and
+    nyc_311_daily_cells). New requests are folded in per inserted batch with
+    one grouped upsert, and the triggers in db/schema.sql adjust the counts
+    when a request already folded in is updated or deleted. Every query reads
+    a few thousand pre-aggregated rows rather than the raw requests.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def _get_connection(self):
+        return sqlite3.connect(self.db_path, timeout=60)
+
+    # ==========================
+    # MAINTENANCE
+    # ==========================
+    def update(self, conn=None):
+        """
+        Folds requests added since the last call into the rollups; returns the
+        number folded. Pass `conn` to run inside an open transaction.
+        """
+        own_conn = conn is None
+        conn = conn or self._get_connection()
+        row = conn.execute("SELECT watermark FROM sync_state WHERE dataset_name = ?;",
+                           (ROLLUP_STATE_KEY,)).fetchone()
+        if row is None:
+            # Never built (or built by per-row triggers): recount from scratch. A database
+            # whose schema predates the batch fold may still carry the old insert
+            # trigger, which would count every new request a second time.
+            conn.execute("DROP TRIGGER IF EXISTS nyc_311_rollup_insert;")
+            conn.execute("DELETE FROM nyc_311_hourly;")
+            conn.execute("DELETE FROM nyc_311_daily_cells;")
+        last_id = int(row[0]) if row else 0
+        max_id = conn.execute("SELECT MAX(id) FROM nyc_311_requests;").fetchone()[0] or last_id
+        if max_id > last_id:
+            conn.execute(
+                """
+                INSERT INTO nyc_311_hourly (hour_start, complaint_type, borough, request_count)
+                SELECT created_epoch - created_epoch % 3600 AS hour_start, COALESCE(complaint_type, 'N/A') AS ct,
+                       COALESCE(borough, 'N/A') AS b, COUNT(*)
+                FROM nyc_311_requests WHERE id > ? AND id <= ? AND created_epoch IS NOT NULL
+                GROUP BY hour_start, ct, b
+                ON CONFLICT(hour_start, complaint_type, borough) DO UPDATE SET
+                    request_count = request_count + excluded.request_count;
+                """,
+                (last_id, max_id),
+            )
+            conn.execute(
+                f"""
+                INSERT INTO nyc_311_daily_cells (day_start, complaint_type, borough, cell_id, request_count)
+                SELECT created_epoch - created_epoch % 86400 AS day_start, COALESCE(complaint_type, 'N/A') AS ct,
+                       COALESCE(borough, 'N/A') AS b, {_CELL_ID_SQL} AS cell, COUNT(*)
+                FROM nyc_311_requests
+                WHERE id > ? AND id <= ? AND created_epoch IS NOT NULL
+                    AND latitude IS NOT NULL AND longitude IS NOT NULL
+                GROUP BY day_start, ct, b, cell
+                ON CONFLICT(day_start, complaint_type, borough, cell_id) DO UPDATE SET
+                    request_count = request_count + excluded.request_count;
+                """,
+                (last_id, max_id),
+            )
+        conn.execute(
+            """
+            INSERT INTO sync_state (dataset_name, watermark_column, watermark, rows_synced, updated_at)
+            VALUES (?, 'id', ?, ?, datetime('now'))
+            ON CONFLICT(dataset_name) DO UPDATE SET
+                watermark = excluded.watermark, rows_synced = sync_state.rows_synced + excluded.rows_synced,
+                updated_at = excluded.updated_at;
+            """,
+            (ROLLUP_STATE_KEY, str(max_id), max_id - last_id),
+        )
+        if own_conn:
+            conn.commit()
+            conn.close()
+        return max_id - last_id
+
+    def batch_hook(self, conn, dataset_name, rows):
+        """InsertManager batch hook: folds the requests a chunk just inserted."""
+        self.update(conn)
+
+    @staticmethod
+    def _filters(time_col, start=None, end=None, complaint_types=None, boroughs=None):
+        """WHERE clause and parameters for the common filters; end is exclusive."""
+        clauses, params = ["request_count > 0"], []
+        if start is not None:
+            clauses.append(f"{time_col} >= ?")
+            params.append(to_epoch(start))
+        if end is not None:
+            clauses.append(f"{time_col} < ?")
+            params.append(to_epoch(end))
+        for column, values in (("complaint_type", complaint_types), ("borough", boroughs)):
+            if values:
+                values = [values] if isinstance(values, str) else list(values)
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        return " AND ".join(clauses), params
+
+    def _query(self, sql, params):
+        conn = self._get_connection()
+        frame = pd.read_sql_query(sql, conn, params=params)
+        conn.close()
+        return frame
+
+    # ==========================
+    # TRENDS
+    # ==========================
+    def trend(self, freq="day", by=None, start=None, end=None, complaint_types=None, boroughs=None):
+        """
+        Request counts per hour, day or week, optionally split by
+        "complaint_type" or "borough". Returns period, [by], request_count.
+        """
+        if freq not in FREQ_SECONDS:
+            raise ValueError(f"freq must be one of {list(FREQ_SECONDS)}, got {freq!r}")
+        if by not in (None, "complaint_type", "borough"):
+            raise ValueError(f"Cannot split trends by {by!r}")
+        width = FREQ_SECONDS[freq]
+        offset = WEEK_OFFSET if freq == "week" else 0
+        where, params = self._filters("hour_start", start, end, complaint_types, boroughs)
+        group = f", {by}" if by else ""
+        frame = self._query(
+            f"""
+            SELECT ((hour_start - {offset}) / {width}) * {width} + {offset} AS period{group},
+                   SUM(request_count) AS request_count
+            FROM nyc_311_hourly WHERE {where}
+            GROUP BY period{group} ORDER BY period{group};
+            """,
+            params,
+        )
+        frame["period"] = pd.to_datetime(frame["period"], unit="s")
+        return frame
+
+    def top_complaint_types(self, start=None, end=None, boroughs=None, limit=10):
+        """The most frequent complaint types in a window, most frequent first."""
+        where, params = self._filters("hour_start", start, end, boroughs=boroughs)
+        return self._query(
+            f"""
+            SELECT complaint_type, SUM(request_count) AS request_count
+            FROM nyc_311_hourly WHERE {where}
+            GROUP BY complaint_type ORDER BY request_count DESC LIMIT ?;
+            """,
+            params + [limit],
+        )
+
+    # ==========================
+    # PEAK TIMES
+    # ==========================
+    def peak_hours(self, start=None, end=None, complaint_types=None, boroughs=None):
+        """
+        Request counts by weekday (rows, Monday = 0) and hour of day (columns),
+        a 7 x 24 table with zeros where nothing was reported.
+        """
+        where, params = self._filters("hour_start", start, end, complaint_types, boroughs)
+        frame = self._query(
+            f"""
+            SELECT (hour_start / 86400 + 3) % 7 AS weekday, (hour_start % 86400) / 3600 AS hour,
+                   SUM(request_count) AS request_count
+            FROM nyc_311_hourly WHERE {where}
+            GROUP BY weekday, hour;
+            """,
+            params,
+        )
+        table = frame.pivot(index="weekday", columns="hour", values="request_count")
+        return table.reindex(index=range(7), columns=range(24)).fillna(0).astype(int)
+
+    def busiest_hours(self, top_n=10, start=None, end=None, complaint_types=None, boroughs=None):
+        """The individual hours with the most requests, busiest first."""
+        where, params = self._filters("hour_start", start, end, complaint_types, boroughs)
+        frame = self._query(
+            f"""
+            SELECT hour_start, SUM(request_count) AS request_count
+            FROM nyc_311_hourly WHERE {where}
+            GROUP BY hour_start ORDER BY request_count DESC LIMIT ?;
+            """,
+            params + [top_n],
+        )
+        frame["hour_start"] = pd.to_datetime(frame["hour_start"], unit="s")
+        return frame
+
+    # ==========================
+    # GEO CELLS
+    # ==========================
+    def cell_counts(self, start=None, end=None, complaint_types=None, boroughs=None):
+        """Request counts per geo cell as a GeoDataFrame of cell squares (EPSG:4326)."""
+        where, params = self._filters("day_start", start, end, complaint_types, boroughs)
+        frame = self._query(
+            f"""
+            SELECT cell_id, SUM(request_count) AS request_count
+            FROM nyc_311_daily_cells WHERE {where}
+            GROUP BY cell_id;
+            """,
+            params,
+        )
+        min_lat = (frame["cell_id"] // 100000).to_numpy() * CELL_DEG - 90
+        min_lon = (frame["cell_id"] % 100000).to_numpy() * CELL_DEG - 180
+        cells = shapely.box(min_lon, min_lat, min_lon + CELL_DEG, min_lat + CELL_DEG)
+        return gpd.GeoDataFrame(frame, geometry=cells, crs="EPSG:4326")
@@ -0,0 +1,466 @@
+import heapq
+import logging
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import zlib
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from line_jb.analytics.rollups import ROLLUP_STATE_KEY
+
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_BUCKET_SECONDS = 3600
+HASHTAG_PATTERN = re.compile(r"#(\w+)")
+_MERSENNE_PRIME = (1 << 61) - 1
+
+# ==========================
+# BOUNDED-MEMORY SUMMARIES
+# ==========================
+def key_hashes(keys):
+    """Stable 32-bit hashes of string keys (the same in every process, unlike hash())."""
+    return np.fromiter((zlib.crc32(key.encode("utf-8")) for key in keys), dtype="uint64", count=len(keys))
+
+class CountMinSketch:
+    """
+    Approximate counts for any number of keys in width x depth counters.
+    Estimates never undercount; they overcount by at most 2N/width with
+    probability 1 - 2^-depth, where N is the total added.
+    """
+    def __init__(self, width=4096, depth=4, seed=0):
+        self.width = width
+        self.depth = depth
+        rng = np.random.default_rng(seed)
+        # One (a*h + b) mod p hash per row over the key's crc32; a < 2^31 keeps a*h in uint64
+        self._a = rng.integers(1, 1 << 31, size=(depth, 1), dtype="uint64")
+        self._b = rng.integers(0, 1 << 32, size=(depth, 1), dtype="uint64")
+        self.table = np.zeros((depth, width), dtype="int64")
+
+    def _columns(self, hashes):
+        mixed = (self._a * hashes[None, :] + self._b) % np.uint64(_MERSENNE_PRIME)
+        return (mixed % np.uint64(self.width)).astype("int64")
+
+    def add(self, hashes, counts=1):
+        columns = self._columns(hashes)
+        counts = np.broadcast_to(np.asarray(counts, dtype="int64"), hashes.shape)
+        for row in range(self.depth):
+            np.add.at(self.table[row], columns[row], counts)
+
+    def estimate(self, hashes):
+        if len(hashes) == 0:
+            return np.zeros(0, dtype="int64")
+        columns = self._columns(hashes)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def clear(self):
+        self.table[:] = 0
+
+class SpaceSaving:
+    """
+    Heavy hitters over a stream in `capacity` counters (Metwally et al.).
+    Any key with more than N/capacity occurrences is guaranteed to be kept;
+    a kept key's count overestimates its true count by at most its error.
+    """
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self._heap = [] # (count, key), may hold stale entries
+
+    def add(self, key, count=1):
+        if key in self.counts:
+            self.counts[key] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = count
+            self.errors[key] = 0
+        else:
+            # Replace the smallest counter; the newcomer inherits its count as error
+            while True:
+                smallest, victim = heapq.heappop(self._heap)
+                if self.counts.get(victim) == smallest:
+                    break
+            del self.counts[victim], self.errors[victim]
+            self.counts[key] = smallest + count
+            self.errors[key] = smallest
+        heapq.heappush(self._heap, (self.counts[key], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(c, k) for k, c in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def top(self, n=None):
+        """(key, count, error) for the n largest counters, largest first."""
+        ranked = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:n]
+        return [(key, count, self.errors[key]) for key, count in ranked]
+
+    def clear(self):
+        self.counts.clear()
+        self.errors.clear()
+        self._heap.clear()
+
+# ==========================
+# TREND DETECTION
+# ==========================
+@dataclass
+class TrendEvent:
+    source: str
+    trend_key: str
+    bucket_start: int
+    observed: int
+    expected: float
+    score: float
+
+class _OpenBucket:
+    def __init__(self, width, depth, heavy_hitters):
+        self.sketch = CountMinSketch(width, depth)
+        self.heavy = SpaceSaving(heavy_hitters)
+
+class TrendDetector:
+    """
+    Flags keys whose count in a time bucket jumps well above their own
+    exponentially weighted moving average. Each record costs one sketch
+    update and one heavy-hitter update; per-key baselines (EWMA mean and
+    variance) are kept for at most `max_keys` keys, so memory stays bounded
+    however many distinct keys stream past and history is never re-read.
+
+    Records may arrive up to `lateness_buckets` buckets out of order; older
+    ones are dropped and counted in `late_records`. Nothing is reported
+    until `warmup_buckets` buckets have closed, so baselines can settle,
+    unless they were seeded from historical counts (see seed).
+    """
+    def __init__(self, source, bucket_seconds=DEFAULT_BUCKET_SECONDS, alpha=0.1, threshold=4.0,
+                 min_count=10, warmup_buckets=24, lateness_buckets=2, max_keys=5000,
+                 heavy_hitters=500, sketch_width=4096, sketch_depth=4):
+        self.source = source
+        self.bucket_seconds = bucket_seconds
+        self.alpha = alpha
+        self.threshold = threshold
+        self.min_count = min_count
+        self.warmup_buckets = warmup_buckets
+        self.lateness_buckets = lateness_buckets
+        self.max_keys = max_keys
+        self.heavy_hitters = heavy_hitters
+        self.sketch_shape = (sketch_width, sketch_depth)
+
+        self.open_buckets = {} # bucket number -> _OpenBucket
+        self.baselines = {}    # key -> [mean, variance, crc32]
+        self.last_closed = None
+        self.closed_buckets = 0
+        self.late_records = 0
+
+    def observe(self, keys, timestamps):
+        """
+        Feeds one batch of (key, epoch seconds) records; returns the
+        TrendEvents of any buckets the batch closed.
+        """
+        timestamps = np.asarray(timestamps, dtype="float64")
+        valid = np.isfinite(timestamps)
+        keys = np.asarray(keys, dtype=object)[valid]
+        buckets = (timestamps[valid] // self.bucket_seconds).astype("int64")
+        events = []
+        if len(buckets) == 0:
+            return events
+        order = np.argsort(buckets, kind="stable")
+        keys, buckets = keys[order], buckets[order]
+        # Buckets in ascending order, so later buckets close earlier ones as they open
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        for start, end in zip(starts, np.r_[starts[1:], len(buckets)]):
+            bucket = int(buckets[start])
+            newest = max(self.open_buckets, default=bucket)
+            if bucket < newest - self.lateness_buckets or (self.last_closed is not None and bucket <= self.last_closed):
+                self.late_records += int(end - start)
+                continue
+            for old in sorted(b for b in self.open_buckets if b < bucket - self.lateness_buckets):
+                events.extend(self._close(old))
+            self._add(bucket, keys[start:end])
+        return events
+
+    def seed(self, history):
+        """
+        Initializes the baselines from historical counts instead of replaying
+        every record. `history` has bucket_start (epoch seconds), trend_key and
+        count columns, e.g. from a rollup table. Buckets within
+        `lateness_buckets` of the newest stay open, so records still arriving
+        for them are added on top of the seeded counts.
+        """
+        if history.empty:
+            return
+        buckets = history["bucket_start"].to_numpy(dtype="int64") // self.bucket_seconds
+        table = (pd.DataFrame({"bucket": buckets, "key": history["trend_key"].astype(str).to_numpy(),
+                               "count": history["count"].to_numpy(dtype="int64")})
+                 .groupby(["bucket", "key"])["count"].sum().unstack("key", fill_value=0))
+        newest = int(table.index.max())
+        table = table.reindex(range(int(table.index.min()), newest + 1), fill_value=0)
+        closed = table.loc[:newest - self.lateness_buckets - 1]
+
+        # The same EWMA updates _close makes, one bucket at a time for all keys at once
+        means = np.zeros(table.shape[1])
+        variances = np.zeros(table.shape[1])
+        for counts in closed.to_numpy(dtype="float64"):
+            diff = counts - means
+            means = means + self.alpha * diff
+            variances = (1 - self.alpha) * (variances + self.alpha * diff * diff)
+        keys = table.columns.tolist()
+        hashes = key_hashes(keys).tolist()
+        ranked = sorted((i for i in range(len(keys)) if means[i] > 0), key=lambda i: means[i], reverse=True)
+        self.baselines = {keys[i]: [float(means[i]), float(variances[i]), int(hashes[i])]
+                          for i in ranked[:self.max_keys]}
+        if len(closed):
+            self.last_closed = int(closed.index[-1])
+            self.closed_buckets += len(closed)
+
+        for bucket, counts in table.loc[newest - self.lateness_buckets:].iterrows():
+            present = counts.to_numpy() > 0
+            if present.any():
+                self._add_counts(int(bucket), np.asarray(keys, dtype=object)[present],
+                                 counts.to_numpy(dtype="int64")[present])
+
+    def _add(self, bucket, keys):
+        unique, counts = np.unique(keys.astype(str), return_counts=True)
+        self._add_counts(bucket, unique, counts)
+
+    def _add_counts(self, bucket, unique, counts):
+        if bucket not in self.open_buckets:
+            self.open_buckets[bucket] = _OpenBucket(*self.sketch_shape, self.heavy_hitters)
+        state = self.open_buckets[bucket]
+        state.sketch.add(key_hashes(unique), counts)
+        for key, count in zip(unique.tolist(), counts.tolist()):
+            state.heavy.add(key, count)
+
+    def _close(self, bucket):
+        """Scores a finished bucket against the baselines, then folds it into them."""
+        state = self.open_buckets.pop(bucket)
+        if self.last_closed is not None and bucket - self.last_closed > 1:
+            # Empty buckets in between: decay every baseline towards zero
+            decay = (1 - self.alpha) ** (bucket - self.last_closed - 1)
+            for baseline in self.baselines.values():
+                baseline[0] *= decay
+                baseline[1] *= decay
+
+        heavy = {key: count for key, count, _ in state.heavy.top()}
+        for key in heavy:
+            if key not in self.baselines:
+                self.baselines[key] = [0.0, 0.0, int(key_hashes([key])[0])]
+        tracked = list(self.baselines)
+        estimates = state.sketch.estimate(np.array([self.baselines[k][2] for k in tracked], dtype="uint64"))
+
+        events = []
+        warmed_up = self.closed_buckets >= self.warmup_buckets
+        for key, estimate in zip(tracked, estimates.tolist()):
+            observed = min(estimate, heavy.get(key, estimate)) # Both summaries only overcount
+            baseline = self.baselines[key]
+            mean, variance = baseline[0], baseline[1]
+            # Poisson floor on the spread (+1 for small counts), so rare keys need a real jump to score
+            score = (observed - mean) / np.sqrt(max(variance, mean) + 1.0)
+            if warmed_up and observed >= self.min_count and score >= self.threshold:
+                events.append(TrendEvent(self.source, key, bucket * self.bucket_seconds, observed,
+                                         round(mean, 2), round(float(score), 2)))
+            diff = observed - mean
+            baseline[0] = mean + self.alpha * diff
+            baseline[1] = (1 - self.alpha) * (variance + self.alpha * diff * diff)
+
+        if len(self.baselines) > self.max_keys:
+            keep = heapq.nlargest(self.max_keys, self.baselines.items(), key=lambda item: item[1][0])
+            self.baselines = dict(keep)
+        self.last_closed = bucket
+        self.closed_buckets += 1
+        return events
+
+    def flush(self):
+        """Closes every open bucket (e.g. at shutdown); returns their events."""
+        events = []
+        for bucket in sorted(self.open_buckets):
+            events.extend(self._close(bucket))
+        return events
+
+# ==========================
+# INGESTION HOOKS
+# ==========================
+def _epoch_seconds(values):
+    parsed = pd.to_datetime(pd.Series(values), format="ISO8601", errors="coerce", utc=True)
+    return (parsed.astype("int64") // 10**9).where(parsed.notna()).to_numpy(dtype="float64")
+
+def complaint_keys(rows):
+    """311 records -> keys per complaint type, citywide and per ZIP code ("NOISE - RESIDENTIAL @ 11211")."""
+    frame = pd.DataFrame.from_records(rows, columns=["complaint_type", "incident_zip", "created_date"])
+    complaint = frame["complaint_type"].fillna("N/A").astype(str).str.upper()
+    timestamps = _epoch_seconds(frame["created_date"])
+    local = (frame["incident_zip"].notna() & (frame["incident_zip"] != "N/A")).to_numpy() # Stored rows default to "N/A"
+    keys = complaint.tolist() + (complaint[local] + " @ " + frame["incident_zip"][local].astype(str)).tolist()
+    return keys, np.concatenate((timestamps, timestamps[local]))
+
+def hashtag_keys(rows):
+    """Social post records -> one "#tag" key per hashtag in their content, at posted_at."""
+    keys, timestamps = [], []
+    posted = _epoch_seconds([row.get("posted_at") for row in rows])
+    for row, posted_at in zip(rows, posted):
+        for tag in {tag.lower() for tag in HASHTAG_PATTERN.findall(row.get("content") or "")}:
+            keys.append(f"#{tag}")
+            timestamps.append(posted_at)
+    return keys, np.asarray(timestamps, dtype="float64")
+
+# Streams the monitor understands: dataset name -> key extractor for raw records
+STREAM_KEYS = {
+    "nyc_311_requests": complaint_keys,
+    "social_posts": hashtag_keys,
+}
+
+# Stored columns each stream's key extractor reads
+STREAM_COLUMNS = {
+    "nyc_311_requests": ["complaint_type", "incident_zip", "created_date"],
+    "social_posts": ["content", "posted_at"],
+}
+
+# Hours of nyc_311_hourly a fresh 311 detector is seeded with
+SEED_HOURS = 14 * 24
+
+class TrendMonitor:
+    """
+    Runs one TrendDetector per stream as an InsertManager batch hook, so new
+    batches are scored as they are written and detected trends land in the
+    trend_events table in the same transaction. Only records stored since the
+    last batch are fed (tracked by id in sync_state, "trend:<table>"), so
+    re-fetched upserts are never counted twice. A fresh 311 detector is
+    seeded from nyc_311_hourly rather than replaying history. With a
+    state_path, detector state (a few MB at most) is saved between runs, so
+    baselines and open buckets carry over. The state records the last id
+    each detector was fed; if the stored progress has moved past it (e.g.
+    a run crashed before saving), the rows in between are fed again.
+    """
+    def __init__(self, db_path, state_path=None, **detector_options):
+        self.db_path = db_path
+        self.state_path = state_path
+        self.detector_options = detector_options
+        self.detectors = {source: TrendDetector(source, **detector_options) for source in STREAM_KEYS}
+        self.fed_ids = {} # Last record id each detector has seen; unknown means re-seed
+        if state_path and os.path.exists(state_path):
+            with open(state_path, "rb") as f:
+                state = pickle.load(f)
+            if isinstance(state, dict) and "detectors" in state:
+                self.detectors.update(state["detectors"])
+                self.fed_ids.update(state["fed_ids"])
+            logging.info(f"Loaded trend detector state from {state_path}.")
+        self._lock = threading.Lock() # Datasets sync on separate threads
+
+    def _get_connection(self):
+        return sqlite3.connect(self.db_path, timeout=60)
+
+    def _write_events(self, conn, events):
+        conn.executemany(
+            """
+            INSERT INTO trend_events (source, trend_key, bucket_start, observed, expected, score, detected_at)
+            VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
+            ON CONFLICT(source, trend_key, bucket_start) DO UPDATE SET
+                observed = excluded.observed, expected = excluded.expected, score = excluded.score;
+            """,
+            [(e.source, e.trend_key, e.bucket_start, e.observed, e.expected, e.score) for e in events],
+        )
+        for event in events:
+            logging.info(f"Trending in {event.source}: {event.trend_key} "
+                         f"({event.observed} vs ~{event.expected:.1f} expected, score {event.score}).")
+
+    @staticmethod
+    def _progress(conn, source):
+        row = conn.execute("SELECT watermark FROM sync_state WHERE dataset_name = ?;",
+                           (f"trend:{source}",)).fetchone()
+        return int(row[0]) if row else None
+
+    def _seed(self, conn, source):
+        """
+        Replaces a stream's detector with a fresh one, seeded from the 311
+        rollups when they exist; returns the id after which records are fed.
+        """
+        detector = self.detectors[source] = TrendDetector(source, **self.detector_options)
+        if source != "nyc_311_requests":
+            return 0
+        row = conn.execute("SELECT watermark FROM sync_state WHERE dataset_name = ?;",
+                           (ROLLUP_STATE_KEY,)).fetchone()
+        if row is None or detector.bucket_seconds % 3600:
+            return 0
+        history = pd.read_sql_query(
+            """
+            SELECT hour_start AS bucket_start, UPPER(complaint_type) AS trend_key, SUM(request_count) AS count
+            FROM nyc_311_hourly
+            WHERE hour_start >= (SELECT MAX(hour_start) FROM nyc_311_hourly) - ? AND request_count > 0
+            GROUP BY bucket_start, trend_key;
+            """,
+            conn, params=(SEED_HOURS * 3600,),
+        )
+        detector.seed(history)
+        logging.info(f"Seeded the {source} trend detector with {len(detector.baselines)} baselines "
+                     f"from nyc_311_hourly.")
+        return int(row[0])
+
+    def update(self, conn, source):
+        """
+        Feeds the records of a stream stored since the last call to its
+        detector and records any trends found. Pass the connection of the
+        transaction that wrote them.
+        """
+        with self._lock:
+            progress, last_id = self._progress(conn, source), self.fed_ids.get(source)
+            # Re-feed from the detector's own position when the stored progress is ahead of it;
+            # a detector that is ahead saw rows that were never committed, so it starts over
+            seeded = progress is None or last_id is None or last_id > progress
+            if seeded:
+                last_id = self._seed(conn, source)
+            rows = pd.read_sql_query(
+                f"SELECT id, {', '.join(STREAM_COLUMNS[source])} FROM {source} WHERE id > ? ORDER BY id;",
+                conn, params=(last_id,),
+            )
+            events = []
+            if not rows.empty:
+                keys, timestamps = STREAM_KEYS[source](rows.to_dict("records"))
+                events = self.detectors[source].observe(keys, timestamps)
+                last_id = int(rows["id"].iloc[-1])
+            self.fed_ids[source] = last_id
+            if last_id != progress:
+                conn.execute(
+                    """
+                    INSERT INTO sync_state (dataset_name, watermark_column, watermark, rows_synced, updated_at)
+                    VALUES (?, 'id', ?, ?, datetime('now'))
+                    ON CONFLICT(dataset_name) DO UPDATE SET
+                        watermark = excluded.watermark, rows_synced = sync_state.rows_synced + excluded.rows_synced,
+                        updated_at = excluded.updated_at;
+                    """,
+                    (f"trend:{source}", str(last_id), len(rows)),
+                )
+        self._write_events(conn, events)
+        return events
+
+    def batch_hook(self, conn, dataset_name, rows):
+        """InsertManager batch hook for any dataset in STREAM_KEYS; feeds the rows the chunk inserted."""
+        self.update(conn, dataset_name)
+
+    def flush(self):
+        """Closes all open buckets and records their trends."""
+        with self._lock:
+            events = [event for detector in self.detectors.values() for event in detector.flush()]
+        conn = self._get_connection()
+        with conn:
+            self._write_events(conn, events)
+        conn.close()
+        return events
+
+    def save(self):
+        """Writes detector state to state_path for the next run, replacing the old file atomically."""
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with self._lock, open(tmp_path, "wb") as f:
+            pickle.dump({"detectors": self.detectors, "fed_ids": dict(self.fed_ids)}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def recent_events(self, since_hours=24, source=None):
+        """Trends detected for buckets starting in the last `since_hours` hours, strongest first."""
+        cutoff = pd.Timestamp.now(tz="UTC").value // 10**9 - since_hours * 3600
+        sql = "SELECT * FROM trend_events WHERE bucket_start >= ?"
+        params = [cutoff]
+        if source:
+            sql += " AND source = ?"
+            params.append(source)
+        conn = self._get_connection()
+        events = pd.read_sql_query(sql + " ORDER BY score DESC;", conn, params=params)
+        conn.close()
+        return events
@@ -0,0 +1,92 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query
+from line_jb.geospatial.osm_utils import OSMUtils
+from line_jb.geospatial.router import CSRRouter
+from line_jb.geospatial.street_scoring import load_edge_scores
+
+logging.basicConfig(level=logging.INFO)
+
+# Service settings, overridable from the environment
+DB_PATH = os.environ.get("LINE_JB_DB_PATH", "db/local.db")
+ROUTING_PLACE = os.environ.get("LINE_JB_ROUTING_PLACE", "Manhattan, New York, USA")
+ROUTER_CACHE_PATH = os.environ.get("LINE_JB_ROUTER_CACHE", "cache/router/walk.npz")
+SCORE_REFRESH_SEC = int(os.environ.get("LINE_JB_SCORE_REFRESH_SEC", "900"))
+
+# One router per process, shared by all requests
+_state = {"router": None, "scores_at": 0.0}
+_refresh_lock = threading.Lock()
+
+def build_router():
+    """
+    Loads the CSR router saved by a previous start, or builds it from the
+    OSM walking network (with landmarks) and saves it for next time.
+    Run once before starting several workers (see __main__), so they all
+    load the saved file instead of each downloading the network.
+    """
+    if os.path.exists(ROUTER_CACHE_PATH):
+        router = CSRRouter.load(ROUTER_CACHE_PATH)
+        logging.info(f"Loaded router from {ROUTER_CACHE_PATH}.")
+        return router
+    graph = OSMUtils().get_street_network(place_name=ROUTING_PLACE, network_type="walk")
+    if graph is None:
+        raise RuntimeError(f"Could not fetch the street network for '{ROUTING_PLACE}'.")
+    router = CSRRouter.from_osmnx(graph)
+    router.precompute_landmarks()
+    router.save(ROUTER_CACHE_PATH)
+    return router
+
+def refresh_scores(force=False):
+    """Pulls current (decayed) nuisance scores from the database, at most every SCORE_REFRESH_SEC."""
+    if not force and time.time() - _state["scores_at"] < SCORE_REFRESH_SEC:
+        return
+    with _refresh_lock:
+        if not force and time.time() - _state["scores_at"] < SCORE_REFRESH_SEC:
+            return # Another request refreshed while we waited
+        try:
+            conn = sqlite3.connect(DB_PATH)
+            scores = load_edge_scores(conn)["nuisance_score"]
+            conn.close()
+            _state["router"].set_nuisance(scores)
+            logging.info(f"Refreshed nuisance scores for {len(scores)} edges.")
+        except Exception as e:
+            logging.warning(f"Keeping previous nuisance scores: {e}")
+        _state["scores_at"] = time.time()
+
+@asynccontextmanager
+async def lifespan(app):
+    _state["router"] = build_router()
+    refresh_scores(force=True)
+    yield
+
+app = FastAPI(title="line-jb routing", lifespan=lifespan)
+
+@app.get("/health")
+def health():
+    router = _state["router"]
+    return {"status": "ok", "nodes": len(router.node_ids), "edges": len(router.indices)}
+
+@app.get("/route")
+def route(from_lat: float, from_lon: float, to_lat: float, to_lon: float,
+          avoidance: float = Query(1.0, ge=0.0, le=100.0)):
+    """
+    Walking route between two points. `avoidance` scales how strongly
+    streets with recent complaints are avoided (0 = shortest path).
+    Plain `def`, so FastAPI runs concurrent requests on its thread pool.
+    """
+    refresh_scores()
+    result = _state["router"].route(from_lon, from_lat, to_lon, to_lat, avoidance=avoidance)
+    if result is None:
+        raise HTTPException(status_code=404, detail="No walking route between these points.")
+    return result
+
+if __name__ == "__main__":
+    import uvicorn
+    # Build and save the router before the workers start; each then loads the saved file
+    build_router()
+    uvicorn.run("line_jb.api.routing:app", host="0.0.0.0", port=8000,
+                workers=int(os.environ.get("LINE_JB_API_WORKERS", "4")))
@@ -0,0 +1,229 @@
+from dataclasses import dataclass
+import json
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+import shapely
+
+__all__ = ["ColumnSpec", "DATASET_SPECS", "convert_records", "parse_dates", "parse_points"]
+
+# Output format for "datetime" columns, matching datetime.isoformat(sep=' ')
+DATETIME_OUTPUT_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+@dataclass(frozen=True)
+class ColumnSpec:
+    """
+    Declares how one table column is filled from raw API records.
+    type is one of "text", "int", "float", "datetime", "epoch" (integer
+    seconds since 1970, naive timestamps taken at face value), or
+    "point_x"/"point_y" (the longitude/latitude of a WKT or GeoJSON point in
+    `source`). Missing
+    or unparseable values become `default`. `source` names the raw field
+    when it differs from the column name.
+    """
+    name: str
+    type: str = "text"
+    default: Any = None
+    date_format: Optional[str] = None
+    source: Optional[str] = None
+
+    @property
+    def source_field(self) -> str:
+        return self.source or self.name
+
+def _text_columns(names, default=None):
+    return [ColumnSpec(name, default=default) for name in names]
+
+# ==========================
+# PER-DATASET COLUMN SPECS
+# ==========================
+_PERMITTED_EVENTS_COLUMNS = [
+    ColumnSpec("event_id"),
+    *_text_columns([
+        "event_name", "start_date_time", "end_date_time", "event_agency", "event_type",
+        "event_borough", "event_location", "event_street_side", "street_closure_type",
+        "community_board", "police_precinct"
+    ], default="N/A"),
+]
+
+DATASET_SPECS: Dict[str, List[ColumnSpec]] = {
+    "nyc_parks_events": [
+        *_text_columns(["event_name", "location"], default="N/A"),
+        ColumnSpec("date_and_time", "datetime", date_format="ISO8601"),
+        *_text_columns([
+            "borough", "location_type", "group_name_partner", "event_type", "category"
+        ], default="N/A"),
+        ColumnSpec("attendance", "int", default=0),
+        *_text_columns(["audience", "source"], default="N/A"),
+    ],
+    "nyc_permitted_events_historical": _PERMITTED_EVENTS_COLUMNS,
+    "nyc_permitted_events_future": _PERMITTED_EVENTS_COLUMNS,
+    "nyc_311_requests": [
+        ColumnSpec("unique_key"),
+        *_text_columns([
+            "created_date", "closed_date", "agency", "agency_name", "complaint_type",
+            "descriptor", "location_type", "incident_zip", "incident_address", "street_name",
+            "city", "status", "due_date", "resolution_description",
+            "resolution_action_updated_date", "borough"
+        ], default="N/A"),
+        ColumnSpec("latitude", "float"),
+        ColumnSpec("longitude", "float"),
+        # Integer bucketable timestamp for the rollup triggers
+        ColumnSpec("created_epoch", "epoch", date_format="ISO8601", source="created_date"),
+    ],
+    "nyc_311_resolutions": [
+        ColumnSpec("unique_key"),
+        *_text_columns([
+            "agency", "agency_name", "complaint_type", "descriptor", "borough",
+            "resolution_description"
+        ], default="N/A"),
+        ColumnSpec("year", "int", default=0),
+        ColumnSpec("month", "int", default=0),
+        *_text_columns(["overall_satisfaction", "dissatisfaction_reason"], default="N/A"),
+    ],
+    "linknyc_status": [
+        *_text_columns([
+            "generated_on", "site_id", "status", "kiosk_type", "ppt_id", "address", "city",
+            "state", "zip", "boro"
+        ]),
+        ColumnSpec("latitude", "float"),
+        ColumnSpec("longitude", "float"),
+        *_text_columns([
+            "cross_street_1", "cross_street_2", "corner", "community_board",
+            "council_district", "census_tract", "nta", "bbl", "bin", "install_date",
+            "active_date", "wifi_status", "wifi_status_date", "tablet_status",
+            "tablet_status_date", "phone_status", "phone_status_date"
+        ]),
+    ],
+    "nyc_sidewalk_status": [
+        ColumnSpec("broken"),
+        ColumnSpec("cb", "int"),
+        *_text_columns(["certi_date", "contract", "entrydate", "flag", "frstname"]),
+        ColumnSpec("grace_pd", "int"),
+        *_text_columns([
+            "hardware", "house_num", "integrity", "onfrtocode", "onstname", "other_def",
+            "patchwork", "post_date", "slope"
+        ]),
+        ColumnSpec("sq_feet", "int"),
+        ColumnSpec("sw_missing"),
+        ColumnSpec("swv_number", "int"),
+        *_text_columns(["tostname", "trip_haz", "undermined", "vdismissdate"]),
+        ColumnSpec("violationid", "int"),
+        ColumnSpec("vissuedate"),
+        ColumnSpec("bblid", "int"),
+    ],
+    "nyc_tree_points": [
+        ColumnSpec("objectid", "int"),
+        ColumnSpec("dbh", "int"),
+        *_text_columns([
+            "tpstructure", "tpcondition", "stumpdiameter", "plantingspaceglobalid",
+            "geometry", "globalid", "genusspecies", "createddate", "updateddate",
+            "planteddate", "riskrating", "riskratingdate", "location"
+        ]),
+        # Decoded once here so spatial queries never re-parse the WKT
+        ColumnSpec("longitude", "point_x", source="geometry"),
+        ColumnSpec("latitude", "point_y", source="geometry"),
+    ],
+    "social_posts": [
+        *_text_columns(["platform", "post_id", "hashtag", "username", "content"]),
+        ColumnSpec("posted_at", "datetime", date_format="ISO8601"),
+        ColumnSpec("like_count", "int"),
+        ColumnSpec("comment_count", "int"),
+        ColumnSpec("media_type", "int"),
+        ColumnSpec("url"),
+        ColumnSpec("latitude", "float"),
+        ColumnSpec("longitude", "float"),
+        ColumnSpec("fetched_at"),
+    ],
+}
+
+# ==========================
+# VECTORIZED CONVERSION
+# ==========================
+def parse_points(series: pd.Series):
+    """
+    Decodes a column of point geometries into (x, y) float arrays in one
+    vectorized pass. Accepts WKT strings ("POINT (-73.9 40.7)") and GeoJSON
+    points (dicts as returned by Socrata, or their JSON text); anything else
+    becomes NaN.
+    """
+    values = series.to_numpy(dtype=object).copy()
+    for i, v in enumerate(values):
+        if isinstance(v, str) and v.lstrip().startswith("{"): # GeoJSON stored as text
+            try:
+                values[i] = json.loads(v)
+            except ValueError:
+                values[i] = None
+    x = np.full(len(values), np.nan)
+    y = np.full(len(values), np.nan)
+    is_text = np.fromiter((isinstance(v, str) for v in values), dtype=bool, count=len(values))
+    if is_text.any():
+        points = shapely.from_wkt(values[is_text], on_invalid="ignore")
+        x[is_text] = shapely.get_x(points) # NaN for missing or non-point geometries
+        y[is_text] = shapely.get_y(points)
+    for i in np.flatnonzero(~is_text):
+        coordinates = values[i].get("coordinates") if isinstance(values[i], dict) else None
+        if coordinates and len(coordinates) >= 2:
+            x[i], y[i] = float(coordinates[0]), float(coordinates[1])
+    return x, y
+
+def parse_dates(series: pd.Series, date_format: Optional[str] = None, utc: bool = False) -> pd.Series:
+    """
+    Parses a column of date strings with `date_format` in one vectorized
+    pass, then retries the values it rejects one by one with dateutil
+    (format="mixed"), so a feed that mixes ISO and e.g. "07/04/2023
+    10:00:00 AM" values loses neither. Naive values are taken at face value
+    and offsets are converted to UTC; without `utc` the result is naive.
+    """
+    parsed = pd.to_datetime(series, format=date_format, errors="coerce", utc=True)
+    retry = (parsed.isna() & series.notna()).to_numpy()
+    if date_format is not None and retry.any():
+        parsed = parsed.copy()
+        parsed[retry] = pd.to_datetime(series[retry], format="mixed", errors="coerce", utc=True)
+    return parsed if utc else parsed.dt.tz_localize(None)
+
+def _convert_column(series: pd.Series, column: ColumnSpec, points=None) -> list:
+    """Converts one raw column of a page at once; returns plain Python values for sqlite3."""
+    if column.type in ("point_x", "point_y"):
+        numbers = points[0] if column.type == "point_x" else points[1]
+        mask = np.isfinite(numbers)
+        valid = numbers[mask]
+    elif column.type in ("int", "float"):
+        numbers = pd.to_numeric(series, errors="coerce").to_numpy(dtype="float64")
+        mask = np.isfinite(numbers)
+        valid = numbers[mask]
+        if column.type == "int":
+            valid = np.trunc(valid).astype("int64")
+    elif column.type == "datetime":
+        parsed = parse_dates(series, column.date_format)
+        mask = parsed.notna().to_numpy()
+        valid = parsed[mask].dt.strftime(DATETIME_OUTPUT_FORMAT).to_numpy(dtype=object)
+    elif column.type == "epoch":
+        parsed = parse_dates(series, column.date_format, utc=True)
+        mask = parsed.notna().to_numpy()
+        valid = (parsed[mask].astype("int64") // 10**9).to_numpy()
+    elif column.type == "text":
+        mask = series.notna().to_numpy()
+        valid = series.to_numpy(dtype=object)[mask]
+        # Socrata returns point/location fields as GeoJSON objects; keep them as JSON text
+        valid = np.array([json.dumps(v) if isinstance(v, (dict, list)) else v for v in valid], dtype=object)
+    else:
+        raise ValueError(f"Unknown column type {column.type!r} for column {column.name}")
+
+    values = np.full(len(series), column.default, dtype=object)
+    values[mask] = valid
+    return values.tolist()
+
+def convert_records(columns: List[ColumnSpec], rows: List[Dict]) -> List[tuple]:
+    """
+    Converts a page of raw API records into insert tuples ordered like `columns`.
+    The page is loaded into a DataFrame once and each column is parsed in a
+    single vectorized pass instead of per-row Python calls.
+    """
+    sources = list(dict.fromkeys(c.source_field for c in columns))
+    frame = pd.DataFrame.from_records(rows, columns=sources)
+    # Geometry sources feeding both an x and a y column are parsed only once
+    points = {c.source_field: parse_points(frame[c.source_field])
+              for c in columns if c.type in ("point_x", "point_y")}
+    converted = [_convert_column(frame[c.source_field], c, points.get(c.source_field)) for c in columns]
+    return list(zip(*converted))
@@ -1,7 +1,15 @@
 from sodapy import Socrata
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 import os
 import time
+import random
 import logging
+import threading
+from itertools import chain
+from line_jb.data_ingestion.sync_state import get_watermark_column, soql_literal
+from line_jb.instrumentation import metrics
 
 logging.basicConfig(level=logging.INFO)
 
@@ -16,44 +24,247 @@ DATASET_IDS = {
     "nyc_tree_points": "hn5i-inap"
 }
 
+# Unique key of each dataset (the UNIQUE columns in db/schema.sql) and its
+# SoQL type, used as the cursor for keyset pagination. Parks events have no
+# single-column key upstream, so they page on Socrata's row id.
+KEY_COLUMNS = {
+    "nyc_parks_events": (":id", "text"),
+    "nyc_permitted_events_historical": ("event_id", "number"),
+    "nyc_permitted_events_future": ("event_id", "number"),
+    "nyc_311_requests": ("unique_key", "text"),
+    "nyc_311_resolutions": ("unique_key", "text"),
+    "linknyc_status": ("site_id", "text"),
+    "nyc_sidewalk_status": ("bblid", "number"),
+    "nyc_tree_points": ("objectid", "number")
+}
+
 DOMAIN = "data.cityofnewyork.us"
 
+# Maximum number of in-flight requests against one Socrata domain, shared by
+# every dataset and page fetched from this process.
+DOMAIN_CONCURRENCY = 6
+MAX_BACKOFF_SEC = 60
+
+_domain_slots = {}
+_clients = {}
+_clients_lock = threading.Lock()
+
 # ==========================
 # GENERAL NYC OPEN DATA UTILS
 # ==========================
 def get_client():
-    """Get a Socrata client for NYC Open Data."""
-    return Socrata(DOMAIN, None)
+    """
+    Get the shared Socrata client for NYC Open Data. Its HTTP session keeps
+    a connection pool sized for DOMAIN_CONCURRENCY and is reused by all threads.
+    """
+    with _clients_lock:
+        if DOMAIN not in _clients:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=DOMAIN_CONCURRENCY)
+            _clients[DOMAIN] = Socrata(DOMAIN, None, session_adapter={"prefix": "https://", "adapter": adapter})
+            _domain_slots[DOMAIN] = threading.BoundedSemaphore(DOMAIN_CONCURRENCY)
+        return _clients[DOMAIN]
+
+def backoff_delay(attempt, base_sec, cap_sec=MAX_BACKOFF_SEC):
+    """Exponential backoff with full jitter for the given (1-based) retry attempt."""
+    return random.uniform(0, min(cap_sec, base_sec * 2 ** (attempt - 1)))
+
+def _get_with_retry(dataset_key, max_retries, sleep_sec, **params):
+    """
+    Runs one Socrata GET under the per-domain concurrency cap, retrying with
+    jittered exponential backoff. Returns None once retries are exhausted.
+    The domain slot is released while backing off so other requests can proceed.
+    """
+    client = get_client()
+    dataset_id = DATASET_IDS[dataset_key]
+    for attempt in range(1, max_retries + 1):
+        try:
+            # Waiting for a slot and the HTTP call itself are timed separately
+            with metrics.stage("fetch_wait", dataset=dataset_key):
+                _domain_slots[DOMAIN].acquire()
+            try:
+                with metrics.stage("fetch_http", dataset=dataset_key):
+                    results = client.get(dataset_id, **params)
+            finally:
+                _domain_slots[DOMAIN].release()
+            metrics.inc("fetch_requests", dataset=dataset_key)
+            metrics.inc("fetch_rows", len(results), dataset=dataset_key)
+            return results
+        except Exception as e:
+            metrics.inc("fetch_errors", dataset=dataset_key)
+            logging.warning(f"[{dataset_key}] Error fetching batch (attempt {attempt}/{max_retries}): {e}")
+            if attempt < max_retries:
+                time.sleep(backoff_delay(attempt, sleep_sec))
+    logging.error(f"[{dataset_key}] Max retries reached, stopping fetch.")
+    return None
+
+def count_rows(dataset_key, since=None, max_retries=3, sleep_sec=5):
+    """Returns the number of rows a crawl would return (count(*) pre-query), or None on failure."""
+    query = build_query(dataset_key, since=since)
+    params = {"select": "count(*)"}
+    if "where" in query:
+        params["where"] = query["where"]
+    results = _get_with_retry(dataset_key, max_retries, sleep_sec, **params)
+    if not results:
+        return None
+    return int(next(iter(results[0].values())))
 
 # ==========================
-# FETCH DATA FUNCTION
+# FETCH DATA FUNCTIONS
 # ==========================
-def fetch_nyc_data(dataset_key, batch_size=1000, max_retries=3, sleep_sec=5):
-    """fetch using pagination ($limit + $offset)."""
-    client = get_client()
-    all_events = []
+def build_query(dataset_key, since=None):
+    """
+    Builds the SoQL parameters for a (possibly incremental) crawl.
+    Rows are always ordered by the dataset's watermark column, with the
+    Socrata row id as a tie-breaker, so $offset pages are stable. When a
+    watermark from a previous run is given, only rows past it are requested.
+    """
+    column, soql_type = get_watermark_column(dataset_key)
+    params = {"order": f"{column}, :id"}
+    if column.startswith(":"):
+        # System fields are only returned when explicitly selected (and not
+        # stripped by sodapy, which excludes them by default)
+        params["select"] = ":*, *"
+        params["exclude_system_fields"] = False
+    if since is not None:
+        params["where"] = f"{column} > {soql_literal(since, soql_type)}"
+    return params
+
+def build_keyset_query(dataset_key, since=None, cursor=None):
+    """
+    Builds the SoQL parameters for one keyset-paginated page.
+    Rows are ordered by (watermark column, unique key) and each page starts
+    strictly after `cursor`, the (watermark, key) pair of the last row already
+    seen, so every page costs the same as the first no matter how deep the
+    crawl is. Rows without a key are skipped: they cannot be paged on, and
+    could not be upserted anyway.
+    """
+    wm_column, wm_type = get_watermark_column(dataset_key)
+    key_column, key_type = KEY_COLUMNS[dataset_key]
+    params = build_query(dataset_key, since=since)
+    conditions = [f"{key_column} IS NOT NULL"]
+    if "where" in params:
+        conditions.append(params["where"])
+
+    if wm_column == key_column:
+        params["order"] = key_column
+        if cursor is not None:
+            conditions.append(f"{key_column} > {soql_literal(cursor[1], key_type)}")
+    else:
+        params["order"] = f"{wm_column}, {key_column}"
+        if cursor is not None:
+            last_wm = soql_literal(cursor[0], wm_type)
+            last_key = soql_literal(cursor[1], key_type)
+            conditions.append(f"({wm_column} > {last_wm} OR "
+                              f"({wm_column} = {last_wm} AND {key_column} > {last_key}))")
+
+    params["where"] = " AND ".join(conditions)
+    return params
+
+def _iter_keyset_pages(dataset_key, batch_size, max_retries, sleep_sec, since):
+    """Sequential keyset pagination; see build_keyset_query."""
+    wm_column, _ = get_watermark_column(dataset_key)
+    key_column, _ = KEY_COLUMNS[dataset_key]
+    cursor = None
+    fetched = 0
+
+    while True:
+        query = build_keyset_query(dataset_key, since=since, cursor=cursor)
+        results = _get_with_retry(dataset_key, max_retries, sleep_sec, limit=batch_size, **query)
+        if not results:
+            return
+
+        last_row = results[-1]
+        cursor = (last_row.get(wm_column), last_row.get(key_column))
+        fetched += len(results)
+        logging.info(f"[{dataset_key}] fetched {len(results)} records "
+                     f"({fetched} so far, cursor {key_column}={cursor[1]}).")
+        yield results
+        if len(results) < batch_size:
+            return
+
+def iter_nyc_pages(dataset_key, batch_size=1000, max_retries=3, sleep_sec=5, since=None,
+                   workers=1, pagination="keyset"):
+    """
+    Generator over the pages of a dataset.
+    Each page is yielded as soon as it is fetched, so callers only ever
+    hold a bounded number of pages in memory. Pass `since` (a stored
+    watermark) to fetch only rows added or changed after it.
+
+    pagination="keyset" (default) pages with `$where key > last_seen` on the
+    dataset's unique key; see build_keyset_query. pagination="offset" pages
+    with $limit + $offset, and with workers > 1 a count(*) pre-query plans
+    the offsets and up to `workers` pages are requested in parallel; pages
+    are still yielded in order, so watermarks advance monotonically.
+    """
+    if since is not None:
+        logging.info(f"[{dataset_key}] incremental sync from watermark {since}")
+    if pagination == "keyset":
+        if workers > 1:
+            logging.info(f"[{dataset_key}] Keyset pagination fetches one page at a time; ignoring "
+                         f"workers={workers} (use pagination='offset' for parallel pages).")
+        yield from _iter_keyset_pages(dataset_key, batch_size, max_retries, sleep_sec, since)
+        return
+    if pagination != "offset":
+        raise ValueError(f"Unknown pagination mode: {pagination!r}")
+
+    query = build_query(dataset_key, since=since)
+
     offset = 0
-    dataset_id = DATASET_IDS[dataset_key]
+    if workers > 1:
+        total = count_rows(dataset_key, since=since, max_retries=max_retries, sleep_sec=sleep_sec)
+        if total:
+            logging.info(f"[{dataset_key}] {total} rows to fetch with {workers} parallel workers.")
+            planned_offsets = iter(range(0, total, batch_size))
+            pending = deque()
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"fetch-{dataset_key}") as pool:
+                try:
+                    while True:
+                        # Keep at most `workers` pages in flight (and in memory)
+                        while len(pending) < workers:
+                            next_offset = next(planned_offsets, None)
+                            if next_offset is None:
+                                break
+                            future = pool.submit(_get_with_retry, dataset_key, max_retries, sleep_sec,
+                                                 limit=batch_size, offset=next_offset, **query)
+                            pending.append((next_offset, future))
+                        if not pending:
+                            break
+                        page_offset, future = pending.popleft()
+                        results = future.result()
+                        if results is None:
+                            return
+                        offset = page_offset + batch_size
+                        if not results:
+                            break
+                        logging.info(f"[{dataset_key}] fetched {len(results)} records. Offset now {offset}.")
+                        yield results
+                finally:
+                    for _, future in pending:
+                        future.cancel()
 
+    # Sequential paging; after a planned parallel crawl this picks up any rows
+    # that were added upstream while it ran.
     while True:
-        attempt = 0
-        while attempt < max_retries:
-            try:
-                results = client.get(dataset_id, limit=batch_size, offset=offset)
-                if not results:
-                    return all_events
-                all_events.extend(results)
-                
-                logging.info(f"[{dataset_key}] fetched {len(results)} records. "
-                             f"Offset now {offset + batch_size}.")
-                
-                offset += batch_size
-                break
-            except Exception as e:
-                attempt += 1
-                logging.warning(f"Error fetching batch (attempt {attempt}/{max_retries}): {e}")
-                time.sleep(sleep_sec)
-
-        if attempt == max_retries:
-            logging.error("Max retries reached, stopping fetch.")
-            return all_events
+        results = _get_with_retry(dataset_key, max_retries, sleep_sec,
+                                  limit=batch_size, offset=offset, **query)
+        if not results:
+            return
+
+        logging.info(f"[{dataset_key}] fetched {len(results)} records. "
+                     f"Offset now {offset + batch_size}.")
+        offset += batch_size
+        yield results
+
+def iter_nyc_records(dataset_key, **kwargs):
+    """Streams individual records of a dataset, page by page."""
+    return chain.from_iterable(iter_nyc_pages(dataset_key, **kwargs))
+
+def fetch_nyc_data(dataset_key, batch_size=1000, max_retries=3, sleep_sec=5, since=None,
+                   workers=1, pagination="keyset"):
+    """fetch using pagination and return every record as one list."""
+    all_events = []
+    for page in iter_nyc_pages(dataset_key, batch_size=batch_size, max_retries=max_retries,
+                               sleep_sec=sleep_sec, since=since, workers=workers,
+                               pagination=pagination):
+        all_events.extend(page)
+    return all_events
@@ -1,5 +1,4 @@
-from line_jb.login import get_logged_in_client
-import time
+from line_jb.data_ingestion.instagram_client import get_logged_in_client
 import requests
 from bs4 import BeautifulSoup
 import subprocess
@@ -7,26 +6,23 @@ import json
 from pytrends.request import TrendReq
 import pandas as pd
 import os
-# import snscrape.modules.twitter as sntwitter
 
-def fetch_posts_by_hashtag(hashtag, amount=50):
+def fetch_posts_by_hashtag(hashtag, amount=50, client=None):
     """
     Fetch recent posts for a specific Instagram hashtag.
 
     :param hashtag: The hashtag to search (without #).
     :param amount: Number of posts to fetch (max ~1000).
+    :param client: A logged-in client (or InstagramAccount) to reuse; logs in if omitted.
     :return: List of media objects.
     """
-    cl = get_logged_in_client()
-    posts = cl.hashtag_medias_recent(hashtag, amount=amount)
-
-    # Optional: Respect rate limits if making multiple calls
-    time.sleep(random.uniform(2,5))
-
-    return posts
+    cl = client or get_logged_in_client()
+    # For many hashtags use SocialIngestWorker, which shares clients and rate limits the calls
+    return cl.hashtag_medias_recent(hashtag, amount=amount)
 
 def fetch_twitter_posts(query, limit=10):
     """Fetch tweets using snscrape Python library (no CLI)."""
+    import snscrape.modules.twitter as sntwitter # Imported here: snscrape fails to import on some Pythons
     tweets = []
     for i, tweet in enumerate(sntwitter.TwitterSearchScraper(query).get_items()):
         if i >= limit:
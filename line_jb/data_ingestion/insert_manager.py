@@ -2,9 +2,17 @@ import os
 import sqlite3
 import time
 import logging
-from dateutil import parser as date_parser
-from typing import List, Dict
+from typing import Dict, Iterable
+from itertools import islice
+from functools import partial
 import re
+import numpy as np
+import pandas as pd
+from line_jb.data_ingestion.dataset_specs import DATASET_SPECS, convert_records, parse_points
+from line_jb.data_ingestion.sync_state import (
+    get_watermark_column, max_watermark, read_watermark, write_watermark
+)
+from line_jb.instrumentation import metrics
 
 __all__ = ["InsertManager"]
 
@@ -13,7 +21,7 @@ def load_table_schemas_from_file(sql_file_path: str) -> dict:
         sql_content = f.read()
 
     # Split based on CREATE TABLE statements
-    statements = re.findall(r'CREATE TABLE IF NOT EXISTS (\w+)\s*\((.*?)\);', 
+    statements = re.findall(r'CREATE TABLE IF NOT EXISTS (\w+)\s*\((.*?)\)\s*(?:WITHOUT ROWID\s*)?;', 
                             sql_content, 
                             re.DOTALL
                     )
@@ -25,27 +33,75 @@ def load_table_schemas_from_file(sql_file_path: str) -> dict:
 
     return table_schemas
 
+def parse_column_definitions(create_statement: str) -> list:
+    """Returns (name, declared type) for each column defined in a CREATE TABLE statement."""
+    body = create_statement[create_statement.index("(") + 1:create_statement.rindex(")")]
+    columns = []
+    for line in body.splitlines():
+        match = re.match(r'\s*(\w+)\s+(\w+)', line)
+        if match and match.group(1).upper() not in ("CONSTRAINT", "PRIMARY", "UNIQUE", "FOREIGN", "CHECK"):
+            columns.append((match.group(1), match.group(2)))
+    return columns
+
+def iter_chunks(rows: Iterable, chunk_size: int):
+    """Yields lists of at most chunk_size items from any iterable, without materializing it."""
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
 class InsertManager:
-    def __init__(self, db_file, schema_path='db/schema.sql'):
+    # Columns backing each table's UNIQUE constraint in db/schema.sql; used as
+    # the ON CONFLICT target so re-fetched rows update in place.
+    CONFLICT_COLUMNS = {
+        "nyc_parks_events": ["event_name", "date_and_time", "location"],
+        "nyc_permitted_events_historical": ["event_id"],
+        "nyc_permitted_events_future": ["event_id"],
+        "nyc_311_requests": ["unique_key"],
+        "nyc_311_resolutions": ["unique_key"],
+        "linknyc_status": ["site_id"],
+        "nyc_sidewalk_status": ["bblid"],
+        "nyc_tree_points": ["objectid"],
+        "social_posts": ["platform", "post_id"],
+    }
+
+    # Point tables with an R*Tree index ("<table>_rtree") maintained by the
+    # triggers in db/schema.sql, mapped to their (latitude, longitude) columns.
+    SPATIAL_INDEXES = {
+        "nyc_311_requests": ("latitude", "longitude"),
+        "linknyc_status": ("latitude", "longitude"),
+        "nyc_tree_points": ("latitude", "longitude"),
+    }
+
+    # Tables whose coordinates are decoded from a geometry text column: (geometry, lat, lon)
+    PARSED_POINT_COLUMNS = {
+        "nyc_tree_points": ("geometry", "latitude", "longitude"),
+    }
+
+    # Integer epoch columns derived from a text date column: (date, epoch)
+    EPOCH_COLUMNS = {
+        "nyc_311_requests": ("created_date", "created_epoch"),
+    }
+
+    # Stored in PRAGMA user_version by initialize_database. Bump it whenever
+    # db/schema.sql changes in a way existing databases must be migrated for
+    # (new columns, indexes or triggers), so they are re-initialized on start.
+    SCHEMA_VERSION = 3
+
+    def __init__(self, db_file, schema_path='db/schema.sql', chunk_size=5000,
+                 journal_mode='WAL', synchronous='NORMAL', cache_size_kb=65536):
         self.db_file = db_file
+        self.chunk_size = chunk_size
+        # SQLite write tuning, applied to every connection this manager opens.
+        # Set journal_mode=None to leave the database's journal mode untouched.
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
         self.TABLE_SCHEMAS = load_table_schemas_from_file(schema_path)
-
-    # ==========================
-    # HELPER FUNCTIONS
-    # ==========================
-    @staticmethod
-    def try_float(value):
-        try:
-            return float(value)
-        except (TypeError, ValueError):
-            return None
-    
-    @staticmethod
-    def try_int(value):
-        try:
-            return int(float(value))
-        except (TypeError, ValueError):
-            return None
+        # dataset_name -> callables run inside each chunk's transaction
+        self.batch_hooks = {}
 
     # ==========================
     # INSTANCE METHODS & CLASS UTILITIES
@@ -54,18 +110,116 @@ class InsertManager:
         """Opens a connection to the SQLite database and 
         provide a cursor for executing SQL commands."""
         db_path = self.db_file or os.path.abspath(os.path.join(os.path.dirname(__file__), '../../db/local.db'))
-        conn = sqlite3.connect(db_path)
+        conn = sqlite3.connect(db_path, timeout=60)
+        self._apply_pragmas(conn)
         return conn, conn.cursor()
 
+    def _apply_pragmas(self, conn):
+        """Tunes a connection for bulk writes (WAL journal, relaxed fsync, larger page cache)."""
+        if self.journal_mode:
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode};")
+        if self.synchronous:
+            conn.execute(f"PRAGMA synchronous={self.synchronous};")
+        if self.cache_size_kb:
+            # Negative cache_size is interpreted by SQLite as KiB rather than pages
+            conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)};")
+        conn.execute("PRAGMA temp_store=MEMORY;")
+
     @staticmethod
     def initialize_database(db_file: str, schema_path: str):
         """Class-level utility to initialize the entire database schema (run once)."""   
         with sqlite3.connect(db_file) as conn:
+            InsertManager._add_missing_columns(conn, load_table_schemas_from_file(schema_path))
             with open(schema_path, "r") as f:
                 schema_sql = f.read()   
             conn.executescript(schema_sql)
+            InsertManager._backfill_parsed_points(conn)
+            InsertManager._backfill_epochs(conn)
+            InsertManager._backfill_spatial_indexes(conn)
+            conn.execute(f"PRAGMA user_version = {InsertManager.SCHEMA_VERSION};")
         logging.info(f"Database schema initialized at {db_file}")
 
+    @staticmethod
+    def schema_version(db_file: str) -> int:
+        """The schema version a database was last initialized with (0 if never)."""
+        conn = sqlite3.connect(db_file)
+        version = conn.execute("PRAGMA user_version;").fetchone()[0]
+        conn.close()
+        return version
+
+    @staticmethod
+    def _add_missing_columns(conn, table_schemas):
+        """
+        Adds columns declared in the schema file to tables created by an older
+        version of it (CREATE TABLE IF NOT EXISTS leaves existing tables alone).
+        """
+        for table_name, create_statement in table_schemas.items():
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table_name});")}
+            if not existing:
+                continue # Created fresh by the schema script
+            for column, column_type in parse_column_definitions(create_statement):
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {column_type};")
+                    logging.info(f"Added column {table_name}.{column} ({column_type}).")
+
+    @staticmethod
+    def _backfill_parsed_points(conn, chunksize=100000):
+        """
+        Decodes coordinates for rows stored before their table had coordinate
+        columns (new rows get them at ingest). The R*Tree update triggers
+        index each row as its coordinates are written.
+        """
+        for table_name, (geometry_col, lat_col, lon_col) in InsertManager.PARSED_POINT_COLUMNS.items():
+            sql = (f"SELECT id, {geometry_col} FROM {table_name} "
+                   f"WHERE {lat_col} IS NULL AND {geometry_col} IS NOT NULL;")
+            updated = 0
+            for chunk in pd.read_sql_query(sql, conn, chunksize=chunksize):
+                lons, lats = parse_points(chunk[geometry_col])
+                valid = np.isfinite(lons) & np.isfinite(lats)
+                conn.executemany(
+                    f"UPDATE {table_name} SET {lon_col} = ?, {lat_col} = ? WHERE id = ?;",
+                    zip(lons[valid].tolist(), lats[valid].tolist(), chunk["id"].to_numpy()[valid].tolist()),
+                )
+                updated += int(valid.sum())
+            if updated:
+                logging.info(f"Decoded coordinates for {updated} existing {table_name} rows.")
+
+    @staticmethod
+    def _backfill_epochs(conn):
+        """
+        Fills epoch columns for rows stored before they existed (new rows get
+        them at ingest). The rollup triggers count each row as it is filled.
+        """
+        for table_name, (date_col, epoch_col) in InsertManager.EPOCH_COLUMNS.items():
+            updated = conn.execute(
+                f"""
+                UPDATE {table_name} SET {epoch_col} = CAST(strftime('%s', {date_col}) AS INTEGER)
+                WHERE {epoch_col} IS NULL AND strftime('%s', {date_col}) IS NOT NULL;
+                """
+            ).rowcount
+            if updated:
+                logging.info(f"Backfilled {epoch_col} for {updated} existing {table_name} rows.")
+
+    @staticmethod
+    def _backfill_spatial_indexes(conn):
+        """
+        Populates R*Tree indexes that are empty while their table has rows, e.g.
+        when the index was added to a database created before it existed.
+        Afterwards the schema triggers keep them current on every insert.
+        """
+        for table_name, (lat_col, lon_col) in InsertManager.SPATIAL_INDEXES.items():
+            rtree_name = f"{table_name}_rtree"
+            if conn.execute(f"SELECT 1 FROM {rtree_name} LIMIT 1;").fetchone():
+                continue
+            conn.execute(
+                f"""
+                INSERT INTO {rtree_name} (id, min_lon, max_lon, min_lat, max_lat)
+                SELECT id, {lon_col}, {lon_col}, {lat_col}, {lat_col} FROM {table_name}
+                WHERE {lat_col} IS NOT NULL AND {lon_col} IS NOT NULL;
+                """
+            )
+            logging.info(f"Backfilled spatial index {rtree_name}.")
+
     def table_exists(self, dataset_name: str) -> bool:
         """Instance method to check for the existence of a specific table."""
         conn, cur = self._get_connection()
@@ -77,368 +231,181 @@ class InsertManager:
         conn.close()
         return exists
 
-    def insert_generic(self, dataset_name, schema_sql, insert_sql, row_mapper, data):
-        """Core instance method for inserting data with any schema."""
+    def _build_upsert_sql(self, dataset_name, columns):
+        """
+        Builds the INSERT statement for a dataset. Rows that collide with an
+        existing unique key overwrite it (upsert) rather than being ignored,
+        so incremental syncs pick up upstream changes.
+        """
+        placeholders = ", ".join("?" for _ in columns)
+        insert_sql = f"INSERT INTO {dataset_name} ({', '.join(columns)}) VALUES ({placeholders})"
+        conflict_columns = self.CONFLICT_COLUMNS.get(dataset_name)
+        if not conflict_columns:
+            return f"{insert_sql};"
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c not in conflict_columns)
+        return (f"{insert_sql} ON CONFLICT({', '.join(conflict_columns)}) "
+                f"DO UPDATE SET {updates};")
+
+    def add_batch_hook(self, dataset_name, hook):
+        """
+        Registers hook(conn, dataset_name, rows) to run after every chunk of a
+        dataset is written, inside the same transaction. `rows` are the raw
+        records of the chunk. Hooks let derived state (indexes, rollups,
+        assignments) be maintained incrementally at ingest time.
+        """
+        self.batch_hooks.setdefault(dataset_name, []).append(hook)
+
+    def get_watermark(self, dataset_name):
+        """Returns the high-water mark recorded by the last sync of a dataset, if any."""
+        conn, cur = self._get_connection()
+        cur.execute(self.TABLE_SCHEMAS["sync_state"])
+        watermark = read_watermark(cur, dataset_name)
+        cur.close()
+        conn.close()
+        return watermark
+
+    def insert_generic(self, dataset_name, schema_sql, insert_sql, chunk_mapper, data):
+        """
+        Core instance method for inserting data with any schema.
+        `data` may be any iterable of rows (e.g. a generator streaming pages
+        from the API); `chunk_mapper` turns a list of raw rows into a list of
+        value tuples. Rows are mapped and written with executemany in chunks of
+        self.chunk_size rows, one transaction per chunk, so memory stays bounded.
+        The dataset's sync watermark is advanced in the same transaction as
+        each chunk. Returns a dict of load statistics for the dataset.
+        """
         conn, cur = self._get_connection()
         cur.execute(schema_sql) # Ensure table exists 
+        cur.execute(self.TABLE_SCHEMAS["sync_state"])
+        watermark_column, _ = get_watermark_column(dataset_name)
+        watermark = None
         
-        changes_before = conn.total_changes
+        attempted_count = 0
+        inserted_count = 0
+        write_seconds = 0.0
+        start = time.perf_counter()
    
-        for row in data:
-            values = row_mapper(row)
-            cur.execute(insert_sql, values)
-        
-        conn.commit()
+        for chunk in iter_chunks(data, self.chunk_size):
+            with metrics.stage("insert_map", dataset=dataset_name):
+                values = chunk_mapper(chunk)
+            write_start = time.perf_counter()
+            written, watermark = self.write_chunk(conn, dataset_name, insert_sql, values, chunk,
+                                                  watermark_column, watermark)
+            inserted_count += written
+            write_seconds += time.perf_counter() - write_start
+            attempted_count += len(chunk)
 
-        changes_after = conn.total_changes
-        inserted_count = changes_after - changes_before
+        elapsed = time.perf_counter() - start
+        rows_per_sec = attempted_count / elapsed if elapsed > 0 else 0.0
 
-        logging.info(f"Attempted {len(data)} inserts. " 
-                     f"Actually inserted {inserted_count} new rows into {dataset_name}.")
+        logging.info(f"Attempted {attempted_count} inserts. " 
+                     f"Inserted or updated {inserted_count} rows in {dataset_name}.")
+        logging.info(f"[{dataset_name}] {rows_per_sec:,.0f} rows/sec overall "
+                     f"({elapsed:.2f}s total, {write_seconds:.2f}s in SQLite writes).")
         
         cur.close()
         conn.close()
 
-    # ==========================
-    # DATASET INSERT METHODS
-    # ==========================
-    def insert_parks_events(self, data: List[Dict]) -> None:
-        """Insert park events into an SQLite database."""
-        dataset_name = "nyc_parks_events"
-        insert_sql = f"""
-            INSERT OR IGNORE INTO {dataset_name} (
-                event_name, location, date_and_time, borough,
-                location_type, group_name_partner, event_type,
-                category, attendance, audience, source
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+        return {
+            "dataset": dataset_name,
+            "attempted": attempted_count,
+            "inserted": inserted_count,
+            "watermark": watermark,
+            "seconds": elapsed,
+            "write_seconds": write_seconds,
+            "rows_per_sec": rows_per_sec,
+        }
+
+    def write_chunk(self, conn, dataset_name, insert_sql, values, rows, watermark_column, watermark=None):
+        """
+        Writes one mapped chunk in a single transaction: the rows, the
+        dataset's batch hooks and its advanced sync watermark. `rows` are the
+        raw records behind `values`. Returns (rows written, new watermark).
         """
+        chunk_watermark = max_watermark(rows, watermark_column, current=watermark)
+        cur = conn.cursor()
+        with conn: # One transaction per chunk, committed on exit
+            with metrics.stage("insert_execute", dataset=dataset_name):
+                cur.executemany(insert_sql, values)
+            written = cur.rowcount # Unlike total_changes, excludes rows written by triggers
+            for hook in self.batch_hooks.get(dataset_name, []):
+                hook_name = getattr(hook, "__qualname__", type(hook).__name__)
+                with metrics.stage("insert_hook", dataset=dataset_name, hook=hook_name):
+                    hook(conn, dataset_name, rows)
+            if chunk_watermark is not None:
+                write_watermark(cur, dataset_name, watermark_column, chunk_watermark, len(rows))
+            commit_start = time.perf_counter()
+        metrics.observe("insert_commit", time.perf_counter() - commit_start, dataset=dataset_name)
+        cur.close()
+        metrics.inc("insert_rows_attempted", len(rows), dataset=dataset_name)
+        metrics.inc("insert_rows_written", written, dataset=dataset_name)
+        return written, chunk_watermark
 
-        def row_mapper(row):
-            try:
-                dt = date_parser.parse(row.get("date_and_time", "")).isoformat(sep=' ')
-            except (ValueError, TypeError):
-                dt = None
-            return (
-                row.get("event_name", "N/A"),
-                row.get("location", "N/A"),
-                dt,
-                row.get("borough", "N/A"),
-                row.get("location_type", "N/A"),
-                row.get("group_name_partner", "N/A"),
-                row.get("event_type", "N/A"),
-                row.get("category", "N/A"),
-                self.try_int(row.get("attendance", 0)),
-                row.get("audience", "N/A"),
-                row.get("source", "N/A")
-            )
+    def dataset_insert(self, dataset_name):
+        """(upsert SQL, chunk mapper) for a dataset declared in DATASET_SPECS."""
+        columns = DATASET_SPECS[dataset_name]
+        return self._build_upsert_sql(dataset_name, [c.name for c in columns]), partial(convert_records, columns)
 
-        return self.insert_generic(
-            dataset_name,
-            self.TABLE_SCHEMAS[dataset_name],
-            insert_sql,
-            row_mapper,
-            data
-        )
-    
-    def insert_permitted_events_historical(self, data: List[Dict]) -> None:
-        """Insert permitted events (historical) into SQLite database"""
-        dataset_name = "nyc_permitted_events_historical"
-        insert_sql = f"""
-                INSERT OR IGNORE INTO {dataset_name} (
-                    event_id, event_name, start_date_time, end_date_time,
-                    event_agency, event_type, event_borough, event_location,
-                    event_street_side, street_closure_type, community_board, police_precinct
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    def open_writer(self, dataset_names=()):
         """
-    
-        def row_mapper(row):
-            # Convert dict row to tuple of values in order expected by insert_sql       
-            return (
-                row.get("event_id"),
-                row.get("event_name", "N/A"),
-                row.get("start_date_time", "N/A"),
-                row.get("end_date_time", "N/A"),
-                row.get("event_agency", "N/A"),
-                row.get("event_type", "N/A"),
-                row.get("event_borough", "N/A"),
-                row.get("event_location", "N/A"),
-                row.get("event_street_side", "N/A"),
-                row.get("street_closure_type", "N/A"),
-                row.get("community_board", "N/A"),
-                row.get("police_precinct", "N/A")
-            )
-
-        return self.insert_generic(
-            dataset_name,
-            self.TABLE_SCHEMAS[dataset_name],
-            insert_sql,
-            row_mapper,
-            data
-        )
-    
-    def insert_permitted_events_future(self, data: List[Dict]) -> None:
-        """Insert real-time (1 mo) permitted events into SQLite database."""
-        dataset_name = "nyc_permitted_events_future"
-        insert_sql = f"""
-                INSERT OR IGNORE INTO {dataset_name} (
-                    event_id, event_name, start_date_time, end_date_time,
-                    event_agency, event_type, event_borough, event_location,
-                    event_street_side, street_closure_type, community_board, police_precinct
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        Opens a tuned connection for a long-lived writer (see write_chunk),
+        with sync_state and the given datasets' tables created if missing.
         """
-    
-        def row_mapper(row):
-            # Convert dict row to tuple of values in order expected by insert_sql       
-            return (
-                row.get("event_id"),
-                row.get("event_name", "N/A"),
-                row.get("start_date_time", "N/A"),
-                row.get("end_date_time", "N/A"),
-                row.get("event_agency", "N/A"),
-                row.get("event_type", "N/A"),
-                row.get("event_borough", "N/A"),
-                row.get("event_location", "N/A"),
-                row.get("event_street_side", "N/A"),
-                row.get("street_closure_type", "N/A"),
-                row.get("community_board", "N/A"),
-                row.get("police_precinct", "N/A")
-            )
+        conn, cur = self._get_connection()
+        cur.execute(self.TABLE_SCHEMAS["sync_state"])
+        for dataset_name in dataset_names:
+            cur.execute(self.TABLE_SCHEMAS[dataset_name])
+        conn.commit()
+        cur.close()
+        return conn
+
+    def insert_dataset(self, dataset_name: str, data: Iterable[Dict]) -> Dict:
+        """Insert any dataset declared in DATASET_SPECS, converting rows a chunk at a time."""
+        insert_sql, chunk_mapper = self.dataset_insert(dataset_name)
 
         return self.insert_generic(
             dataset_name,
             self.TABLE_SCHEMAS[dataset_name],
             insert_sql,
-            row_mapper,
+            chunk_mapper,
             data
         )
 
-    def insert_311_requests(self, data: List[Dict]) -> None:
-        """Insert 311 requests into SQLite database"""
-        dataset_name = "nyc_311_requests"
-        insert_sql = f"""
-                INSERT OR IGNORE INTO {dataset_name} (
-                    unique_key, created_date, closed_date, agency, agency_name,
-                    complaint_type, descriptor, location_type, incident_zip,
-                    incident_address, street_name, city, status, due_date,
-                    resolution_description, resolution_action_updated_date,
-                    borough, latitude, longitude
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
-    
-        def row_mapper(row):
-            # Convert dict row to tuple of values in order expected by insert_sql       
-            return (
-                row.get("unique_key"),
-                row.get("created_date", "N/A"),
-                row.get("closed_date", "N/A"),
-                row.get("agency", "N/A"),
-                row.get("agency_name", "N/A"),
-                row.get("complaint_type", "N/A"),
-                row.get("descriptor", "N/A"),
-                row.get("location_type", "N/A"),
-                row.get("incident_zip", "N/A"),
-                row.get("incident_address", "N/A"),
-                row.get("street_name", "N/A"),
-                row.get("city", "N/A"),
-                row.get("status", "N/A"),
-                row.get("due_date", "N/A"),
-                row.get("resolution_description", "N/A"),
-                row.get("resolution_action_updated_date", "N/A"),
-                row.get("borough", "N/A"),
-                self.try_float(row.get("latitude", 0.0)),
-                self.try_float(row.get("longitude", 0.0))
-            )
+    # ==========================
+    # DATASET INSERT METHODS
+    # ==========================
+    def insert_parks_events(self, data: Iterable[Dict]) -> Dict:
+        """Insert park events into an SQLite database."""
+        return self.insert_dataset("nyc_parks_events", data)
 
-        return self.insert_generic(
-            dataset_name,
-            self.TABLE_SCHEMAS[dataset_name],
-            insert_sql,
-            row_mapper,
-            data
-        )
+    def insert_permitted_events_historical(self, data: Iterable[Dict]) -> Dict:
+        """Insert permitted events (historical) into SQLite database"""
+        return self.insert_dataset("nyc_permitted_events_historical", data)
+
+    def insert_permitted_events_future(self, data: Iterable[Dict]) -> Dict:
+        """Insert real-time (1 mo) permitted events into SQLite database."""
+        return self.insert_dataset("nyc_permitted_events_future", data)
+
+    def insert_311_requests(self, data: Iterable[Dict]) -> Dict:
+        """Insert 311 requests into SQLite database"""
+        return self.insert_dataset("nyc_311_requests", data)
 
-    def insert_311_resolutions(self, data: List[Dict]) -> None:
+    def insert_311_resolutions(self, data: Iterable[Dict]) -> Dict:
         """Insert 311 resolution responses into SQLite database"""
-        dataset_name = "nyc_311_resolutions"
-        insert_sql = f"""
-                INSERT OR IGNORE INTO {dataset_name} (
-                    unique_key, agency, agency_name, complaint_type, descriptor,
-                    borough, resolution_description, year, month,
-                    overall_satisfaction, dissatisfaction_reason
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
-    
-        def row_mapper(row):
-            # Convert dict row to tuple of values in order expected by insert_sql       
-            return (
-                row.get("unique_key"),
-                row.get("agency", "N/A"),
-                row.get("agency_name", "N/A"),
-                row.get("complaint_type", "N/A"),
-                row.get("descriptor", "N/A"),
-                row.get("borough", "N/A"),
-                row.get("resolution_description", "N/A"),
-                self.try_int(row.get("year", 0)),
-                self.try_int(row.get("month", 0)),
-                row.get("overall_satisfaction", "N/A"),
-                row.get("dissatisfaction_reason", "N/A")
-            )
+        return self.insert_dataset("nyc_311_resolutions", data)
 
-        return self.insert_generic(
-            dataset_name,
-            self.TABLE_SCHEMAS[dataset_name],
-            insert_sql,
-            row_mapper,
-            data
-        )
-        
-    def insert_linknyc_status(self, data: List[Dict]) -> None:
+    def insert_linknyc_status(self, data: Iterable[Dict]) -> Dict:
         """Insert LinkNYC kiosk status into SQLite database"""
-        dataset_name = "linknyc_status"
-        insert_sql = f"""
-                INSERT OR IGNORE INTO {dataset_name} (
-                    generated_on, site_id, status, kiosk_type, ppt_id,
-                    address, city, state, zip, boro, latitude, longitude,
-                    cross_street_1, cross_street_2, corner, community_board,
-                    council_district, census_tract, nta, bbl, bin, install_date,
-                    active_date, wifi_status, wifi_status_date, tablet_status,
-                    tablet_status_date, phone_status, phone_status_date
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 
-                          ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
-    
-        def row_mapper(row):
-            # Convert dict row to tuple of values in order expected by insert_sql       
-            return (
-                row.get("generated_on"),
-                row.get("site_id"),
-                row.get("status"),
-                row.get("kiosk_type"),
-                row.get("ppt_id"),
-                row.get("address"),
-                row.get("city"),
-                row.get("state"),
-                row.get("zip"),
-                row.get("boro"),
-                self.try_float(row.get("latitude")),
-                self.try_float(row.get("longitude")),
-                row.get("cross_street_1"),
-                row.get("cross_street_2"),
-                row.get("corner"),
-                row.get("community_board"),
-                row.get("council_district"),
-                row.get("census_tract"),
-                row.get("nta"),
-                row.get("bbl"),
-                row.get("bin"),
-                row.get("install_date"),
-                row.get("active_date"),
-                row.get("wifi_status"),
-                row.get("wifi_status_date"),
-                row.get("tablet_status"),
-                row.get("tablet_status_date"),
-                row.get("phone_status"),
-                row.get("phone_status_date")
-            )
+        return self.insert_dataset("linknyc_status", data)
 
-        return self.insert_generic(
-            dataset_name,
-            self.TABLE_SCHEMAS[dataset_name],
-            insert_sql,
-            row_mapper,
-            data
-        )
-
-    def insert_sidewalk_status(self, data: List[Dict]) -> None:
+    def insert_sidewalk_status(self, data: Iterable[Dict]) -> Dict:
         """Insert sidewalk status into SQLite database"""
-        dataset_name = "nyc_sidewalk_status"
-        insert_sql = f"""
-                INSERT OR IGNORE INTO {dataset_name} (
-                    broken, cb, certi_date, contract, entrydate, flag, frstname,
-                    grace_pd, hardware, house_num, integrity, onfrtocode, onstname,
-                    other_def, patchwork, post_date, slope, sq_feet, sw_missing,
-                    swv_number, tostname, trip_haz, undermined, vdismissdate,
-                    violationid, vissuedate, bblid
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 
-                          ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
-    
-        def row_mapper(row):
-            # Convert dict row to tuple of values in order expected by insert_sql       
-            return (
-                row.get("broken"),
-                try_int(row.get("cb")),
-                row.get("certi_date"),
-                row.get("contract"),
-                row.get("entrydate"),
-                row.get("flag"),
-                row.get("frstname"),
-                self.try_int(row.get("grace_pd")),
-                row.get("hardware"),
-                row.get("house_num"),
-                row.get("integrity"),
-                row.get("onfrtocode"),
-                row.get("onstname"),
-                row.get("other_def"),
-                row.get("patchwork"),
-                row.get("post_date"),
-                row.get("slope"),
-                self.try_int(row.get("sq_feet")),
-                row.get("sw_missing"),
-                self.try_int(row.get("swv_number")),
-                row.get("tostname"),
-                row.get("trip_haz"),
-                row.get("undermined"),
-                row.get("vdismissdate"),
-                self.try_int(row.get("violationid")),
-                row.get("vissuedate"),
-                self.try_int(row.get("bblid"))
-            )
-
-        return self.insert_generic(
-            dataset_name,
-            self.TABLE_SCHEMAS[dataset_name],
-            insert_sql,
-            row_mapper,
-            data
-        )
+        return self.insert_dataset("nyc_sidewalk_status", data)
 
-    def insert_tree_points(self, data: List[Dict]) -> None:
+    def insert_tree_points(self, data: Iterable[Dict]) -> Dict:
         """Insert tree point into SQLite database"""
-        dataset_name = "nyc_tree_points"
-        insert_sql = f"""
-                INSERT OR IGNORE INTO {dataset_name} (
-                    objectid, dbh, tpstructure, tpcondition, stumpdiameter,
-                    plantingspaceglobalid, geometry, globalid, genusspecies,
-                    createddate, updateddate, planteddate, riskrating,
-                    riskratingdate, location
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
-    
-        def row_mapper(row):
-            # Convert dict row to tuple of values in order expected by insert_sql       
-            return (
-                self.try_int(row.get("objectid")),
-                self.try_int(row.get("dbh")),
-                row.get("tpstructure"),
-                row.get("tpcondition"),
-                row.get("stumpdiameter"),
-                row.get("plantingspaceglobalid"),
-                row.get("geometry"),
-                row.get("globalid"),
-                row.get("genusspecies"),
-                row.get("createddate"),
-                row.get("updateddate"),
-                row.get("planteddate"),
-                row.get("riskrating"),
-                row.get("riskratingdate"),
-                row.get("location")
-            )
+        return self.insert_dataset("nyc_tree_points", data)
 
-        return self.insert_generic(
-            dataset_name,
-            self.TABLE_SCHEMAS[dataset_name],
-            insert_sql,
-            row_mapper,
-            data
-        )
+    def insert_social_posts(self, data: Iterable[Dict]) -> Dict:
+        """Insert social media posts into SQLite database"""
+        return self.insert_dataset("social_posts", data)
@@ -1,6 +1,7 @@
 from instagrapi import Client
 from instagrapi.exceptions import LoginRequired
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,31 +9,66 @@ load_dotenv()
 USERNAME = os.getenv("IG_USERNAME")
 PASSWORD = os.getenv("IG_PASSWORD")
 
-def get_logged_in_client(session_file: str = "session.json") -> Client:
+def get_logged_in_client(session_file: str = "session.json", username: str = None,
+                         password: str = None) -> Client:
     """
     Returns an authenticated Client:
-    - Tries to load an existing session.
-    - Logs in if needed.
-    - Handles automatic re-login if session is expired.
+    - Reuses a saved session (no password login) if it is still valid.
+    - Logs in once otherwise, keeping the saved device ids.
+    - Saves the session for next time.
     """
+    username = username or USERNAME
+    password = password or PASSWORD
     cl = Client()
 
     if os.path.exists(session_file):
         try:
             cl.load_settings(session_file)
-            cl.login(USERNAME, PASSWORD)  # Verifies session
+            cl.login(username, password)  # Picks up the saved session cookies
+            cl.get_timeline_feed()        # Cheap call that fails if the session expired
+            cl.dump_settings(session_file)
             return cl
         except Exception as e:
-            print(f"Session invalid or expired, trying again... ({e})")
-            cl.login(USERNAME, PASSWORD)
+            print(f"Session invalid or expired, logging in again... ({e})")
+            uuids = cl.get_settings().get("uuids")
+            cl.set_settings({})
+            if uuids:
+                cl.set_uuids(uuids) # Same device as before, which Instagram flags less
 
-    # Always dump settings after successful login
-    cl.login(USERNAME, PASSWORD)
+    cl.login(username, password)
     cl.dump_settings(session_file)
     return cl
 
+class InstagramAccount:
+    """
+    One long-lived logged-in client for an account, shared by every fetch.
+    Logs in lazily on first use, and once more if Instagram expires the
+    session. instagrapi clients are not thread-safe, so calls on one
+    account are serialized; use several accounts for parallel fetches.
+    """
+    def __init__(self, username: str = None, password: str = None, session_file: str = "session.json"):
+        self.username = username or USERNAME
+        self.password = password or PASSWORD
+        self.session_file = session_file
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> Client:
+        if self._client is None:
+            self._client = get_logged_in_client(self.session_file, self.username, self.password)
+        return self._client
+
+    def hashtag_medias_recent(self, hashtag: str, amount: int = 50):
+        """Recent posts for a hashtag (without #), as instagrapi Media objects."""
+        with self._lock:
+            try:
+                return self.client.hashtag_medias_recent(hashtag, amount=amount)
+            except LoginRequired:
+                self._client = None # Session expired mid-run: log in again and retry once
+                return self.client.hashtag_medias_recent(hashtag, amount=amount)
+
 if __name__ == "__main__":
     # Enables running this script directly for testing
     client = get_logged_in_client()
     print(f"Logged in as: {client.username}")
-
@@ -0,0 +1,306 @@
+import io
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable
+from functools import partial
+import psycopg2
+from line_jb.data_ingestion.dataset_specs import DATASET_SPECS, convert_records
+from line_jb.data_ingestion.insert_manager import (
+    InsertManager, iter_chunks, load_table_schemas_from_file, parse_column_definitions
+)
+from line_jb.data_ingestion.sync_state import get_watermark_column, max_watermark
+from line_jb.instrumentation import metrics
+
+logging.basicConfig(level=logging.INFO)
+
+__all__ = ["PostgresInsertManager"]
+
+# Postgres types for DATASET_SPECS column types. Dates stay text, as in SQLite,
+# so the values (and every query comparing them) are the same on both backends.
+SPEC_TYPES = {
+    "text": "TEXT",
+    "datetime": "TEXT",
+    "int": "BIGINT",
+    "epoch": "BIGINT",
+    "float": "DOUBLE PRECISION",
+    "point_x": "DOUBLE PRECISION",
+    "point_y": "DOUBLE PRECISION",
+}
+
+# Postgres types for the declared types of db/schema.sql columns outside the specs
+SCHEMA_TYPES = {
+    "INTEGER": "BIGINT",
+    "REAL": "DOUBLE PRECISION",
+    "TEXT": "TEXT",
+}
+
+SRID = 4326
+
+SYNC_STATE_DDL = """
+CREATE TABLE IF NOT EXISTS sync_state (
+    dataset_name TEXT PRIMARY KEY,
+    watermark_column TEXT,
+    watermark TEXT,
+    rows_synced BIGINT DEFAULT 0,
+    updated_at TEXT
+);
+"""
+
+def _csv_field(value):
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return '"' + value.replace("\x00", "").replace('"', '""') + '"'
+    return str(value)
+
+def copy_buffer(values):
+    """
+    Encodes value tuples as COPY ... (FORMAT csv) input. Text is always
+    quoted, so an empty string stays distinct from NULL (an unquoted empty
+    field); NUL characters, which Postgres text cannot hold, are dropped.
+    """
+    buffer = io.StringIO()
+    for row in values:
+        buffer.write(",".join(map(_csv_field, row)))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+class PostgresInsertManager:
+    """
+    InsertManager for a PostgreSQL/PostGIS database, built from the same
+    DATASET_SPECS and CONFLICT_COLUMNS. Each chunk is streamed with COPY FROM
+    STDIN into a temporary staging table and merged into its table with one
+    INSERT ... ON CONFLICT DO UPDATE, in the same transaction as its batch
+    hooks and sync watermark. Tables with latitude/longitude get a generated
+    PostGIS point column `geom` (EPSG:4326) with a GiST index.
+
+    Exposes the parts of InsertManager the pipeline uses (chunk_size,
+    get_watermark, table_exists, add_batch_hook, dataset_insert, open_writer,
+    write_chunk, insert_dataset). Batch hooks receive the psycopg2 connection.
+    """
+    CONFLICT_COLUMNS = InsertManager.CONFLICT_COLUMNS
+
+    def __init__(self, dsn, schema_path='db/schema.sql', chunk_size=20000):
+        self.dsn = dsn
+        self.chunk_size = chunk_size
+        self.TABLE_SCHEMAS = load_table_schemas_from_file(schema_path)
+        # dataset_name -> callables run inside each chunk's transaction
+        self.batch_hooks = {}
+
+    # ==========================
+    # SCHEMA
+    # ==========================
+    def _get_connection(self):
+        return psycopg2.connect(self.dsn)
+
+    def table_columns(self, dataset_name):
+        """
+        (name, Postgres type) of a dataset's columns: its DATASET_SPECS columns,
+        then any other columns db/schema.sql declares for the table (e.g. the
+        coordinates and park_id filled in by the geocoder and park index).
+        """
+        columns = [(c.name, SPEC_TYPES[c.type]) for c in DATASET_SPECS[dataset_name]]
+        seen = {name for name, _ in columns} | {"id"}
+        create_statement = self.TABLE_SCHEMAS.get(dataset_name)
+        if create_statement:
+            for name, declared in parse_column_definitions(create_statement):
+                if name not in seen:
+                    columns.append((name, SCHEMA_TYPES.get(declared.upper(), "TEXT")))
+                    seen.add(name)
+        return columns
+
+    def table_ddl(self, dataset_name):
+        """CREATE/ALTER statements for a dataset's table, its unique key and its geometry index."""
+        columns = self.table_columns(dataset_name)
+        column_names = {name for name, _ in columns}
+        statements = [
+            f"CREATE TABLE IF NOT EXISTS {dataset_name} ("
+            + ", ".join(["id BIGSERIAL PRIMARY KEY"] + [f"{name} {pg_type}" for name, pg_type in columns])
+            + ");"
+        ]
+        # Tables created by an older version of the specs
+        statements += [f"ALTER TABLE {dataset_name} ADD COLUMN IF NOT EXISTS {name} {pg_type};"
+                       for name, pg_type in columns]
+        conflict_columns = self.CONFLICT_COLUMNS.get(dataset_name)
+        if conflict_columns:
+            statements.append(f"CREATE UNIQUE INDEX IF NOT EXISTS {dataset_name}_key "
+                              f"ON {dataset_name} ({', '.join(conflict_columns)});")
+        if {"latitude", "longitude"} <= column_names:
+            statements.append(
+                f"ALTER TABLE {dataset_name} ADD COLUMN IF NOT EXISTS geom geometry(Point, {SRID}) "
+                f"GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(longitude, latitude), {SRID})) STORED;"
+            )
+            statements.append(f"CREATE INDEX IF NOT EXISTS {dataset_name}_geom "
+                              f"ON {dataset_name} USING GIST (geom);")
+        return statements
+
+    def _ensure_tables(self, cur, dataset_names):
+        cur.execute(SYNC_STATE_DDL)
+        for dataset_name in dataset_names:
+            for statement in self.table_ddl(dataset_name):
+                cur.execute(statement)
+
+    @staticmethod
+    def initialize_database(dsn: str, schema_path: str = 'db/schema.sql'):
+        """Creates the PostGIS extension, sync_state and every DATASET_SPECS table (run once)."""
+        manager = PostgresInsertManager(dsn, schema_path)
+        conn = manager._get_connection()
+        with conn, conn.cursor() as cur:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS postgis;")
+            manager._ensure_tables(cur, DATASET_SPECS)
+        conn.close()
+        logging.info("PostGIS database schema initialized.")
+
+    def table_exists(self, dataset_name: str) -> bool:
+        conn = self._get_connection()
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (dataset_name,))
+            exists = cur.fetchone()[0]
+        conn.close()
+        return exists
+
+    # ==========================
+    # LOADING
+    # ==========================
+    def _build_merge_sql(self, dataset_name, columns):
+        """
+        INSERT ... SELECT moving a chunk from the staging table into its table.
+        When a key repeats within the chunk only its last row is kept (ON
+        CONFLICT cannot touch a row twice in one statement), matching the
+        row-by-row upsert in SQLite. Rows with a NULL key never conflict and
+        are inserted as they are.
+        """
+        column_list = ", ".join(columns)
+        staging = f"{dataset_name}_staging"
+        insert_sql = f"INSERT INTO {dataset_name} ({column_list})"
+        conflict_columns = self.CONFLICT_COLUMNS.get(dataset_name)
+        if not conflict_columns:
+            return f"{insert_sql} SELECT {column_list} FROM {staging} ORDER BY _seq;"
+        keys = ", ".join(conflict_columns)
+        has_key = " AND ".join(f"{c} IS NOT NULL" for c in conflict_columns)
+        updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in columns if c not in conflict_columns)
+        return (
+            f"{insert_sql} "
+            f"SELECT {column_list} FROM (SELECT DISTINCT ON ({keys}) {column_list} FROM {staging} "
+            f"WHERE {has_key} ORDER BY {keys}, _seq DESC) latest "
+            f"UNION ALL SELECT {column_list} FROM {staging} WHERE NOT ({has_key}) "
+            f"ON CONFLICT ({keys}) DO UPDATE SET {updates};"
+        )
+
+    def _staging_ddl(self, dataset_name):
+        """Session-local staging table for a dataset's chunks, emptied at every commit."""
+        types = dict(self.table_columns(dataset_name))
+        columns = ", ".join(f"{c.name} {types[c.name]}" for c in DATASET_SPECS[dataset_name])
+        return (f"CREATE TEMP TABLE IF NOT EXISTS {dataset_name}_staging "
+                f"({columns}, _seq BIGSERIAL) ON COMMIT DELETE ROWS;")
+
+    def add_batch_hook(self, dataset_name, hook):
+        """Registers hook(conn, dataset_name, rows), run inside each chunk's transaction (see InsertManager)."""
+        self.batch_hooks.setdefault(dataset_name, []).append(hook)
+
+    def get_watermark(self, dataset_name):
+        """Returns the high-water mark recorded by the last sync of a dataset, if any."""
+        conn = self._get_connection()
+        with conn, conn.cursor() as cur:
+            cur.execute(SYNC_STATE_DDL)
+            cur.execute("SELECT watermark FROM sync_state WHERE dataset_name = %s;", (dataset_name,))
+            row = cur.fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    @staticmethod
+    def _write_watermark(cur, dataset_name, column, watermark, rows_synced):
+        """sync_state.write_watermark for Postgres; runs in the chunk's transaction."""
+        cur.execute(
+            """
+            INSERT INTO sync_state (dataset_name, watermark_column, watermark, rows_synced, updated_at)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (dataset_name) DO UPDATE SET
+                watermark_column = EXCLUDED.watermark_column,
+                watermark = EXCLUDED.watermark,
+                rows_synced = sync_state.rows_synced + EXCLUDED.rows_synced,
+                updated_at = EXCLUDED.updated_at;
+            """,
+            (dataset_name, column, str(watermark), rows_synced,
+             datetime.now(timezone.utc).isoformat(timespec="seconds")),
+        )
+
+    def write_chunk(self, conn, dataset_name, merge_sql, values, rows, watermark_column, watermark=None):
+        """
+        Writes one mapped chunk in a single transaction: COPY into staging,
+        the merge, the dataset's batch hooks and its advanced sync watermark.
+        Returns (rows inserted or updated, new watermark).
+        """
+        chunk_watermark = max_watermark(rows, watermark_column, current=watermark)
+        columns = ", ".join(c.name for c in DATASET_SPECS[dataset_name])
+        with conn, conn.cursor() as cur: # One transaction per chunk, committed on exit
+            cur.execute(self._staging_ddl(dataset_name))
+            with metrics.stage("insert_copy", dataset=dataset_name):
+                cur.copy_expert(f"COPY {dataset_name}_staging ({columns}) FROM STDIN WITH (FORMAT csv)",
+                                copy_buffer(values))
+            with metrics.stage("insert_execute", dataset=dataset_name):
+                cur.execute(merge_sql)
+            written = cur.rowcount
+            for hook in self.batch_hooks.get(dataset_name, []):
+                hook_name = getattr(hook, "__qualname__", type(hook).__name__)
+                with metrics.stage("insert_hook", dataset=dataset_name, hook=hook_name):
+                    hook(conn, dataset_name, rows)
+            if chunk_watermark is not None:
+                self._write_watermark(cur, dataset_name, watermark_column, chunk_watermark, len(rows))
+            commit_start = time.perf_counter()
+        metrics.observe("insert_commit", time.perf_counter() - commit_start, dataset=dataset_name)
+        metrics.inc("insert_rows_attempted", len(rows), dataset=dataset_name)
+        metrics.inc("insert_rows_written", written, dataset=dataset_name)
+        return written, chunk_watermark
+
+    def dataset_insert(self, dataset_name):
+        """(merge SQL, chunk mapper) for a dataset declared in DATASET_SPECS."""
+        columns = DATASET_SPECS[dataset_name]
+        return self._build_merge_sql(dataset_name, [c.name for c in columns]), partial(convert_records, columns)
+
+    def open_writer(self, dataset_names=()):
+        """Opens a connection for a long-lived writer, with sync_state and the datasets' tables created."""
+        conn = self._get_connection()
+        with conn, conn.cursor() as cur:
+            self._ensure_tables(cur, dataset_names)
+        return conn
+
+    def insert_dataset(self, dataset_name: str, data: Iterable[Dict]) -> Dict:
+        """Loads any dataset declared in DATASET_SPECS, a chunk at a time; returns load statistics."""
+        merge_sql, chunk_mapper = self.dataset_insert(dataset_name)
+        watermark_column, _ = get_watermark_column(dataset_name)
+        conn = self.open_writer([dataset_name])
+        watermark = None
+        attempted_count = 0
+        inserted_count = 0
+        write_seconds = 0.0
+        start = time.perf_counter()
+
+        for chunk in iter_chunks(data, self.chunk_size):
+            with metrics.stage("insert_map", dataset=dataset_name):
+                values = chunk_mapper(chunk)
+            write_start = time.perf_counter()
+            written, watermark = self.write_chunk(conn, dataset_name, merge_sql, values, chunk,
+                                                  watermark_column, watermark)
+            inserted_count += written
+            write_seconds += time.perf_counter() - write_start
+            attempted_count += len(chunk)
+        conn.close()
+
+        elapsed = time.perf_counter() - start
+        rows_per_sec = attempted_count / elapsed if elapsed > 0 else 0.0
+        logging.info(f"Attempted {attempted_count} inserts. "
+                     f"Inserted or updated {inserted_count} rows in {dataset_name}.")
+        logging.info(f"[{dataset_name}] {rows_per_sec:,.0f} rows/sec overall "
+                     f"({elapsed:.2f}s total, {write_seconds:.2f}s in Postgres writes).")
+        return {
+            "dataset": dataset_name,
+            "attempted": attempted_count,
+            "inserted": inserted_count,
+            "watermark": watermark,
+            "seconds": elapsed,
+            "write_seconds": write_seconds,
+            "rows_per_sec": rows_per_sec,
+        }
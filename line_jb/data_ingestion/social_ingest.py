@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+logging.basicConfig(level=logging.INFO)
+
+__all__ = ["TokenBucket", "SocialIngestWorker", "media_to_record"]
+
+# Default request budget per Instagram account: a burst, then one call every 4s
+DEFAULT_RATE_PER_SEC = 0.25
+DEFAULT_BURST = 5
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: holds up to `capacity` tokens, refilled at
+    `rate` tokens per second. acquire() blocks until a token is available,
+    so callers proceed as fast as the budget allows and no faster.
+    `clock` and `sleep` can be swapped for a fake clock in tests.
+    """
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(capacity)
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Takes `tokens`, waiting as needed; returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                shortfall = (tokens - self.tokens) / self.rate
+            self.sleep(shortfall) # Outside the lock, so other threads can refill and check
+            waited += shortfall
+
+def media_to_record(media, hashtag, fetched_at=None):
+    """Flattens an instagrapi Media (or any object with the same attributes) into a social_posts record."""
+    taken_at = getattr(media, "taken_at", None)
+    user = getattr(media, "user", None)
+    location = getattr(media, "location", None)
+    code = getattr(media, "code", None)
+    return {
+        "platform": "instagram",
+        "post_id": str(getattr(media, "pk", None) or getattr(media, "id", "")),
+        "hashtag": hashtag,
+        "username": getattr(user, "username", None),
+        "content": getattr(media, "caption_text", None),
+        "posted_at": taken_at.isoformat() if isinstance(taken_at, datetime) else taken_at,
+        "like_count": getattr(media, "like_count", None),
+        "comment_count": getattr(media, "comment_count", None),
+        "media_type": getattr(media, "media_type", None),
+        "url": f"https://www.instagram.com/p/{code}/" if code else None,
+        "latitude": getattr(location, "lat", None),
+        "longitude": getattr(location, "lng", None),
+        "fetched_at": fetched_at or datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+class SocialIngestWorker:
+    """
+    Fetches recent posts for many hashtags and stores them in social_posts
+    through InsertManager, like the NYC datasets (so batch hooks such as the
+    trend monitor see them too).
+
+    Each account is one long-lived client (e.g. InstagramAccount) with its
+    own token bucket; fetches run on a thread pool and take whichever
+    account is free, so throughput is set by the rate limits rather than by
+    logins or fixed sleeps. A client only needs a
+    hashtag_medias_recent(hashtag, amount) method, so a local stub works in
+    place of Instagram.
+    """
+    def __init__(self, inserter, clients, rate_per_sec=DEFAULT_RATE_PER_SEC, burst=DEFAULT_BURST,
+                 posts_per_hashtag=50, max_workers=None):
+        self.inserter = inserter
+        self.clients = list(clients)
+        if not self.clients:
+            raise ValueError("SocialIngestWorker needs at least one client.")
+        self.buckets = [TokenBucket(rate_per_sec, burst) for _ in self.clients]
+        self.posts_per_hashtag = posts_per_hashtag
+        self.max_workers = max_workers or 2 * len(self.clients)
+        self._next = 0
+        self._pick_lock = threading.Lock()
+
+    def _pick_account(self):
+        """Round-robin over the accounts, so the load spreads over their budgets."""
+        with self._pick_lock:
+            index = self._next
+            self._next = (self._next + 1) % len(self.clients)
+        return index
+
+    def _fetch(self, hashtag):
+        index = self._pick_account()
+        self.buckets[index].acquire()
+        medias = self.clients[index].hashtag_medias_recent(hashtag, amount=self.posts_per_hashtag)
+        fetched_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        return [media_to_record(media, hashtag, fetched_at) for media in medias]
+
+    def iter_pages(self, hashtags, failures=None):
+        """
+        Yields each hashtag's post records as its fetch completes (a pipeline
+        source for social_posts). Failed hashtags are logged and appended to
+        `failures` when given.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="social") as pool:
+            futures = {pool.submit(self._fetch, tag.lstrip("#")): tag for tag in hashtags}
+            for future in as_completed(futures):
+                try:
+                    records = future.result()
+                except Exception as e:
+                    if failures is not None:
+                        failures.append(futures[future])
+                    logging.warning(f"Fetching #{futures[future]} failed: {e}")
+                    continue
+                if records:
+                    yield records
+
+    def run(self, hashtags):
+        """Fetches and stores posts for every hashtag; returns insert stats plus any failed hashtags."""
+        failures = []
+        # The calling thread is the only writer
+        records = (record for page in self.iter_pages(hashtags, failures) for record in page)
+        stats = self.inserter.insert_social_posts(records)
+        stats["failed_hashtags"] = failures
+        logging.info(f"Ingested social posts for {len(hashtags) - len(failures)}/{len(hashtags)} hashtags.")
+        return stats
@@ -0,0 +1,81 @@
+import logging
+from datetime import datetime, timezone
+
+__all__ = [
+    "get_watermark_column",
+    "soql_literal",
+    "max_watermark",
+    "read_watermark",
+    "write_watermark",
+]
+
+# ==========================
+# WATERMARK CONFIGURATION
+# ==========================
+# Socrata's system field ':updated_at' changes whenever a row is created or
+# modified, so it catches both new and changed rows. Datasets whose rows are
+# never edited after publication can use a monotonically increasing id instead.
+DEFAULT_WATERMARK_COLUMN = (":updated_at", "timestamp")
+
+WATERMARK_COLUMNS = {
+    "nyc_permitted_events_historical": ("event_id", "number"),
+}
+
+def get_watermark_column(dataset_key):
+    """Returns (column, soql_type) used as the high-water mark for a dataset."""
+    return WATERMARK_COLUMNS.get(dataset_key, DEFAULT_WATERMARK_COLUMN)
+
+def soql_literal(value, soql_type="text"):
+    """Formats a Python value as a SoQL literal for use in a $where clause."""
+    if soql_type == "number":
+        float(value) # Raises on anything that is not a plain number
+        return str(value).strip()
+    return "'" + str(value).replace("'", "''") + "'"
+
+def watermark_sort_key(value):
+    """Orders numeric watermarks numerically and everything else as text."""
+    try:
+        return (0, float(value), "")
+    except (TypeError, ValueError):
+        return (1, 0.0, str(value))
+
+def max_watermark(rows, column, current=None):
+    """Returns the largest value of `column` across rows, starting from `current`."""
+    best = current
+    for row in rows:
+        value = row.get(column)
+        if value is None:
+            continue
+        if best is None or watermark_sort_key(value) > watermark_sort_key(best):
+            best = value
+    return best
+
+# ==========================
+# SYNC STATE TABLE ACCESS
+# ==========================
+def read_watermark(cur, dataset_name):
+    """Returns the stored watermark for a dataset, or None if it has never been synced."""
+    cur.execute("SELECT watermark FROM sync_state WHERE dataset_name = ?;", (dataset_name,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def write_watermark(cur, dataset_name, column, watermark, rows_synced):
+    """
+    Records a new watermark for a dataset. Meant to run inside the same
+    transaction as the rows it covers, so a crash never advances it past
+    uncommitted data.
+    """
+    cur.execute(
+        """
+        INSERT INTO sync_state (dataset_name, watermark_column, watermark, rows_synced, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(dataset_name) DO UPDATE SET
+            watermark_column = excluded.watermark_column,
+            watermark = excluded.watermark,
+            rows_synced = sync_state.rows_synced + excluded.rows_synced,
+            updated_at = excluded.updated_at;
+        """,
+        (dataset_name, column, str(watermark), rows_synced,
+         datetime.now(timezone.utc).isoformat(timespec="seconds")),
+    )
+    logging.debug(f"[{dataset_name}] watermark advanced to {watermark}.")
@@ -1,34 +1,108 @@
 import geopandas
+import numpy as np
 import pandas as pd
 import sqlite3
-from shapely.geometry import Point
 import logging
+from line_jb.geospatial.partitioned import count_points_in_polygons
+from line_jb.instrumentation import metrics
 
 logging.basicConfig(level=logging.INFO)
 
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE_LAT = 111320.0
+
+# Point tables with an R*Tree index maintained at ingest (see db/schema.sql)
+SPATIAL_INDEXES = {
+    "nyc_311_requests": "nyc_311_requests_rtree",
+    "linknyc_status": "linknyc_status_rtree",
+    "nyc_tree_points": "nyc_tree_points_rtree",
+}
+
+# Tree columns worth loading for analysis; the raw WKT text columns are left behind
+TREE_COLUMNS = ['objectid', 'dbh', 'tpcondition', 'tpstructure', 'genusspecies', 'riskrating']
+
+def haversine_m(lon1, lat1, lon2, lat2):
+    """Great-circle distance in meters; works elementwise on numpy arrays."""
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
 class GeoProcessor:
-    def __init__(self, db_path):
+    def __init__(self, db_path, parquet_cache=None):
         self.db_path = db_path
+        # Optional ParquetCache; fresh cached tables are read instead of SQLite
+        self.parquet_cache = parquet_cache
 
     def _get_connection(self):
         return sqlite3.connect(self.db_path)
 
-    def load_data_as_geodataframe(self, table_name, lat_col='latitude', lon_col='longitude'):
+    @staticmethod
+    @metrics.timed("geo_build_points")
+    def _points_to_geodataframe(df, lat_col, lon_col):
+        """Builds point geometries for a frame in one vectorized call from typed float arrays."""
+        lats = pd.to_numeric(df[lat_col], errors='coerce').to_numpy(dtype='float64')
+        lons = pd.to_numeric(df[lon_col], errors='coerce').to_numpy(dtype='float64')
+        valid = np.isfinite(lats) & np.isfinite(lons)
+        if not valid.all():
+            df, lats, lons = df[valid], lats[valid], lons[valid]
+        return geopandas.GeoDataFrame(df, geometry=geopandas.points_from_xy(lons, lats), crs="EPSG:4326")
+
+    @metrics.timed("geo_load", label_args=("table_name",))
+    def load_data_as_geodataframe(self, table_name, lat_col='latitude', lon_col='longitude',
+                                  columns=None, where=None, params=None,
+                                  time_col=None, start=None, end=None, chunksize=100000):
         """
         Loads a table from the database into a GeoDataFrame,
         assuming latitude and longitude columns exist.
+
+        Only `columns` (plus the coordinates) are read when given. `where` is an
+        extra SQL predicate with `params` bound to its placeholders, and
+        time_col/start/end restrict rows to start <= time_col < end. Rows are
+        read in chunks of `chunksize` and converted chunk by chunk.
+
+        When a parquet_cache is configured and holds an up-to-date copy of the
+        table, it is read from there instead (not possible with a raw `where`).
         """
+        if self.parquet_cache is not None and where is None:
+            try:
+                if self.parquet_cache.is_fresh(table_name):
+                    return self.parquet_cache.read(
+                        table_name, columns=columns,
+                        filter=self.parquet_cache.time_window_filter(time_col, start, end) if time_col else None
+                    )
+            except Exception as e:
+                logging.warning(f"Parquet cache read failed for {table_name}, falling back to SQLite: {e}")
+
         try:
+            select_cols = list(columns) if columns else ["*"]
+            if columns:
+                select_cols += [c for c in (lat_col, lon_col) if c not in columns]
+
+            conditions = [f"{lat_col} IS NOT NULL", f"{lon_col} IS NOT NULL"]
+            query_params = list(params or [])
+            if where:
+                conditions.append(f"({where})")
+            if time_col and start is not None:
+                conditions.append(f"{time_col} >= ?")
+                query_params.append(start)
+            if time_col and end is not None:
+                conditions.append(f"{time_col} < ?")
+                query_params.append(end)
+            sql = f"SELECT {', '.join(select_cols)} FROM {table_name} WHERE {' AND '.join(conditions)}"
+
             conn = self._get_connection()
-            df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
+            chunks = [
+                self._points_to_geodataframe(chunk, lat_col, lon_col)
+                for chunk in pd.read_sql_query(sql, conn, params=query_params, chunksize=chunksize)
+            ]
             conn.close()
 
-            # Drop rows where lat/lon are missing before creating points
-            df = df.dropna(subset=[lat_col, lon_col])
-
-            # Create Point geometries from latitude and longitude
-            geometry = [Point(xy) for xy in zip(df[lon_col], df[lat_col])]
-            gdf = geopandas.GeoDataFrame(df, geometry=geometry, crs="EPSG:4326")
+            if not chunks:
+                return geopandas.GeoDataFrame()
+            gdf = chunks[0] if len(chunks) == 1 else geopandas.GeoDataFrame(
+                pd.concat(chunks, ignore_index=True), geometry="geometry", crs="EPSG:4326"
+            )
+            metrics.inc("geo_rows_loaded", len(gdf), table_name=table_name)
             logging.info(f"Loaded {len(gdf)} records from {table_name} into GeoDataFrame.")
             return gdf
         except Exception as e:
@@ -43,6 +117,85 @@ class GeoProcessor:
         bbox_polygon = geopandas.GeoSeries([geopandas.geometry.box(min_lon, min_lat, max_lon, max_lat)], crs="EPSG:4326")
         return geodataframe[geodataframe.geometry.within(bbox_polygon.unary_union)]
 
+    @metrics.timed("geo_query_bbox", label_args=("table_name",))
+    def query_bbox(self, table_name, min_lon, min_lat, max_lon, max_lat, columns=None,
+                   lat_col='latitude', lon_col='longitude'):
+        """
+        Loads only the rows of a point table inside a bounding box, pushing the
+        filter down to SQLite. Tables listed in SPATIAL_INDEXES are probed
+        through their R*Tree; others fall back to a lat/lon range scan.
+        """
+        select_cols = ", ".join(f"t.{c}" for c in columns) if columns else "t.*"
+        if columns and lat_col not in columns:
+            select_cols += f", t.{lat_col}"
+        if columns and lon_col not in columns:
+            select_cols += f", t.{lon_col}"
+
+        rtree_name = SPATIAL_INDEXES.get(table_name)
+        if rtree_name:
+            # R*Tree stores 32-bit bounds (rounded outward), so re-check exact coordinates
+            sql = f"""
+                SELECT {select_cols} FROM {rtree_name} r
+                JOIN {table_name} t ON t.id = r.id
+                WHERE r.max_lon >= ? AND r.min_lon <= ? AND r.max_lat >= ? AND r.min_lat <= ?
+                  AND t.{lon_col} BETWEEN ? AND ? AND t.{lat_col} BETWEEN ? AND ?
+            """
+            params = (min_lon, max_lon, min_lat, max_lat, min_lon, max_lon, min_lat, max_lat)
+        else:
+            sql = f"""
+                SELECT {select_cols} FROM {table_name} t
+                WHERE t.{lon_col} BETWEEN ? AND ? AND t.{lat_col} BETWEEN ? AND ?
+            """
+            params = (min_lon, max_lon, min_lat, max_lat)
+
+        try:
+            conn = self._get_connection()
+            df = pd.read_sql_query(sql, conn, params=params)
+            conn.close()
+        except Exception as e:
+            logging.error(f"Error querying {table_name} by bounding box: {e}")
+            return geopandas.GeoDataFrame()
+
+        gdf = self._points_to_geodataframe(df, lat_col, lon_col)
+        logging.info(f"Loaded {len(gdf)} records from {table_name} inside bbox "
+                     f"({min_lon}, {min_lat}, {max_lon}, {max_lat}).")
+        return gdf
+
+    def query_radius(self, table_name, lon, lat, radius_m, columns=None,
+                     lat_col='latitude', lon_col='longitude'):
+        """
+        Loads the rows of a point table within radius_m meters of (lon, lat).
+        The enclosing bounding box is resolved in SQL (see query_bbox), then
+        exact great-circle distances are computed in one vectorized pass and
+        returned in a 'distance_m' column, nearest first.
+        """
+        dlat = radius_m / METERS_PER_DEGREE_LAT
+        dlon = radius_m / (METERS_PER_DEGREE_LAT * max(np.cos(np.radians(lat)), 1e-6))
+        gdf = self.query_bbox(table_name, lon - dlon, lat - dlat, lon + dlon, lat + dlat,
+                              columns=columns, lat_col=lat_col, lon_col=lon_col)
+        if gdf.empty:
+            return gdf
+
+        distances = haversine_m(lon, lat, gdf[lon_col].to_numpy(), gdf[lat_col].to_numpy())
+        gdf = gdf.assign(distance_m=distances)
+        return gdf[gdf['distance_m'] <= radius_m].sort_values('distance_m')
+
+    def load_tree_points(self, columns=None, bbox=None, chunksize=200000):
+        """
+        Loads street trees as points from the latitude/longitude decoded at
+        ingest, never re-parsing the stored WKT. `bbox` (min_lon, min_lat,
+        max_lon, max_lat) narrows the load through the tree R*Tree index.
+        """
+        columns = columns or TREE_COLUMNS
+        if bbox is not None:
+            return self.query_bbox("nyc_tree_points", *bbox, columns=columns)
+        return self.load_data_as_geodataframe("nyc_tree_points", columns=columns, chunksize=chunksize)
+
+    def trees_near(self, lon, lat, radius_m=100, columns=None):
+        """Street trees within radius_m meters of a point (e.g. a block's centroid), nearest first."""
+        return self.query_radius("nyc_tree_points", lon, lat, radius_m, columns=columns or TREE_COLUMNS)
+
+    @metrics.timed("geo_join")
     def calculate_historical_event_density(self, parks_gdf, events_gdf):
         """
         Calculates event density for parks.
@@ -69,3 +222,26 @@ class GeoProcessor:
             return parks_gdf_with_counts
         logging.warning("Skipping historical event density calculation due to empty GeoDataFrames.")
         return parks_gdf # Return original if inputs are empty
+
+    @metrics.timed("geo_join_partitioned")
+    def calculate_event_density_partitioned(self, parks_gdf, events_gdf, partition_col=None, workers=None):
+        """
+        Same result as calculate_historical_event_density, computed by the
+        partitioned process-pool join. Events are split by `partition_col`
+        (e.g. 'borough') when given, otherwise by grid tile. Counts per park
+        are merged deterministically regardless of the number of workers.
+        """
+        if parks_gdf.empty or events_gdf.empty:
+            logging.warning("Skipping historical event density calculation due to empty GeoDataFrames.")
+            return parks_gdf
+        if parks_gdf.crs != events_gdf.crs:
+            events_gdf = events_gdf.to_crs(parks_gdf.crs)
+        counts = count_points_in_polygons(
+            events_gdf.geometry.x.to_numpy(), events_gdf.geometry.y.to_numpy(), parks_gdf.geometry.values,
+            partition_keys=events_gdf[partition_col].to_numpy() if partition_col else None,
+            workers=workers, crs=parks_gdf.crs,
+        )
+        parks_gdf_with_counts = parks_gdf.copy()
+        parks_gdf_with_counts['event_count'] = counts.astype(int)
+        logging.info("Calculated historical event density for parks (partitioned).")
+        return parks_gdf_with_counts
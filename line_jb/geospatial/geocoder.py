@@ -0,0 +1,259 @@
+import logging
+import re
+import sqlite3
+from datetime import datetime, timezone
+import pandas as pd
+import shapely
+
+logging.basicConfig(level=logging.INFO)
+
+# Event tables geocoded from a free-text location column
+GEOCODED_TABLES = {
+    "nyc_parks_events": "location",
+    "nyc_permitted_events_historical": "event_location",
+    "nyc_permitted_events_future": "event_location",
+}
+
+# Ingested point tables used as the local address reference: (address column, lat, lon)
+ADDRESS_SOURCES = {
+    "linknyc_status": ("address", "latitude", "longitude"),
+    "nyc_311_requests": ("incident_address", "latitude", "longitude"),
+}
+
+# Normalized location strings that carry no place information ("N/A" normalizes to "N A")
+EMPTY_LOCATIONS = {"", "N A", "NA", "NONE", "TBD"}
+
+_ABBREVIATIONS = {
+    "STREET": "ST", "AVENUE": "AVE", "AV": "AVE", "ROAD": "RD", "BOULEVARD": "BLVD",
+    "PLACE": "PL", "DRIVE": "DR", "PARKWAY": "PKWY", "LANE": "LN", "TERRACE": "TER",
+    "COURT": "CT", "EXPRESSWAY": "EXPY", "HIGHWAY": "HWY", "SQUARE": "SQ",
+    "EAST": "E", "WEST": "W", "NORTH": "N", "SOUTH": "S", "SAINT": "ST",
+}
+_ORDINAL = re.compile(r"\b(\d+)(ST|ND|RD|TH)\b")
+_BETWEEN = re.compile(r"^(.+?)\s+BETWEEN\s+(.+?)\s+AND\s+(.+)$")
+# Matched on the raw upper-cased address: normalizing turns the hyphen of Queens-style
+# numbers ("107-15") into a space, after which they can't be told from a numbered street
+_HOUSE_NUMBER = re.compile(r"^\s*\d+[A-Z]?(-\d+[A-Z]?)?\s+")
+
+def normalize_location(text):
+    """Canonical form of an address/street/place string: upper case, no punctuation, USPS-style abbreviations."""
+    text = re.sub(r"[^A-Z0-9 ]", " ", str(text).upper())
+    text = _ORDINAL.sub(r"\1", text)
+    return " ".join(_ABBREVIATIONS.get(token, token) for token in text.split())
+
+def street_of_address(address):
+    """Normalized street of an address, without its house number ("107-15 Queens Blvd" -> "QUEENS BLVD")."""
+    return normalize_location(_HOUSE_NUMBER.sub("", str(address).upper()))
+
+class Geocoder:
+    """
+    Resolves free-text event locations to coordinates against data already
+    on disk: addresses from ingested LinkNYC/311 points, street intersections
+    from LinkNYC cross streets, and park names from the `parks` table.
+    Each distinct location string is resolved once and kept in the
+    geocode_cache table, so repeated venues cost one lookup in total.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.addresses = {}
+        self.intersections = {}
+        self.park_names = {}
+
+    def _get_connection(self):
+        return sqlite3.connect(self.db_path, timeout=60)
+
+    # ==========================
+    # REFERENCE INDEX
+    # ==========================
+    def load_reference(self):
+        """(Re)builds the in-memory address, intersection and park-name lookups from the database."""
+        conn = self._get_connection()
+        frames = []
+        for table_name, (address_col, lat_col, lon_col) in ADDRESS_SOURCES.items():
+            # Collapse identical raw addresses in SQLite before normalizing in Python
+            frames.append(pd.read_sql_query(
+                f"""
+                SELECT {address_col} AS address, AVG({lat_col}) AS latitude,
+                       AVG({lon_col}) AS longitude, COUNT(*) AS n
+                FROM {table_name}
+                WHERE {address_col} IS NOT NULL AND {lat_col} IS NOT NULL AND {lon_col} IS NOT NULL
+                GROUP BY {address_col};
+                """,
+                conn,
+            ))
+        frames = [frame for frame in frames if not frame.empty]
+        if frames:
+            addresses = pd.concat(frames, ignore_index=True)
+            self.addresses = self._weighted_points(addresses, addresses["address"].map(normalize_location))
+        else:
+            self.addresses = {}
+
+        crossings = pd.read_sql_query(
+            """
+            SELECT address, cross_street_1, cross_street_2, latitude, longitude FROM linknyc_status
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
+            """,
+            conn,
+        )
+        keys, rows = [], []
+        for row in crossings.itertuples(index=False):
+            street = street_of_address(row.address or "")
+            for cross in (row.cross_street_1, row.cross_street_2):
+                if street and cross:
+                    keys.append(frozenset((street, normalize_location(cross))))
+                    rows.append((row.latitude, row.longitude, 1))
+        self.intersections = self._weighted_points(
+            pd.DataFrame(rows, columns=["latitude", "longitude", "n"]), pd.Series(keys, dtype=object)
+        )
+
+        try:
+            parks = pd.read_sql_query("SELECT name, geometry_wkb FROM parks WHERE name IS NOT NULL;", conn)
+        except (sqlite3.OperationalError, pd.errors.DatabaseError):
+            parks = pd.DataFrame(columns=["name", "geometry_wkb"])
+        conn.close()
+        # A point guaranteed to lie inside the polygon, so park assignment agrees with the name match
+        points = shapely.point_on_surface(shapely.from_wkb(parks["geometry_wkb"].to_numpy()))
+        self.park_names = {
+            normalize_location(name): (shapely.get_y(point), shapely.get_x(point))
+            for name, point in zip(parks["name"], points)
+        }
+        logging.info(f"Geocoder reference: {len(self.addresses)} addresses, "
+                     f"{len(self.intersections)} intersections, {len(self.park_names)} park names.")
+
+    @staticmethod
+    def _weighted_points(frame, keys):
+        """Maps each key to the count-weighted mean (lat, lon) of its rows."""
+        if frame.empty:
+            return {}
+        frame = frame.assign(key=keys.to_numpy(), wlat=frame["latitude"] * frame["n"],
+                             wlon=frame["longitude"] * frame["n"])
+        grouped = frame.groupby("key")[["wlat", "wlon", "n"]].sum()
+        return dict(zip(grouped.index, zip(grouped["wlat"] / grouped["n"], grouped["wlon"] / grouped["n"])))
+
+    # ==========================
+    # RESOLUTION
+    # ==========================
+    def resolve(self, location):
+        """Returns (latitude, longitude, match_type) for a location string; coordinates are None if unmatched."""
+        # Multi-site permits list several places; the first one locates the event
+        first = str(location).split(",")[0]
+        key = normalize_location(first)
+        if key in self.addresses:
+            return (*self.addresses[key], "address")
+
+        between = _BETWEEN.match(key)
+        if between:
+            street, cross_a, cross_b = between.groups()
+            corners = [self.intersections[k] for k in (frozenset((street, cross_a)), frozenset((street, cross_b)))
+                       if k in self.intersections]
+            if corners:
+                return (sum(c[0] for c in corners) / len(corners),
+                        sum(c[1] for c in corners) / len(corners), "intersection")
+
+        # "Central Park: Great Lawn", "Poe Park Visitor Center (at Poe Park)"
+        candidates = [first.split(":")[0]]
+        at_park = re.search(r"\(at ([^)]+)\)", first, flags=re.IGNORECASE)
+        if at_park:
+            candidates.insert(0, at_park.group(1))
+        for candidate in candidates:
+            park_key = normalize_location(candidate)
+            if park_key in self.park_names:
+                return (*self.park_names[park_key], "park")
+        return (None, None, "unmatched")
+
+    def _cached(self, conn, locations):
+        """Returns {location: (lat, lon, match_type)} for the locations already in geocode_cache."""
+        cached = {}
+        locations = list(locations)
+        for i in range(0, len(locations), 500):
+            batch = locations[i:i + 500]
+            cached.update({
+                location: (lat, lon, match_type) for location, lat, lon, match_type in conn.execute(
+                    f"""
+                    SELECT location, latitude, longitude, match_type FROM geocode_cache
+                    WHERE location IN ({', '.join('?' for _ in batch)});
+                    """,
+                    batch,
+                )
+            })
+        return cached
+
+    def lookup(self, conn, locations, retry_unmatched=False):
+        """
+        Resolves distinct location strings from geocode_cache, resolving the
+        rest without writing. Returns ({location: (lat, lon, match_type)},
+        the newly resolved subset), so a reader thread can resolve and leave
+        store() to the writer.
+        """
+        locations = {loc for loc in locations
+                     if loc is not None and normalize_location(loc) not in EMPTY_LOCATIONS}
+        results = self._cached(conn, locations)
+        resolved = {loc: self.resolve(loc) for loc in locations
+                    if loc not in results or (retry_unmatched and results[loc][0] is None)}
+        results.update(resolved)
+        return results, resolved
+
+    def store(self, conn, resolved):
+        """Caches results from lookup() in geocode_cache."""
+        if not resolved:
+            return
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        conn.executemany(
+            """
+            INSERT INTO geocode_cache (location, latitude, longitude, match_type, geocoded_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(location) DO UPDATE SET
+                latitude = excluded.latitude, longitude = excluded.longitude,
+                match_type = excluded.match_type, geocoded_at = excluded.geocoded_at;
+            """,
+            [(loc, *result, now) for loc, result in resolved.items()],
+        )
+
+    def geocode_locations(self, conn, locations, retry_unmatched=False):
+        """
+        Resolves distinct location strings, reading and filling geocode_cache.
+        Unmatched strings are cached too and only retried when `retry_unmatched`
+        is set (e.g. after the reference data has grown).
+        """
+        results, resolved = self.lookup(conn, locations, retry_unmatched)
+        self.store(conn, resolved)
+        return results
+
+    def _apply(self, conn, table_name, results):
+        """Writes resolved coordinates onto the event rows that still lack them."""
+        location_col = GEOCODED_TABLES[table_name]
+        updates = [(lat, lon, loc) for loc, (lat, lon, _) in results.items() if lat is not None]
+        conn.executemany(
+            f"""
+            UPDATE {table_name} SET latitude = ?, longitude = ?
+            WHERE {location_col} = ? AND latitude IS NULL;
+            """,
+            updates,
+        )
+        return len(updates)
+
+    def geocode_pending(self, table_name, conn=None, retry_unmatched=True):
+        """
+        Geocodes every distinct location of `table_name` whose rows have no
+        coordinates yet. Returns the number of locations that were placed.
+        """
+        location_col = GEOCODED_TABLES[table_name]
+        own_conn = conn is None
+        if own_conn:
+            conn = self._get_connection()
+        pending = [row[0] for row in conn.execute(
+            f"SELECT DISTINCT {location_col} FROM {table_name} WHERE latitude IS NULL;"
+        )]
+        results = self.geocode_locations(conn, pending, retry_unmatched=retry_unmatched)
+        placed = self._apply(conn, table_name, results)
+        if own_conn:
+            conn.commit()
+            conn.close()
+        logging.info(f"Geocoded {placed} of {len(pending)} pending {table_name} locations.")
+        return placed
+
+    def batch_hook(self, conn, dataset_name, rows):
+        """InsertManager batch hook: geocodes the locations of the chunk just inserted."""
+        location_col = GEOCODED_TABLES[dataset_name]
+        results = self.geocode_locations(conn, {row.get(location_col) for row in rows})
+        self._apply(conn, dataset_name, results)
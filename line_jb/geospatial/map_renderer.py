@@ -1,21 +1,92 @@
+import json
+import os
 import folium
+from folium import plugins
 import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
 import logging
+from line_jb.instrumentation import metrics
 
 logging.basicConfig(level=logging.INFO)
 
+# Point layers larger than this are drawn as one clustered layer instead of
+# individual CircleMarkers, unless a high-volume marker_type is requested.
+HIGH_VOLUME_THRESHOLD = 2000
+# Point layers larger than this are pre-aggregated into grid cells.
+AGGREGATE_THRESHOLD = 200000
+
+# Builds a circle marker per data row ([lat, lon, *popup values]) and a popup
+# that is only rendered when the marker is clicked.
+_LAZY_POPUP_CALLBACK = """
+function (row) {
+    var fields = %(fields)s;
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+        radius: 5, color: %(color)s, fillColor: %(color)s, fill: true, fillOpacity: 0.7
+    });
+    marker.bindPopup(function () {
+        var escape = function (v) {
+            return String(v).replace(/[&<>"']/g, function (c) {
+                return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+            });
+        };
+        var html = '<table>';
+        for (var i = 0; i < fields.length; i++) {
+            html += '<tr><td><b>' + escape(fields[i]) + ':</b></td><td>' + escape(row[i + 2]) + '</td></tr>';
+        }
+        return html + '</table>';
+    }, {maxWidth: 300});
+    return marker;
+}
+"""
+
 class MapRenderer:
-    def __init__(self, location=(40.7128, -74.0060), zoom_start=12): # Default to NYC
-        self.map = folium.Map(location=location, zoom_start=zoom_start)
+    def __init__(self, location=(40.7128, -74.0060), zoom_start=12, prefer_canvas=True): # Default to NYC
+        # Canvas rendering keeps thousands of vector markers responsive in the browser
+        self.map = folium.Map(location=location, zoom_start=zoom_start, prefer_canvas=prefer_canvas)
 
-    def add_geodataframe_layer(self, gdf, name, color='blue', popup_fields=None, style_function=None, marker_type='circle_marker'):
+    @metrics.timed("map_layer", label_args=("name",))
+    def add_geodataframe_layer(self, gdf, name, color='blue', popup_fields=None, style_function=None,
+                               marker_type='circle_marker', high_volume_threshold=HIGH_VOLUME_THRESHOLD,
+                               aggregate_threshold=AGGREGATE_THRESHOLD, cell_size_deg=0.005):
         """
         Adds a GeoDataFrame as a layer to the map.
+
+        Point layers support these marker_type values:
+        - 'circle_marker': one CircleMarker per row
+        - 'fast_cluster': one FastMarkerCluster with lazily built popups
+        - 'canvas': a single GeoJSON layer drawn on canvas
+        - 'heatmap'
+        - 'grid': counts per cell of cell_size_deg degrees
+
+        A 'circle_marker' layer above high_volume_threshold rows becomes
+        'fast_cluster'. Any point layer above aggregate_threshold rows becomes
+        'grid', so render time and file size stop growing with row count.
         """
         if gdf.empty:
             logging.warning(f"Skipping empty GeoDataFrame for layer: {name}")
             return
 
+        is_point_layer = gdf.crs is not None and gdf.crs.name == 'WGS 84' and all(gdf.geometry.type == 'Point')
+        if is_point_layer:
+            if len(gdf) > aggregate_threshold and marker_type != 'heatmap':
+                marker_type = 'grid'
+            elif len(gdf) > high_volume_threshold and marker_type == 'circle_marker':
+                marker_type = 'fast_cluster'
+            if marker_type in ('fast_cluster', 'canvas', 'heatmap', 'grid'):
+                fields = popup_fields if popup_fields else [c for c in gdf.columns if c != gdf.geometry.name]
+                if marker_type == 'fast_cluster':
+                    self._add_fast_cluster_layer(gdf, name, color, fields)
+                elif marker_type == 'canvas':
+                    self._add_canvas_layer(gdf, name, color, fields)
+                elif marker_type == 'heatmap':
+                    self._add_heatmap_layer(gdf, name)
+                else:
+                    self._add_grid_layer(gdf, name, color, cell_size_deg)
+                logging.info(f"Added '{name}' layer to the map ({marker_type}, {len(gdf)} points).")
+                return
+
         if style_function is None:
             # Default style function for polygons or lines
             style_function = lambda x: {
@@ -58,10 +129,77 @@ class MapRenderer:
         logging.info(f"Added '{name}' layer to the map.")
 
 
+    # ==========================
+    # HIGH-VOLUME POINT LAYERS
+    # ==========================
+    @staticmethod
+    def _popup_values(gdf, fields):
+        """Popup field values as strings, with missing fields/values shown as 'N/A'."""
+        values = gdf.reindex(columns=fields)
+        return values.astype(object).where(values.notna(), 'N/A').astype(str)
+
+    def _add_fast_cluster_layer(self, gdf, name, color, fields):
+        """Emits all points as one compact array; markers and popups are built client-side."""
+        data = pd.concat(
+            [
+                pd.DataFrame({'lat': gdf.geometry.y.to_numpy(), 'lon': gdf.geometry.x.to_numpy()}),
+                self._popup_values(gdf, fields).reset_index(drop=True),
+            ],
+            axis=1,
+        )
+        callback = _LAZY_POPUP_CALLBACK % {'fields': json.dumps(fields), 'color': json.dumps(color)}
+        plugins.FastMarkerCluster(data.to_numpy(dtype=object).tolist(), callback=callback, name=name).add_to(self.map)
+
+    def _add_canvas_layer(self, gdf, name, color, fields):
+        """Single GeoJSON layer of canvas circle markers, carrying only the popup fields."""
+        slim = gpd.GeoDataFrame(self._popup_values(gdf, fields), geometry=gdf.geometry.values, crs=gdf.crs)
+        folium.GeoJson(
+            slim.to_json(),
+            name=name,
+            marker=folium.CircleMarker(radius=3, color=color, fill=True, fill_color=color, fill_opacity=0.7),
+            popup=folium.GeoJsonPopup(fields=fields),
+        ).add_to(self.map)
+
+    def _add_heatmap_layer(self, gdf, name):
+        points = np.column_stack([gdf.geometry.y.to_numpy(), gdf.geometry.x.to_numpy()])
+        plugins.HeatMap(points.tolist(), name=name, radius=10).add_to(self.map)
+
+    def _add_grid_layer(self, gdf, name, color, cell_size_deg):
+        """
+        Level-of-detail rendering: bins points into square cells of cell_size_deg
+        and draws the non-empty cells as one GeoJSON layer shaded by count.
+        """
+        cells = pd.DataFrame({
+            'cx': np.floor(gdf.geometry.x.to_numpy() / cell_size_deg).astype('int64'),
+            'cy': np.floor(gdf.geometry.y.to_numpy() / cell_size_deg).astype('int64'),
+        })
+        counts = cells.value_counts().reset_index(name='count')
+        x0 = counts['cx'].to_numpy() * cell_size_deg
+        y0 = counts['cy'].to_numpy() * cell_size_deg
+        grid = gpd.GeoDataFrame(
+            {'count': counts['count'].to_numpy()},
+            geometry=shapely.box(x0, y0, x0 + cell_size_deg, y0 + cell_size_deg),
+            crs="EPSG:4326",
+        )
+        max_log_count = float(np.log1p(grid['count'].max()))
+
+        def grid_style(feature):
+            weight = np.log1p(feature['properties']['count']) / max_log_count if max_log_count else 1.0
+            return {'fillColor': color, 'color': color, 'weight': 0, 'fillOpacity': 0.15 + 0.65 * weight}
+
+        folium.GeoJson(
+            grid.to_json(),
+            name=name,
+            style_function=grid_style,
+            tooltip=folium.features.GeoJsonTooltip(fields=['count'], aliases=['records']),
+        ).add_to(self.map)
+
+    @metrics.timed("map_save")
     def save_map(self, filename="map.html"):
         """Saves the map to an HTML file."""
         try:
             self.map.save(filename)
+            metrics.inc("map_bytes_written", os.path.getsize(filename))
             logging.info(f"Map saved to {filename}")
         except Exception as e:
             logging.error(f"Error saving map: {e}")
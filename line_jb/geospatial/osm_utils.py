@@ -1,40 +1,183 @@
 import osmnx as ox
 import geopandas as gpd
+import hashlib
+import json
 import logging
+import os
+import time
 
 logging.basicConfig(level=logging.INFO)
 
+DEFAULT_CACHE_TTL_SEC = 7 * 24 * 3600
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
 class OSMUtils:
-    def __init__(self):
+    def __init__(self, cache_dir="cache/osm", ttl_seconds=DEFAULT_CACHE_TTL_SEC,
+                 max_cache_bytes=DEFAULT_CACHE_MAX_BYTES):
         # Configure OSMnx if needed, e.g., cache folder
-        ox.config(use_cache=True, log_console=False)
+        ox.settings.use_cache = True
+        ox.settings.log_console = False
+        # Result-level cache of parsed features/graphs (on top of osmnx's HTTP cache).
+        # Set cache_dir=None to disable it.
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_cache_bytes = max_cache_bytes
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    # ==========================
+    # RESULT CACHE
+    # ==========================
+    @staticmethod
+    def _cache_key(**params):
+        payload = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+    def _meta_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _entry_files(self, key, meta):
+        return [self._meta_path(key)] + [os.path.join(self.cache_dir, f) for f in meta.get("files", [])]
+
+    def _load_meta(self, key):
+        """Returns an entry's metadata if it exists and has not expired."""
+        if not self.cache_dir or not os.path.exists(self._meta_path(key)):
+            return None
+        with open(self._meta_path(key), "r") as f:
+            meta = json.load(f)
+        if time.time() - meta["created"] > self.ttl_seconds:
+            self._remove_entry(key, meta)
+            return None
+        os.utime(self._meta_path(key)) # Mark as recently used for LRU eviction
+        return meta
+
+    def _remove_entry(self, key, meta):
+        for path in self._entry_files(key, meta):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _store_meta(self, key, meta):
+        meta["created"] = time.time()
+        with open(self._meta_path(key), "w") as f:
+            json.dump(meta, f, default=str)
+        self._evict()
 
-    def get_street_network(self, place_name=None, bbox=None):
+    def _evict(self):
+        """Drops expired entries, then least-recently-used ones until under max_cache_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-len(".json")]
+            with open(self._meta_path(key), "r") as f:
+                meta = json.load(f)
+            if time.time() - meta["created"] > self.ttl_seconds:
+                self._remove_entry(key, meta)
+                continue
+            size = sum(os.path.getsize(p) for p in self._entry_files(key, meta) if os.path.exists(p))
+            entries.append((os.path.getmtime(self._meta_path(key)), key, meta, size))
+
+        total = sum(size for *_, size in entries)
+        for _, key, meta, size in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_cache_bytes:
+                break
+            self._remove_entry(key, meta)
+            total -= size
+            logging.info(f"Evicted OSM cache entry {key} ({size} bytes).")
+
+    @staticmethod
+    def _encode_nested(gdf):
+        """JSON-encodes list/dict cells (e.g. merged osmid lists) so the frame fits Parquet."""
+        json_columns = []
+        gdf = gdf.copy()
+        for col in gdf.columns:
+            if col == gdf.geometry.name or gdf[col].dtype != object:
+                continue
+            nested = gdf[col].map(lambda v: isinstance(v, (list, dict, set, tuple)))
+            if nested.any():
+                gdf[col] = gdf[col].map(lambda v: json.dumps(list(v) if isinstance(v, (set, tuple)) else v, default=str)
+                                        if v is not None and v == v else None)
+                json_columns.append(col)
+        return gdf, json_columns
+
+    @staticmethod
+    def _decode_nested(gdf, json_columns):
+        for col in json_columns:
+            gdf[col] = gdf[col].map(lambda v: json.loads(v) if isinstance(v, str) else v)
+        return gdf
+
+    # ==========================
+    # OSM QUERIES
+    # ==========================
+    def get_street_network(self, place_name=None, bbox=None, network_type="all"):
         """
-        Fetches street network for a given place name or bounding box.
-        Returns a MultiDiGraph (OSMnx graph).
+        Fetches street network for a given place name or bounding box
+        (north, south, east, west). Returns a MultiDiGraph (OSMnx graph). Parsed graphs are cached as
+        node/edge GeoParquet files keyed by (query, network_type).
         """
+        key = self._cache_key(kind="graph", place_name=place_name, bbox=bbox, network_type=network_type)
+        meta = self._load_meta(key)
+        if meta:
+            try:
+                nodes = self._decode_nested(gpd.read_parquet(os.path.join(self.cache_dir, meta["files"][0])),
+                                            meta["node_json_columns"])
+                edges = self._decode_nested(gpd.read_parquet(os.path.join(self.cache_dir, meta["files"][1])),
+                                            meta["edge_json_columns"])
+                G = ox.graph_from_gdfs(nodes, edges, graph_attrs=meta["graph_attrs"])
+                logging.info(f"Loaded cached street network for '{place_name or bbox}'.")
+                return G
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable OSM cache entry {key}: {e}")
+
         try:
             if place_name:
-                G = ox.graph_from_place(place_name, network_type="all")
+                G = ox.graph_from_place(place_name, network_type=network_type)
                 logging.info(f"Fetched street network for '{place_name}'.")
             elif bbox:
                 north, south, east, west = bbox
-                G = ox.graph_from_bbox(north, south, east, west, network_type="all")
+                G = ox.graph_from_bbox(bbox=(west, south, east, north), network_type=network_type)
                 logging.info(f"Fetched street network for bbox: {bbox}.")
             else:
                 raise ValueError("Must provide either 'place_name' or 'bbox'.")
-            return G
         except Exception as e:
             logging.error(f"Error fetching street network: {e}")
             return None
 
+        if self.cache_dir:
+            try:
+                nodes, edges = ox.graph_to_gdfs(G)
+                nodes, node_json_columns = self._encode_nested(nodes)
+                edges, edge_json_columns = self._encode_nested(edges)
+                files = [f"{key}_nodes.parquet", f"{key}_edges.parquet"]
+                nodes.to_parquet(os.path.join(self.cache_dir, files[0]))
+                edges.to_parquet(os.path.join(self.cache_dir, files[1]))
+                self._store_meta(key, {
+                    "kind": "graph", "query": place_name or bbox, "network_type": network_type,
+                    "files": files, "graph_attrs": dict(G.graph),
+                    "node_json_columns": node_json_columns, "edge_json_columns": edge_json_columns,
+                })
+            except Exception as e:
+                logging.warning(f"Could not cache street network: {e}")
+        return G
+
     def get_osm_features(self, query, tags, gdf_type='points'):
         """
         Fetches specific OSM features (e.g., parks, buildings) by query and tags.
-        Returns a GeoDataFrame.
+        Returns a GeoDataFrame. Parsed results are cached as GeoParquet keyed
+        by (query, tags).
         gdf_type can be 'points', 'polygons', 'lines'.
         """
+        key = self._cache_key(kind="features", query=query, tags=tags)
+        meta = self._load_meta(key)
+        if meta:
+            try:
+                gdf = self._decode_nested(gpd.read_parquet(os.path.join(self.cache_dir, meta["files"][0])),
+                                          meta["json_columns"])
+                logging.info(f"Loaded {len(gdf)} cached '{tags}' features for '{query}'.")
+                return gdf
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable OSM cache entry {key}: {e}")
+
         try:
             if gdf_type == 'points':
                 gdf = ox.features_from_place(query, tags)
@@ -44,7 +187,17 @@ class OSMUtils:
                 gdf = ox.features_from_place(query, tags) # Handle lines generally
 
             logging.info(f"Fetched {len(gdf)} '{tags}' features for '{query}'.")
-            return gdf
         except Exception as e:
             logging.error(f"Error fetching OSM features for '{query}' with tags {tags}: {e}")
             return gpd.GeoDataFrame() # Return empty GeoDataFrame on error
+
+        if self.cache_dir:
+            try:
+                encoded, json_columns = self._encode_nested(gdf)
+                files = [f"{key}.parquet"]
+                encoded.to_parquet(os.path.join(self.cache_dir, files[0]))
+                self._store_meta(key, {"kind": "features", "query": query, "tags": tags,
+                                       "files": files, "json_columns": json_columns})
+            except Exception as e:
+                logging.warning(f"Could not cache OSM features for '{query}': {e}")
+        return gdf
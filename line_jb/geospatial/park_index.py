@@ -0,0 +1,225 @@
+import hashlib
+import logging
+import sqlite3
+import geopandas
+import numpy as np
+import pandas as pd
+import shapely
+
+logging.basicConfig(level=logging.INFO)
+
+# Event tables whose rows are assigned to parks, with their coordinate columns
+PARK_EVENT_TABLES = {
+    "nyc_parks_events": ("latitude", "longitude"),
+    "nyc_permitted_events_historical": ("latitude", "longitude"),
+    "nyc_permitted_events_future": ("latitude", "longitude"),
+}
+
+# park_id stored on events that fall inside no park (NULL means "not assigned yet")
+NO_PARK = 0
+
+class ParkIndex:
+    """
+    Assigns event points to park polygons once and keeps per-park counts.
+    The park polygons are stored in the `parks` table and indexed with a
+    shapely STRtree (prepared geometries), so each new event costs one
+    O(log n) tree probe. Assignments are written to the event's park_id and
+    totals to park_event_counts, making density a lookup rather than a join.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.park_ids = np.empty(0, dtype="int64")
+        self.geometries = np.empty(0, dtype=object)
+        self.areas = np.empty(0, dtype="float64")
+        self.tree = None
+
+    def _get_connection(self):
+        return sqlite3.connect(self.db_path, timeout=60)
+
+    # ==========================
+    # BUILDING THE INDEX
+    # ==========================
+    @staticmethod
+    def _osm_keys(parks_gdf):
+        return [str(k) for k in parks_gdf.index.to_list()]
+
+    @staticmethod
+    def _signature(keys, wkbs):
+        digest = hashlib.sha1()
+        for key, wkb in sorted(zip(keys, wkbs)):
+            digest.update(key.encode("utf-8"))
+            digest.update(wkb)
+        return digest.hexdigest()
+
+    def load_parks(self, parks_gdf, name_col='name'):
+        """
+        Stores park polygons and builds the STRtree. When the park set differs
+        from the one previous assignments were made against, those assignments
+        and counts are reset so they are recomputed against the new polygons.
+        """
+        # OSM park queries also return nodes and ways; only areas can contain events
+        parks_gdf = parks_gdf[parks_gdf.geometry.notna()
+                              & parks_gdf.geometry.geom_type.isin(["Polygon", "MultiPolygon"])]
+        if parks_gdf.crs is not None and parks_gdf.crs.to_epsg() != 4326:
+            parks_gdf = parks_gdf.to_crs("EPSG:4326")
+        keys = self._osm_keys(parks_gdf)
+        wkbs = shapely.to_wkb(parks_gdf.geometry.values).tolist()
+        names = (parks_gdf[name_col].astype(object).where(parks_gdf[name_col].notna(), None).tolist()
+                 if name_col in parks_gdf.columns else [None] * len(keys))
+        signature = self._signature(keys, wkbs)
+
+        conn = self._get_connection()
+        with conn:
+            row = conn.execute(
+                "SELECT watermark FROM sync_state WHERE dataset_name = 'parks';"
+            ).fetchone()
+            if row is None or row[0] != signature:
+                logging.info("Park polygons changed; resetting park assignments.")
+                conn.execute("DELETE FROM park_event_counts;")
+                for table_name in PARK_EVENT_TABLES:
+                    conn.execute(f"UPDATE {table_name} SET park_id = NULL WHERE park_id IS NOT NULL;")
+                # Keep park_ids stable for parks that still exist; drop the ones that don't
+                current_keys = set(keys)
+                stale = [(k,) for (k,) in conn.execute("SELECT osm_key FROM parks;") if k not in current_keys]
+                conn.executemany("DELETE FROM parks WHERE osm_key = ?;", stale)
+                conn.executemany(
+                    """
+                    INSERT INTO parks (osm_key, name, geometry_wkb) VALUES (?, ?, ?)
+                    ON CONFLICT(osm_key) DO UPDATE SET name = excluded.name, geometry_wkb = excluded.geometry_wkb;
+                    """,
+                    list(zip(keys, names, wkbs)),
+                )
+                conn.execute(
+                    """
+                    INSERT INTO sync_state (dataset_name, watermark_column, watermark, updated_at)
+                    VALUES ('parks', 'signature', ?, datetime('now'))
+                    ON CONFLICT(dataset_name) DO UPDATE SET
+                        watermark = excluded.watermark, updated_at = excluded.updated_at;
+                    """,
+                    (signature,),
+                )
+        conn.close()
+        self.load_from_db()
+
+    def load_from_db(self):
+        """Rebuilds the STRtree from the parks table (e.g. in a fresh process)."""
+        conn = self._get_connection()
+        parks = pd.read_sql_query("SELECT park_id, geometry_wkb FROM parks ORDER BY park_id", conn)
+        conn.close()
+        self.park_ids = parks["park_id"].to_numpy(dtype="int64")
+        self.geometries = shapely.from_wkb(parks["geometry_wkb"].to_numpy())
+        shapely.prepare(self.geometries)
+        # Smaller parks win when polygons overlap (e.g. a playground inside a larger park)
+        self.areas = shapely.area(self.geometries)
+        self.tree = shapely.STRtree(self.geometries)
+        logging.info(f"Built park index over {len(self.park_ids)} parks.")
+
+    # ==========================
+    # ASSIGNMENT
+    # ==========================
+    def assign_points(self, lons, lats):
+        """Returns the park_id containing each (lon, lat), or NO_PARK. Vectorized over arrays."""
+        lons = np.asarray(lons, dtype="float64")
+        lats = np.asarray(lats, dtype="float64")
+        result = np.full(len(lons), NO_PARK, dtype="int64")
+        if self.tree is None or len(lons) == 0:
+            return result
+        point_idx, park_idx = self.tree.query(shapely.points(lons, lats), predicate="within")
+        if len(point_idx):
+            # Order candidate matches by point, then by park area, and keep the first per point
+            order = np.lexsort((self.areas[park_idx], point_idx))
+            point_idx, park_idx = point_idx[order], park_idx[order]
+            first = np.concatenate(([True], point_idx[1:] != point_idx[:-1]))
+            result[point_idx[first]] = self.park_ids[park_idx[first]]
+        return result
+
+    def assign_pending(self, table_name, conn=None, batch_size=50000):
+        """
+        Assigns every not-yet-assigned event with coordinates in `table_name`
+        and adds them to park_event_counts. Only rows with park_id IS NULL
+        are read, so repeated calls are incremental. Pass `conn` to run inside
+        an existing transaction (as an InsertManager batch hook does).
+        Returns the number of rows assigned.
+        """
+        lat_col, lon_col = PARK_EVENT_TABLES[table_name]
+        own_conn = conn is None
+        if own_conn:
+            conn = self._get_connection()
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table_name});")}
+        if lat_col not in existing or lon_col not in existing:
+            logging.debug(f"Skipping park assignment for {table_name}: no {lat_col}/{lon_col} columns.")
+            if own_conn:
+                conn.close()
+            return 0
+
+        assigned = 0
+        while True:
+            pending = conn.execute(
+                f"""
+                SELECT rowid, {lon_col}, {lat_col} FROM {table_name}
+                WHERE park_id IS NULL AND {lat_col} IS NOT NULL AND {lon_col} IS NOT NULL
+                LIMIT ?;
+                """,
+                (batch_size,),
+            ).fetchall()
+            if not pending:
+                break
+            # rowid, not id: nyc_parks_events declares `id SERIAL`, which SQLite leaves NULL
+            ids, lons, lats = (np.array(col) for col in zip(*pending))
+            park_ids = self.assign_points(lons, lats)
+            conn.executemany(f"UPDATE {table_name} SET park_id = ? WHERE rowid = ?;",
+                             zip(park_ids.tolist(), ids.tolist()))
+            in_park = park_ids[park_ids != NO_PARK]
+            if len(in_park):
+                counts = pd.Series(in_park).value_counts()
+                conn.executemany(
+                    """
+                    INSERT INTO park_event_counts (park_id, dataset_name, event_count) VALUES (?, ?, ?)
+                    ON CONFLICT(park_id, dataset_name) DO UPDATE SET
+                        event_count = event_count + excluded.event_count;
+                    """,
+                    [(int(park_id), table_name, int(count)) for park_id, count in counts.items()],
+                )
+            assigned += len(pending)
+            if own_conn:
+                conn.commit()
+
+        if own_conn:
+            conn.close()
+        if assigned:
+            logging.info(f"Assigned {assigned} {table_name} rows to parks.")
+        return assigned
+
+    def batch_hook(self, conn, dataset_name, rows):
+        """InsertManager batch hook: assigns the events a chunk just inserted."""
+        if self.tree is not None:
+            self.assign_pending(dataset_name, conn=conn)
+
+    # ==========================
+    # DENSITY QUERIES
+    # ==========================
+    def event_counts(self, dataset_names=None):
+        """Per-park event totals (park_id, event_count), read from the maintained counts."""
+        dataset_names = list(dataset_names or PARK_EVENT_TABLES)
+        conn = self._get_connection()
+        counts = pd.read_sql_query(
+            f"""
+            SELECT park_id, SUM(event_count) AS event_count FROM park_event_counts
+            WHERE dataset_name IN ({', '.join('?' for _ in dataset_names)})
+            GROUP BY park_id;
+            """,
+            conn,
+            params=dataset_names,
+        )
+        conn.close()
+        return counts
+
+    def parks_with_counts(self, dataset_names=None):
+        """GeoDataFrame of stored parks with an event_count column (0 for parks with no events)."""
+        conn = self._get_connection()
+        parks = pd.read_sql_query("SELECT park_id, osm_key, name, geometry_wkb FROM parks", conn)
+        conn.close()
+        parks = parks.merge(self.event_counts(dataset_names), on="park_id", how="left")
+        parks["event_count"] = parks["event_count"].fillna(0).astype(int)
+        geometry = geopandas.GeoSeries.from_wkb(parks.pop("geometry_wkb"), crs="EPSG:4326")
+        return geopandas.GeoDataFrame(parks, geometry=geometry, crs="EPSG:4326")
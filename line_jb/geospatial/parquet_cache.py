@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import geopandas
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import shapely
+
+logging.basicConfig(level=logging.INFO)
+
+MANIFEST_FILE = "_manifest.json"
+
+# Tables materialized to the cache: coordinate columns, hive partition
+# columns, and (optionally) the date column a 'month' partition is derived from.
+CACHED_TABLES = {
+    "nyc_311_requests": {
+        "lat_col": "latitude", "lon_col": "longitude",
+        "partition_by": ["borough", "month"], "month_col": "created_date",
+    },
+    "linknyc_status": {
+        "lat_col": "latitude", "lon_col": "longitude",
+        "partition_by": ["boro"],
+    },
+}
+
+_SQLITE_TO_ARROW = {"INTEGER": pa.int64(), "REAL": pa.float64(), "TEXT": pa.string()}
+
+class ParquetCache:
+    """
+    Columnar (GeoParquet) materialization of ingested tables.
+    Each table is written once per sync as a hive-partitioned Parquet dataset
+    with a precomputed WKB 'geometry' column, then read back memory-mapped
+    with column and predicate pushdown. A cached table is only used while
+    the sync watermark (and max row id) it was built from are still current.
+    """
+    def __init__(self, db_path, cache_dir="cache/parquet"):
+        self.db_path = db_path
+        self.cache_dir = cache_dir
+        self.filesystem = pafs.LocalFileSystem(use_mmap=True)
+
+    def _get_connection(self):
+        # pyarrow pulls record batches from a writer thread, so allow cross-thread use
+        return sqlite3.connect(self.db_path, check_same_thread=False)
+
+    def _table_dir(self, table_name):
+        return os.path.join(self.cache_dir, table_name)
+
+    def _current_version(self, conn, table_name):
+        """
+        The (sync watermark, max row id) pair a cached copy is valid for. The
+        watermark moves on every incremental sync; the max id also catches
+        rows written outside the sync path.
+        """
+        max_id = conn.execute(f"SELECT MAX(id) FROM {table_name};").fetchone()[0]
+        try:
+            row = conn.execute(
+                "SELECT watermark FROM sync_state WHERE dataset_name = ?;", (table_name,)
+            ).fetchone()
+        except sqlite3.OperationalError: # sync_state not created yet
+            row = None
+        return {"watermark": row[0] if row else None, "max_id": max_id}
+
+    def _read_manifest(self, table_name):
+        path = os.path.join(self._table_dir(table_name), MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def is_fresh(self, table_name):
+        """True if the cached copy of a table was built from the table's current version."""
+        manifest = self._read_manifest(table_name)
+        if manifest is None:
+            return False
+        conn = self._get_connection()
+        version = self._current_version(conn, table_name)
+        conn.close()
+        return manifest.get("version") == version
+
+    def _arrow_schema(self, conn, table_name, config):
+        """Arrow schema derived from the table's declared SQLite types, so every chunk agrees."""
+        fields = []
+        for _, name, col_type, *_ in conn.execute(f"PRAGMA table_info({table_name});"):
+            fields.append(pa.field(name, _SQLITE_TO_ARROW.get(col_type.upper(), pa.string())))
+        if config.get("month_col"):
+            fields.append(pa.field("month", pa.string()))
+        fields.append(pa.field("geometry", pa.binary()))
+        geo_metadata = {
+            "version": "1.0.0",
+            "primary_column": "geometry",
+            "columns": {"geometry": {"encoding": "WKB", "geometry_types": ["Point"], "crs": "EPSG:4326"}},
+        }
+        return pa.schema(fields, metadata={"geo": json.dumps(geo_metadata)})
+
+    def _iter_batches(self, conn, table_name, config, schema, chunksize):
+        lat_col, lon_col = config["lat_col"], config["lon_col"]
+        sql = (f"SELECT * FROM {table_name} "
+               f"WHERE {lat_col} IS NOT NULL AND {lon_col} IS NOT NULL ORDER BY id")
+        for chunk in pd.read_sql_query(sql, conn, chunksize=chunksize):
+            if config.get("month_col"):
+                chunk["month"] = chunk[config["month_col"]].astype("string").str.slice(0, 7)
+            points = shapely.points(chunk[lon_col].to_numpy(dtype="float64"),
+                                    chunk[lat_col].to_numpy(dtype="float64"))
+            chunk["geometry"] = shapely.to_wkb(points)
+            yield from pa.Table.from_pandas(chunk, schema=schema, preserve_index=False).to_batches()
+
+    def materialize(self, table_name, chunksize=200000):
+        """
+        (Re)writes the cached copy of a table from SQLite, streaming it in chunks.
+        The new copy is built beside the old one and swapped in at the end, so
+        readers never see a half-written dataset.
+        """
+        config = CACHED_TABLES[table_name]
+        table_dir = self._table_dir(table_name)
+        staging_dir = f"{table_dir}.tmp"
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+        conn = self._get_connection()
+        version = self._current_version(conn, table_name)
+        schema = self._arrow_schema(conn, table_name, config)
+        ds.write_dataset(
+            self._iter_batches(conn, table_name, config, schema, chunksize),
+            staging_dir,
+            schema=schema,
+            format="parquet",
+            partitioning=ds.partitioning(
+                pa.schema([schema.field(c) for c in config["partition_by"]]), flavor="hive"
+            ),
+            existing_data_behavior="error",
+            max_partitions=10000,
+        )
+        conn.close()
+
+        with open(os.path.join(staging_dir, MANIFEST_FILE), "w") as f:
+            json.dump({"table": table_name, "version": version}, f)
+        shutil.rmtree(table_dir, ignore_errors=True)
+        os.replace(staging_dir, table_dir)
+        logging.info(f"Materialized {table_name} to {table_dir} (watermark {version['watermark']}).")
+
+    def refresh(self, table_names=None):
+        """Rebuilds every cached table whose watermark moved since it was written."""
+        for table_name in table_names or CACHED_TABLES:
+            if not self.is_fresh(table_name):
+                self.materialize(table_name)
+
+    def read(self, table_name, columns=None, filter=None):
+        """
+        Reads a cached table as a GeoDataFrame. `columns` limits the Parquet
+        columns decoded (geometry is always included) and `filter` is a
+        pyarrow.dataset expression pushed down to partitions and row groups.
+        """
+        config = CACHED_TABLES[table_name]
+        # Partition columns are text; declare them so values like "1" aren't inferred as ints
+        partitioning = ds.partitioning(
+            pa.schema([(c, pa.string()) for c in config["partition_by"]]), flavor="hive"
+        )
+        dataset = ds.dataset(self._table_dir(table_name), format="parquet",
+                             partitioning=partitioning, filesystem=self.filesystem,
+                             exclude_invalid_files=True)
+        read_cols = None
+        if columns:
+            read_cols = list(dict.fromkeys([*columns, config["lat_col"], config["lon_col"], "geometry"]))
+        table = dataset.to_table(columns=read_cols, filter=filter)
+        df = table.to_pandas()
+        geometry = geopandas.GeoSeries.from_wkb(df.pop("geometry"), crs="EPSG:4326")
+        gdf = geopandas.GeoDataFrame(df, geometry=geometry, crs="EPSG:4326")
+        logging.info(f"Loaded {len(gdf)} records from cached {table_name}.")
+        return gdf
+
+    @staticmethod
+    def time_window_filter(time_col, start=None, end=None):
+        """pyarrow expression for start <= time_col < end (either bound optional)."""
+        expression = None
+        if start is not None:
+            expression = ds.field(time_col) >= start
+        if end is not None:
+            upper = ds.field(time_col) < end
+            expression = upper if expression is None else expression & upper
+        return expression
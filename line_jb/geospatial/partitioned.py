@@ -0,0 +1,124 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import CRS
+
+logging.basicConfig(level=logging.INFO)
+
+# Side of a grid tile in degrees (~4 km at NYC's latitude), or in meters for projected CRSs
+DEFAULT_TILE_DEG = 0.04
+DEFAULT_TILE_M = 4000.0
+
+# Below this many points the pool start-up costs more than it saves
+MIN_PARALLEL_POINTS = 50000
+
+# Polygon index built once per worker process by _init_worker
+_worker_polygons = None
+_worker_tree = None
+
+def default_tile_size(crs=None):
+    """
+    Grid tile side in the units of `crs`: DEFAULT_TILE_DEG for geographic (or
+    unspecified) CRSs, DEFAULT_TILE_M in the CRS's linear unit otherwise
+    (e.g. ~13,000 ft for EPSG:2263).
+    """
+    if crs is None:
+        return DEFAULT_TILE_DEG
+    crs = CRS.from_user_input(crs)
+    if crs.is_geographic:
+        return DEFAULT_TILE_DEG
+    return DEFAULT_TILE_M / crs.axis_info[0].unit_conversion_factor
+
+def grid_partition_keys(xs, ys, tile_size=DEFAULT_TILE_DEG):
+    """Tile id per point on a regular grid in the points' own units, so each partition is spatially compact."""
+    cols = np.floor(np.asarray(xs, dtype="float64") / tile_size).astype("int64")
+    rows = np.floor(np.asarray(ys, dtype="float64") / tile_size).astype("int64")
+    return rows * 1000003 + cols
+
+def _plan_tasks(partition_keys, workers, tasks_per_worker=4):
+    """
+    Groups point positions into tasks: each partition stays whole, and
+    partitions are packed largest-first into ~tasks_per_worker tasks per
+    worker so one dense tile (e.g. midtown) doesn't leave the others idle.
+    Missing keys (None/NaN) form one partition of their own.
+    """
+    codes, _ = pd.factorize(pd.Series(partition_keys), sort=True, use_na_sentinel=False)
+    order = np.argsort(codes, kind="stable")
+    sizes = np.bincount(codes)
+    bounds = np.concatenate(([0], np.cumsum(sizes)))
+    n_tasks = max(1, min(len(sizes), workers * tasks_per_worker))
+    tasks = [[] for _ in range(n_tasks)]
+    loads = np.zeros(n_tasks, dtype="int64")
+    for partition in np.argsort(-sizes, kind="stable"):
+        target = int(np.argmin(loads))
+        tasks[target].append(order[bounds[partition]:bounds[partition + 1]])
+        loads[target] += sizes[partition]
+    return [np.sort(np.concatenate(t)) for t in tasks if t]
+
+def _init_worker(polygon_wkb):
+    """Decodes the polygons from WKB and builds their STRtree once per process."""
+    global _worker_polygons, _worker_tree
+    _worker_polygons = shapely.from_wkb(polygon_wkb)
+    shapely.prepare(_worker_polygons)
+    _worker_tree = shapely.STRtree(_worker_polygons)
+
+def _join_task(positions, lons, lats, predicate):
+    """Returns (point position, polygon index) pairs for one task's points."""
+    point_idx, polygon_idx = _worker_tree.query(shapely.points(lons, lats), predicate=predicate)
+    return positions[point_idx], polygon_idx
+
+def point_polygon_pairs(lons, lats, polygons, partition_keys=None, workers=None,
+                        predicate="within", tile_size=None, crs=None):
+    """
+    All (point, polygon) index pairs where point `predicate` polygon, computed
+    across a process pool. Points are split by `partition_keys` (e.g. a
+    borough column) or, by default, a grid of `tile_size` tiles (by default
+    ~4 km in the units of `crs`, see default_tile_size). Only numpy
+    coordinate arrays and one WKB copy of the polygons cross process boundaries.
+    Pairs come back sorted by (point, polygon), so the result does not
+    depend on task scheduling or worker count.
+    """
+    lons = np.asarray(lons, dtype="float64")
+    lats = np.asarray(lats, dtype="float64")
+    polygons = np.asarray(polygons, dtype=object)
+    workers = workers or os.cpu_count() or 1
+    empty = (np.empty(0, dtype="int64"), np.empty(0, dtype="int64"))
+    if len(lons) == 0 or len(polygons) == 0:
+        return empty
+
+    polygon_wkb = shapely.to_wkb(polygons)
+    if workers == 1 or len(lons) < MIN_PARALLEL_POINTS:
+        _init_worker(polygon_wkb)
+        results = [_join_task(np.arange(len(lons)), lons, lats, predicate)]
+    else:
+        if partition_keys is None:
+            partition_keys = grid_partition_keys(lons, lats, tile_size or default_tile_size(crs))
+        tasks = _plan_tasks(np.asarray(partition_keys), workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(polygon_wkb,)) as pool:
+            futures = [pool.submit(_join_task, positions, lons[positions], lats[positions], predicate)
+                       for positions in tasks]
+            results = [future.result() for future in futures]
+        logging.info(f"Joined {len(lons)} points against {len(polygons)} polygons "
+                     f"in {len(tasks)} partitions on {workers} processes.")
+
+    point_idx = np.concatenate([r[0] for r in results]).astype("int64")
+    polygon_idx = np.concatenate([r[1] for r in results]).astype("int64")
+    order = np.lexsort((polygon_idx, point_idx))
+    return point_idx[order], polygon_idx[order]
+
+def count_points_in_polygons(lons, lats, polygons, categories=None, **kwargs):
+    """
+    Number of points inside each polygon, as an int array aligned with
+    `polygons`; with `categories` (one label per point) a polygon x category
+    DataFrame of counts instead. Extra kwargs go to point_polygon_pairs.
+    """
+    point_idx, polygon_idx = point_polygon_pairs(lons, lats, polygons, **kwargs)
+    if categories is None:
+        return np.bincount(polygon_idx, minlength=len(polygons))
+    labels = np.asarray(categories, dtype=object)[point_idx]
+    counts = pd.crosstab(pd.Series(polygon_idx, name="polygon"), pd.Series(labels, name="category"))
+    return counts.reindex(range(len(polygons)), fill_value=0)
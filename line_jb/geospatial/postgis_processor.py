@@ -0,0 +1,135 @@
+import io
+import geopandas
+import pandas as pd
+import psycopg2
+import shapely
+import logging
+from line_jb.geospatial.geo_processor import GeoProcessor
+from line_jb.instrumentation import metrics
+
+logging.basicConfig(level=logging.INFO)
+
+SRID = 4326
+
+class PostGISProcessor(GeoProcessor):
+    """
+    GeoProcessor over a PostGIS database loaded by PostgresInsertManager.
+    Point tables carry a GiST-indexed `geom` column, so row filters, bounding
+    boxes (and through them query_radius, load_tree_points and trees_near)
+    and park/event joins run in the database and only results are read back.
+    """
+    def __init__(self, dsn, parquet_cache=None):
+        super().__init__(dsn, parquet_cache=parquet_cache)
+
+    def _get_connection(self):
+        return psycopg2.connect(self.db_path)
+
+    @staticmethod
+    def _select_columns(columns, lat_col, lon_col, alias="t"):
+        if not columns:
+            return f"{alias}.*"
+        select_cols = list(columns) + [c for c in (lat_col, lon_col) if c not in columns]
+        return ", ".join(f"{alias}.{c}" for c in select_cols)
+
+    def _read(self, sql, params, lat_col, lon_col):
+        conn = self._get_connection()
+        df = pd.read_sql_query(sql, conn, params=params)
+        conn.close()
+        # geom is a generated column; points are rebuilt from the coordinates alongside it
+        df = df.drop(columns=["geom"], errors="ignore")
+        return self._points_to_geodataframe(df, lat_col, lon_col)
+
+    @metrics.timed("geo_load", label_args=("table_name",))
+    def load_data_as_geodataframe(self, table_name, lat_col='latitude', lon_col='longitude',
+                                  columns=None, where=None, params=None,
+                                  time_col=None, start=None, end=None, chunksize=100000):
+        """
+        GeoProcessor.load_data_as_geodataframe against PostGIS; `where` uses
+        psycopg2 placeholders (%s). The fresh parquet cache is still
+        preferred when one is configured.
+        """
+        if self.parquet_cache is not None and where is None:
+            try:
+                if self.parquet_cache.is_fresh(table_name):
+                    return self.parquet_cache.read(
+                        table_name, columns=columns,
+                        filter=self.parquet_cache.time_window_filter(time_col, start, end) if time_col else None
+                    )
+            except Exception as e:
+                logging.warning(f"Parquet cache read failed for {table_name}, falling back to PostGIS: {e}")
+
+        conditions = [f"{lat_col} IS NOT NULL", f"{lon_col} IS NOT NULL"]
+        query_params = list(params or [])
+        if where:
+            conditions.append(f"({where})")
+        if time_col and start is not None:
+            conditions.append(f"{time_col} >= %s")
+            query_params.append(start)
+        if time_col and end is not None:
+            conditions.append(f"{time_col} < %s")
+            query_params.append(end)
+        sql = (f"SELECT {self._select_columns(columns, lat_col, lon_col)} FROM {table_name} t "
+               f"WHERE {' AND '.join(conditions)}")
+        try:
+            gdf = self._read(sql, query_params, lat_col, lon_col)
+        except Exception as e:
+            logging.error(f"Error loading {table_name} into GeoDataFrame: {e}")
+            return geopandas.GeoDataFrame()
+        metrics.inc("geo_rows_loaded", len(gdf), table_name=table_name)
+        logging.info(f"Loaded {len(gdf)} records from {table_name} into GeoDataFrame.")
+        return gdf
+
+    @metrics.timed("geo_query_bbox", label_args=("table_name",))
+    def query_bbox(self, table_name, min_lon, min_lat, max_lon, max_lat, columns=None,
+                   lat_col='latitude', lon_col='longitude'):
+        """Rows of a point table inside a bounding box, probed through its GiST index on geom."""
+        sql = (f"SELECT {self._select_columns(columns, lat_col, lon_col)} FROM {table_name} t "
+               f"WHERE t.geom && ST_MakeEnvelope(%s, %s, %s, %s, {SRID})")
+        try:
+            gdf = self._read(sql, (min_lon, min_lat, max_lon, max_lat), lat_col, lon_col)
+        except Exception as e:
+            logging.error(f"Error querying {table_name} by bounding box: {e}")
+            return geopandas.GeoDataFrame()
+        logging.info(f"Loaded {len(gdf)} records from {table_name} inside bbox "
+                     f"({min_lon}, {min_lat}, {max_lon}, {max_lat}).")
+        return gdf
+
+    @metrics.timed("geo_join_postgis")
+    def calculate_event_density_in_db(self, parks_gdf, events_table, where=None, params=None):
+        """
+        Same result as calculate_historical_event_density, with the join done
+        by PostGIS: park polygons are copied into a temporary GiST-indexed
+        table and the events of `events_table` (optionally filtered by `where`
+        on columns e.<name>, with %s placeholders) are counted per park with
+        ST_Contains, so only one count per park is read back.
+        """
+        if parks_gdf.empty:
+            logging.warning("Skipping historical event density calculation due to empty GeoDataFrames.")
+            return parks_gdf
+        polygons = parks_gdf.geometry.to_crs(epsg=SRID) if parks_gdf.crs else parks_gdf.geometry
+        ewkb = shapely.to_wkb(shapely.set_srid(polygons.values, SRID), hex=True, include_srid=True)
+        buffer = io.StringIO("".join(f"{i}\t{g}\n" for i, g in enumerate(ewkb) if g is not None))
+
+        conn = self._get_connection()
+        with conn, conn.cursor() as cur:
+            cur.execute(f"CREATE TEMP TABLE park_polygons (idx BIGINT, geom geometry(Geometry, {SRID})) "
+                        f"ON COMMIT DROP;")
+            cur.copy_expert("COPY park_polygons (idx, geom) FROM STDIN", buffer)
+            cur.execute("CREATE INDEX ON park_polygons USING GIST (geom);")
+            cur.execute("ANALYZE park_polygons;")
+            cur.execute(
+                f"""
+                SELECT p.idx, COUNT(*) FROM park_polygons p
+                JOIN {events_table} e ON ST_Contains(p.geom, e.geom)
+                {f"WHERE ({where})" if where else ""}
+                GROUP BY p.idx;
+                """,
+                list(params or []),
+            )
+            counts = dict(cur.fetchall())
+        conn.close()
+
+        parks_gdf_with_counts = parks_gdf.copy()
+        parks_gdf_with_counts['event_count'] = [int(counts.get(i, 0)) for i in range(len(parks_gdf))]
+        logging.info("Calculated historical event density for parks (PostGIS).")
+        return parks_gdf_with_counts
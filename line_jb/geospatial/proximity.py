@@ -0,0 +1,280 @@
+import logging
+import sqlite3
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+
+logging.basicConfig(level=logging.INFO)
+
+# Metric (US feet) CRS used for every distance here
+PROJECTED_CRS = "EPSG:2263"
+DEFAULT_RADIUS_FT = 1320.0 # A quarter mile
+DEFAULT_COMPLAINT_DAYS = 30
+
+# Events that get a "what's nearby" list; rows are keyed by rowid (nyc_parks_events.id is never set)
+EVENT_TABLES = ["nyc_permitted_events_future", "nyc_parks_events"]
+
+# Things worth knowing about near an event. `where` selects the relevant rows
+# (with named parameters filled by ProximityIndex); incremental sources only
+# scan rows past the last id seen plus the rows their triggers marked dirty in
+# event_nearby_dirty_items (see db/schema.sql), the others are small enough to
+# redo each time.
+ITEM_SOURCES = {
+    "nyc_311_requests": {
+        "where": "created_date >= :complaint_cutoff",
+        "time_col": "created_date",
+        "incremental": True,
+    },
+    "linknyc_status": {
+        "where": ("LOWER(COALESCE(wifi_status, '')) LIKE '%down%' "
+                  "OR LOWER(COALESCE(tablet_status, '')) LIKE '%down%' "
+                  "OR LOWER(COALESCE(phone_status, '')) LIKE '%down%'"),
+        "incremental": False,
+    },
+    "nyc_tree_points": {
+        "where": "CAST(riskrating AS REAL) >= :min_tree_risk",
+        "incremental": True,
+    },
+}
+
+class ProximityIndex:
+    """
+    Materializes, for every located event, the recent 311 complaints, LinkNYC
+    kiosk outages and risky trees within a radius into the event_nearby table,
+    so an event's detail view is a primary-key lookup. Distances are planar
+    in EPSG:2263 and each side is matched in one STRtree batch query.
+    refresh() only redoes events whose coordinates changed and items added,
+    updated or deleted since the previous refresh.
+    """
+    def __init__(self, db_path, radius_ft=DEFAULT_RADIUS_FT, complaint_days=DEFAULT_COMPLAINT_DAYS,
+                 min_tree_risk=1):
+        self.db_path = db_path
+        self.radius_ft = radius_ft
+        self.complaint_days = complaint_days
+        self.min_tree_risk = min_tree_risk
+        self.to_projected = Transformer.from_crs("EPSG:4326", PROJECTED_CRS, always_xy=True)
+
+    def _get_connection(self):
+        return sqlite3.connect(self.db_path, timeout=60)
+
+    def _project(self, frame):
+        x, y = self.to_projected.transform(frame["longitude"].to_numpy(dtype="float64"),
+                                           frame["latitude"].to_numpy(dtype="float64"))
+        return shapely.points(x, y)
+
+    def _params(self):
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.complaint_days)
+        # 311 dates are stored as ISO text, so the cutoff compares lexicographically
+        return {"complaint_cutoff": cutoff.strftime("%Y-%m-%dT%H:%M:%S"), "min_tree_risk": self.min_tree_risk}
+
+    # ==========================
+    # LOADING BOTH SIDES
+    # ==========================
+    def _load_events(self, conn, table_name):
+        return pd.read_sql_query(
+            f"""
+            SELECT rowid AS event_rowid, latitude, longitude FROM {table_name}
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
+            """,
+            conn,
+        )
+
+    def _load_items(self, conn, item_table, after_id=0, with_dirty=False):
+        """Relevant located items past `after_id`, plus with `with_dirty` those marked in event_nearby_dirty_items."""
+        config = ITEM_SOURCES[item_table]
+        time_select = f", {config['time_col']}" if config.get("time_col") else ""
+        id_filter = "id > :after_id"
+        if with_dirty:
+            id_filter += " OR id IN (SELECT item_id FROM event_nearby_dirty_items WHERE item_table = :item_table)"
+        items = pd.read_sql_query(
+            f"""
+            SELECT id AS item_id, latitude, longitude{time_select} FROM {item_table}
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND ({id_filter}) AND ({config['where']});
+            """,
+            conn,
+            params={**self._params(), "after_id": after_id, "item_table": item_table},
+        )
+        if config.get("time_col"):
+            parsed = pd.to_datetime(items.pop(config["time_col"]), format="ISO8601", errors="coerce", utc=True)
+            items["item_time"] = (parsed.astype("int64") // 10**9).where(parsed.notna())
+        else:
+            items["item_time"] = None
+        return items
+
+    def _pairs(self, events, items, item_table, event_table):
+        """All (event, item) pairs within the radius, via one STRtree over the items."""
+        if events.empty or items.empty:
+            return []
+        item_points = self._project(items)
+        event_points = self._project(events)
+        tree = shapely.STRtree(item_points)
+        event_idx, item_idx = tree.query(event_points, predicate="dwithin", distance=self.radius_ft)
+        distances = shapely.distance(event_points[event_idx], item_points[item_idx])
+        item_times = items["item_time"].to_numpy(dtype=object)[item_idx]
+        return list(zip(
+            [event_table] * len(event_idx),
+            events["event_rowid"].to_numpy()[event_idx].tolist(),
+            [item_table] * len(event_idx),
+            items["item_id"].to_numpy()[item_idx].tolist(),
+            np.round(distances, 1).tolist(),
+            [None if t is None or t != t else int(t) for t in item_times],
+        ))
+
+    # ==========================
+    # INCREMENTAL REFRESH
+    # ==========================
+    def _last_item_id(self, conn, item_table):
+        row = conn.execute(
+            "SELECT watermark, watermark_column FROM sync_state WHERE dataset_name = ?;",
+            (f"event_nearby:{item_table}",),
+        ).fetchone()
+        # A different radius or threshold invalidates everything matched so far
+        return int(row[0]) if row and row[1] == self._settings_key() else None
+
+    def _settings_key(self):
+        return f"id@radius={self.radius_ft},days={self.complaint_days},risk={self.min_tree_risk}"
+
+    def _write_last_item_id(self, conn, item_table, last_id):
+        conn.execute(
+            """
+            INSERT INTO sync_state (dataset_name, watermark_column, watermark, updated_at)
+            VALUES (?, ?, ?, datetime('now'))
+            ON CONFLICT(dataset_name) DO UPDATE SET
+                watermark_column = excluded.watermark_column, watermark = excluded.watermark,
+                updated_at = excluded.updated_at;
+            """,
+            (f"event_nearby:{item_table}", self._settings_key(), str(last_id)),
+        )
+
+    def _insert_pairs(self, conn, pairs):
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO event_nearby
+                (event_table, event_rowid, item_table, item_id, distance_ft, item_time)
+            VALUES (?, ?, ?, ?, ?, ?);
+            """,
+            pairs,
+        )
+
+    def _changed_events(self, conn, event_table, events):
+        """Events that are new or moved since their pairs were computed, and rowids that lost their location."""
+        placed = pd.read_sql_query(
+            "SELECT event_rowid, latitude, longitude FROM event_nearby_events WHERE event_table = ?;",
+            conn, params=(event_table,),
+        )
+        merged = events.merge(placed, on="event_rowid", how="left", suffixes=("", "_placed"))
+        moved = (merged["latitude"] != merged["latitude_placed"]) | (merged["longitude"] != merged["longitude_placed"])
+        gone = np.setdiff1d(placed["event_rowid"].to_numpy(), events["event_rowid"].to_numpy())
+        return events[moved.to_numpy()], gone.tolist()
+
+    def refresh(self):
+        """Brings event_nearby up to date; returns the number of pairs written."""
+        conn = self._get_connection()
+        written = 0
+        with conn:
+            if any(self._last_item_id(conn, item_table) is None for item_table in ITEM_SOURCES):
+                # First run or changed settings: rebuild from scratch
+                conn.execute("DELETE FROM event_nearby;")
+                conn.execute("DELETE FROM event_nearby_events;")
+                conn.execute("DELETE FROM event_nearby_dirty_items;")
+                for item_table in ITEM_SOURCES:
+                    self._write_last_item_id(conn, item_table, 0)
+
+            # Complaints that aged out of the window
+            cutoff = pd.Timestamp(self._params()["complaint_cutoff"], tz="UTC").value // 10**9
+            conn.execute("DELETE FROM event_nearby WHERE item_table = 'nyc_311_requests' AND item_time < ?;",
+                         (cutoff,))
+
+            all_events = {table: self._load_events(conn, table) for table in EVENT_TABLES}
+            changed = {}
+            for event_table, events in all_events.items():
+                moved, gone = self._changed_events(conn, event_table, events)
+                stale = gone + moved["event_rowid"].tolist()
+                conn.executemany("DELETE FROM event_nearby WHERE event_table = ? AND event_rowid = ?;",
+                                 [(event_table, rowid) for rowid in stale])
+                conn.executemany("DELETE FROM event_nearby_events WHERE event_table = ? AND event_rowid = ?;",
+                                 [(event_table, rowid) for rowid in stale])
+                changed[event_table] = moved
+
+            for item_table, config in ITEM_SOURCES.items():
+                last_id = self._last_item_id(conn, item_table)
+                if config["incremental"]:
+                    # Moved/new events against every current item...
+                    if any(not moved.empty for moved in changed.values()):
+                        items = self._load_items(conn, item_table)
+                        for event_table, moved in changed.items():
+                            pairs = self._pairs(moved, items, item_table, event_table)
+                            self._insert_pairs(conn, pairs)
+                            written += len(pairs)
+                    # ...items updated or deleted since they were matched lose their pairs...
+                    conn.execute(
+                        """
+                        DELETE FROM event_nearby WHERE item_table = ? AND item_id IN
+                            (SELECT item_id FROM event_nearby_dirty_items WHERE item_table = ?);
+                        """,
+                        (item_table, item_table),
+                    )
+                    # ...and they (if still relevant) and items added since the last refresh
+                    # are matched against the other events
+                    new_items = self._load_items(conn, item_table, after_id=last_id, with_dirty=True)
+                    conn.execute("DELETE FROM event_nearby_dirty_items WHERE item_table = ?;", (item_table,))
+                    for event_table, events in all_events.items():
+                        unchanged = events[~events["event_rowid"].isin(changed[event_table]["event_rowid"])]
+                        pairs = self._pairs(unchanged, new_items, item_table, event_table)
+                        self._insert_pairs(conn, pairs)
+                        written += len(pairs)
+                    max_id = conn.execute(f"SELECT MAX(id) FROM {item_table};").fetchone()[0]
+                    self._write_last_item_id(conn, item_table, max_id or last_id)
+                else:
+                    conn.execute("DELETE FROM event_nearby WHERE item_table = ?;", (item_table,))
+                    items = self._load_items(conn, item_table)
+                    for event_table, events in all_events.items():
+                        pairs = self._pairs(events, items, item_table, event_table)
+                        self._insert_pairs(conn, pairs)
+                        written += len(pairs)
+
+            for event_table, moved in changed.items():
+                conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO event_nearby_events (event_table, event_rowid, latitude, longitude)
+                    VALUES (?, ?, ?, ?);
+                    """,
+                    [(event_table, *row) for row in
+                     moved[["event_rowid", "latitude", "longitude"]].itertuples(index=False, name=None)],
+                )
+        conn.close()
+        logging.info(f"Refreshed event proximity: {written} event/item pairs written.")
+        return written
+
+    # ==========================
+    # LOOKUPS
+    # ==========================
+    def nearby(self, event_table, event_rowid):
+        """Everything materialized near one event, nearest first (a primary-key range read)."""
+        conn = self._get_connection()
+        rows = pd.read_sql_query(
+            """
+            SELECT item_table, item_id, distance_ft, item_time FROM event_nearby
+            WHERE event_table = ? AND event_rowid = ? ORDER BY item_table, distance_ft;
+            """,
+            conn, params=(event_table, event_rowid),
+        )
+        conn.close()
+        return rows
+
+    def summary(self, event_table, event_rowid):
+        """Counts of nearby items per source for one event, e.g. {'nyc_311_requests': 12, ...}."""
+        counts = {item_table: 0 for item_table in ITEM_SOURCES}
+        conn = self._get_connection()
+        for item_table, count in conn.execute(
+            """
+            SELECT item_table, COUNT(*) FROM event_nearby
+            WHERE event_table = ? AND event_rowid = ? GROUP BY item_table;
+            """,
+            (event_table, event_rowid),
+        ):
+            counts[item_table] = count
+        conn.close()
+        return counts
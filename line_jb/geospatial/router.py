@@ -0,0 +1,242 @@
+import heapq
+import logging
+import os
+import numpy as np
+import osmnx as ox
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_LANDMARKS = 16
+WALKING_SPEED_MPS = 1.4
+
+class CSRRouter:
+    """
+    Walking router over a street graph held as CSR arrays (indptr, indices,
+    edge length, edge nuisance score) instead of a networkx MultiDiGraph.
+    Queries run A* with ALT lower bounds: shortest distances to and from a
+    few landmark nodes are precomputed once with scipy's C Dijkstra, and the
+    triangle inequality then prunes the search to a narrow corridor.
+
+    Edge cost is length * (1 + avoidance * nuisance_score). Landmarks are
+    computed on plain length, which never exceeds that cost, so the bounds
+    stay admissible for any avoidance >= 0 chosen per query. The router is
+    read-only once built, so one instance can serve concurrent requests.
+    """
+    def __init__(self, node_ids, node_lons, node_lats, indptr, indices, lengths, nuisance=None,
+                 landmarks=None, landmark_from=None, landmark_to=None, edge_keys=None):
+        self.node_ids = np.asarray(node_ids, dtype="int64")
+        self.node_lons = np.asarray(node_lons, dtype="float64")
+        self.node_lats = np.asarray(node_lats, dtype="float64")
+        self.indptr = np.asarray(indptr, dtype="int64")
+        self.indices = np.asarray(indices, dtype="int64")
+        self.lengths = np.asarray(lengths, dtype="float64")
+        self.nuisance = (np.zeros(len(self.lengths)) if nuisance is None
+                         else np.asarray(nuisance, dtype="float64"))
+        # OSMnx key of the parallel edge each CSR edge was built from, to match scores by (u, v, key)
+        self.edge_keys = (np.zeros(len(self.lengths), dtype="int64") if edge_keys is None
+                          else np.asarray(edge_keys, dtype="int64"))
+        self.landmarks = landmarks
+        self.landmark_from = landmark_from # [landmark, node]: distance landmark -> node
+        self.landmark_to = landmark_to     # [landmark, node]: distance node -> landmark
+        self._index_landmarks()
+
+        # Nearest-node lookup on an equirectangular projection around the graph's centre
+        self._cos_lat = np.cos(np.radians(np.mean(self.node_lats))) if len(self.node_lats) else 1.0
+        self._kdtree = cKDTree(np.column_stack((self.node_lons * self._cos_lat, self.node_lats)))
+        # Plain lists index faster than numpy scalars in the A* inner loop
+        self._indptr_list = self.indptr.tolist()
+        self._indices_list = self.indices.tolist()
+        self._lengths_list = self.lengths.tolist()
+        self._nuisance_list = self.nuisance.tolist()
+
+    # ==========================
+    # CONSTRUCTION
+    # ==========================
+    @classmethod
+    def from_osmnx(cls, graph, edge_scores=None):
+        """
+        Builds the CSR arrays from an OSMnx graph. Parallel edges collapse to
+        the shortest one, which keeps its own nuisance score. `edge_scores`
+        is an optional Series of nuisance scores indexed by (u, v, key),
+        e.g. NuisanceScorer.edge_scores().
+        """
+        nodes, edges = ox.graph_to_gdfs(graph, fill_edge_geometry=False)
+        node_ids = nodes.index.to_numpy(dtype="int64")
+        position = {node_id: i for i, node_id in enumerate(node_ids.tolist())}
+        edges = edges.reset_index()[["u", "v", "key", "length"]]
+        if edge_scores is not None:
+            edges = edges.join(edge_scores.rename("nuisance"), on=["u", "v", "key"])
+        edges["nuisance"] = edges.get("nuisance", 0.0)
+        edges["nuisance"] = edges["nuisance"].fillna(0.0)
+        edges = edges.sort_values("length").drop_duplicates(["u", "v"])
+
+        src = edges["u"].map(position).to_numpy(dtype="int64")
+        dst = edges["v"].map(position).to_numpy(dtype="int64")
+        order = np.lexsort((dst, src))
+        src, dst = src[order], dst[order]
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(src, minlength=len(node_ids)))))
+        router = cls(node_ids, nodes["x"].to_numpy(), nodes["y"].to_numpy(), indptr, dst,
+                     edges["length"].to_numpy(dtype="float64")[order],
+                     edges["nuisance"].to_numpy(dtype="float64")[order],
+                     edge_keys=edges["key"].to_numpy(dtype="int64")[order])
+        logging.info(f"Built CSR graph with {len(node_ids)} nodes and {len(dst)} edges.")
+        return router
+
+    def _length_matrix(self):
+        return csr_matrix((self.lengths, self.indices, self.indptr), shape=(len(self.node_ids),) * 2)
+
+    def precompute_landmarks(self, count=DEFAULT_LANDMARKS, seed=0):
+        """
+        Picks landmarks by farthest-point selection and stores their distances
+        to and from every node (inf where unreachable).
+        """
+        matrix = self._length_matrix()
+        rng = np.random.default_rng(seed)
+        landmarks = [int(rng.integers(len(self.node_ids)))]
+        nearest = dijkstra(matrix, indices=landmarks[0])
+        for _ in range(count - 1):
+            candidates = np.where(np.isfinite(nearest), nearest, -1)
+            landmarks.append(int(np.argmax(candidates)))
+            nearest = np.minimum(nearest, dijkstra(matrix, indices=landmarks[-1]))
+        landmark_from = dijkstra(matrix, indices=landmarks)
+        landmark_to = dijkstra(matrix.T.tocsr(), indices=landmarks)
+        self.landmarks = np.asarray(landmarks, dtype="int64")
+        self.landmark_from = landmark_from
+        self.landmark_to = landmark_to
+        self._index_landmarks()
+        logging.info(f"Precomputed {count} ALT landmarks.")
+
+    def _index_landmarks(self):
+        """
+        Per-node rows [d(L, v) for each L] + [-d(v, L) for each L], so one
+        subtraction of a node's row from the target's gives every ALT bound.
+        """
+        self._landmark_rows = None
+        if self.landmarks is not None:
+            self._landmark_rows = np.ascontiguousarray(
+                np.hstack((np.asarray(self.landmark_from).T, -np.asarray(self.landmark_to).T))
+            )
+
+    def set_nuisance(self, edge_scores):
+        """
+        Swaps in fresh nuisance scores, a Series indexed by (u, v, key) as
+        returned by NuisanceScorer.edge_scores(), without rebuilding the graph
+        or landmarks. Like from_osmnx, each edge takes the score of the
+        parallel edge it was built from. In-flight queries keep using the
+        previous scores.
+        """
+        src = np.repeat(np.arange(len(self.node_ids)), np.diff(self.indptr))
+        edges = pd.MultiIndex.from_arrays((self.node_ids[src], self.node_ids[self.indices], self.edge_keys))
+        nuisance = edge_scores.reindex(edges).fillna(0.0).to_numpy(dtype="float64")
+        self.nuisance = nuisance
+        self._nuisance_list = nuisance.tolist() # Single reference swap, safe under concurrent reads
+
+    # ==========================
+    # PERSISTENCE
+    # ==========================
+    def save(self, path):
+        """
+        Writes the arrays (and landmarks) to one .npz file for fast service
+        start-up. The file is written under a temporary name and swapped in,
+        so a concurrent load never sees it half-written.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        arrays = dict(node_ids=self.node_ids, node_lons=self.node_lons, node_lats=self.node_lats,
+                      indptr=self.indptr, indices=self.indices, lengths=self.lengths, nuisance=self.nuisance,
+                      edge_keys=self.edge_keys)
+        if self.landmarks is not None:
+            arrays.update(landmarks=self.landmarks, landmark_from=self.landmark_from,
+                          landmark_to=self.landmark_to)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        return cls(**arrays)
+
+    # ==========================
+    # QUERIES
+    # ==========================
+    def nearest_node(self, lon, lat):
+        _, index = self._kdtree.query([lon * self._cos_lat, lat])
+        return int(index)
+
+    def _heuristic(self, target):
+        """
+        ALT lower bound on the distance from a node to target, as a function
+        that computes each node's bound the first time A* reaches it and
+        caches it for the rest of the query.
+        """
+        if self._landmark_rows is None:
+            return lambda node: 0.0
+        rows, target_row = self._landmark_rows, self._landmark_rows[target]
+        cache = {}
+
+        def bound(node):
+            value = cache.get(node)
+            if value is None:
+                # d(v,t) >= d(L,t) - d(L,v) and d(v,t) >= d(v,L) - d(t,L), for every landmark L.
+                # fmax skips the NaNs of inf - inf; inf means target is unreachable from node.
+                value = float(np.fmax.reduce(target_row - rows[node]))
+                value = cache[node] = value if value > 0.0 else 0.0
+            return value
+        return bound
+
+    def shortest_path(self, source, target, avoidance=1.0):
+        """A* from node position source to target; returns (node positions, cost, length_m) or None."""
+        heuristic = self._heuristic(target)
+        with np.errstate(invalid="ignore"):
+            return self._search(source, target, avoidance, heuristic)
+
+    def _search(self, source, target, avoidance, heuristic):
+        indptr, indices = self._indptr_list, self._indices_list
+        lengths, nuisance = self._lengths_list, self._nuisance_list
+        best = {source: 0.0}
+        walked = {source: 0.0}
+        previous = {}
+        done = set()
+        heap = [(heuristic(source), 0.0, source)]
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node == target:
+                path = [node]
+                while path[-1] in previous:
+                    path.append(previous[path[-1]])
+                return path[::-1], cost, walked[target]
+            if node in done:
+                continue
+            done.add(node)
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbor = indices[edge]
+                if neighbor in done:
+                    continue
+                new_cost = cost + lengths[edge] * (1.0 + avoidance * nuisance[edge])
+                if new_cost < best.get(neighbor, float("inf")):
+                    best[neighbor] = new_cost
+                    walked[neighbor] = walked[node] + lengths[edge]
+                    previous[neighbor] = node
+                    heapq.heappush(heap, (new_cost + heuristic(neighbor), new_cost, neighbor))
+        return None
+
+    def route(self, from_lon, from_lat, to_lon, to_lat, avoidance=1.0):
+        """Walking route between two coordinates, as a JSON-ready dict (None if unreachable)."""
+        source, target = self.nearest_node(from_lon, from_lat), self.nearest_node(to_lon, to_lat)
+        result = self.shortest_path(source, target, avoidance=avoidance)
+        if result is None:
+            return None
+        path, cost, length_m = result
+        return {
+            "distance_m": round(length_m, 1),
+            "duration_s": round(length_m / WALKING_SPEED_MPS, 1),
+            "cost": round(cost, 1),
+            "nodes": self.node_ids[path].tolist(),
+            "coordinates": np.column_stack((self.node_lons[path], self.node_lats[path])).tolist(),
+        }
@@ -0,0 +1,306 @@
+import logging
+import math
+import sqlite3
+import numpy as np
+import osmnx as ox
+import pandas as pd
+import shapely
+from pyproj import Transformer
+
+logging.basicConfig(level=logging.INFO)
+
+# NY State Plane (Long Island), in US feet: distances for snapping are planar and exact enough
+PROJECTED_CRS = "EPSG:2263"
+DEFAULT_MAX_SNAP_FT = 150.0
+DEFAULT_HALF_LIFE_DAYS = 30.0
+
+# Scores are stored as log(sum(w * exp(rate * (t - EPOCH)))), so adding a report never
+# rescales the others; the score at time T is exp(that log sum - rate * (T - EPOCH)).
+# The sum itself would overflow a float within years for short half-lives (for a
+# 3-day half-life, rate * (now - EPOCH) is already over 1400); its log stays small.
+DECAY_EPOCH = pd.Timestamp("2010-01-01").value // 10**9
+# Tags the stored sums' format and half-life in sync_state; anything else is rebuilt
+SCORE_FORMAT = "id@log_half_life={}"
+
+# 311 complaint types that make a street unpleasant, matched as upper-case substrings
+COMPLAINT_WEIGHTS = {
+    "NOISE": 1.0,
+    "SANITATION": 1.0,
+    "DIRTY": 0.8,
+    "UNSANITARY": 0.8,
+    "MISSED COLLECTION": 0.8,
+    "RODENT": 0.8,
+    "LITTER": 0.6,
+    "ILLEGAL DUMPING": 0.6,
+    "STREET CONDITION": 0.5,
+    "SIDEWALK CONDITION": 0.5,
+    "GRAFFITI": 0.3,
+}
+SIDEWALK_VIOLATION_WEIGHT = 0.5
+
+def load_edge_scores(conn, half_life_days=DEFAULT_HALF_LIFE_DAYS, at=None):
+    """
+    Stored edge scores decayed to `at` (default now), as a DataFrame indexed
+    by (u, v, key) with nuisance_score and complaints. Needs no graph, so
+    consumers such as the router can refresh scores cheaply.
+    """
+    at = pd.Timestamp(at or pd.Timestamp.now(tz="UTC")).value // 10**9
+    rate = np.log(2) / (half_life_days * 86400)
+    stored = pd.read_sql_query("SELECT u, v, key, log_decay_sum, complaints FROM edge_nuisance", conn)
+    stored["nuisance_score"] = np.exp(stored.pop("log_decay_sum") - rate * (at - DECAY_EPOCH))
+    return stored.set_index(["u", "v", "key"])
+
+def logaddexp(a, b):
+    """log(exp(a) + exp(b)) without overflow; registered as an SQL function for the upserts."""
+    if a is None or b is None:
+        return b if a is None else a
+    return max(a, b) + math.log1p(math.exp(-abs(a - b)))
+
+def complaint_weights(complaint_types):
+    """Nuisance weight per complaint type (0 for types that don't affect a street)."""
+    upper = pd.Series(complaint_types, dtype="string").str.upper().fillna("")
+    weights = np.zeros(len(upper))
+    for keyword, weight in COMPLAINT_WEIGHTS.items():
+        weights = np.maximum(weights, np.where(upper.str.contains(keyword, regex=False), weight, 0.0))
+    return weights
+
+class NuisanceScorer:
+    """
+    Time-decayed nuisance score per street edge of an OSMnx graph, built from
+    311 complaints and sidewalk violations. Points are snapped to their
+    nearest edge in one vectorized STRtree query in a projected CRS, and only
+    rows added since the last update are processed, so scores stay current
+    incrementally. Totals persist in the edge_nuisance table.
+
+    Progress is tracked by row id ("edge_nuisance:<table>" in sync_state),
+    so rows that ingest updates in place (e.g. a complaint relocated or
+    re-typed upstream) keep the contribution they were first scored with:
+    a report cannot be taken back out of a stored log-sum without losing
+    precision. Pass rebuild=True to update() now and then (e.g. nightly) to
+    rescore everything from the current rows.
+    """
+    def __init__(self, db_path, graph, half_life_days=DEFAULT_HALF_LIFE_DAYS,
+                 max_snap_ft=DEFAULT_MAX_SNAP_FT, geocoder=None):
+        self.db_path = db_path
+        self.graph = graph
+        self.half_life_days = half_life_days
+        self.rate = np.log(2) / (half_life_days * 86400)
+        self.max_snap_ft = max_snap_ft
+        # Sidewalk violations only have street addresses; a Geocoder places them
+        self.geocoder = geocoder
+
+        self.edges = ox.graph_to_gdfs(graph, nodes=False, fill_edge_geometry=True)
+        self.edges_projected = self.edges.geometry.to_crs(PROJECTED_CRS).values
+        self.tree = shapely.STRtree(self.edges_projected)
+        self.to_projected = Transformer.from_crs("EPSG:4326", PROJECTED_CRS, always_xy=True)
+        logging.info(f"Built nuisance edge index over {len(self.edges)} street edges.")
+
+    def _get_connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=60)
+        conn.create_function("logaddexp", 2, logaddexp, deterministic=True)
+        return conn
+
+    # ==========================
+    # SNAPPING
+    # ==========================
+    def snap(self, lons, lats):
+        """
+        (point position, edge index) pairs linking each point to its nearest
+        edge within max_snap_ft. Equidistant edges all match, so both
+        directions of a two-way street share a complaint; points with no
+        edge in range have no pair.
+        """
+        x, y = self.to_projected.transform(np.asarray(lons, dtype="float64"), np.asarray(lats, dtype="float64"))
+        located = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+        if len(located) == 0:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="int64")
+        point_idx, edge_idx = self.tree.query_nearest(shapely.points(x[located], y[located]),
+                                                      max_distance=self.max_snap_ft)
+        return located[point_idx], edge_idx
+
+    # ==========================
+    # INCREMENTAL UPDATES
+    # ==========================
+    def _state_key(self, source):
+        return f"edge_nuisance:{source}"
+
+    def _read_progress(self, conn, source):
+        """Last row id folded into the scores for a source; None if never scored with this half-life."""
+        row = conn.execute(
+            "SELECT watermark_column, watermark FROM sync_state WHERE dataset_name = ?;",
+            (self._state_key(source),),
+        ).fetchone()
+        if row is None or row[0] != SCORE_FORMAT.format(self.half_life_days):
+            return None
+        return int(row[1])
+
+    def _write_progress(self, conn, source, last_id, rows):
+        conn.execute(
+            """
+            INSERT INTO sync_state (dataset_name, watermark_column, watermark, rows_synced, updated_at)
+            VALUES (?, ?, ?, ?, datetime('now'))
+            ON CONFLICT(dataset_name) DO UPDATE SET
+                watermark_column = excluded.watermark_column, watermark = excluded.watermark,
+                rows_synced = sync_state.rows_synced + excluded.rows_synced,
+                updated_at = excluded.updated_at;
+            """,
+            (self._state_key(source), SCORE_FORMAT.format(self.half_life_days), str(last_id), rows),
+        )
+
+    @staticmethod
+    def _edge_sums(edges, log_terms, complaints):
+        """Log-sum-exp of log_terms and total complaints per edge index."""
+        terms = pd.DataFrame({"edge": edges, "log_term": log_terms, "complaints": complaints})
+        peak = terms.groupby("edge")["log_term"].transform("max")
+        terms["scaled"] = np.exp(terms["log_term"] - peak)
+        sums = terms.assign(peak=peak).groupby("edge").agg(peak=("peak", "first"), scaled=("scaled", "sum"),
+                                                          complaints=("complaints", "sum"))
+        return pd.DataFrame({"log_sum": sums["peak"] + np.log(sums["scaled"]), "complaints": sums["complaints"]})
+
+    def _contributions(self, lons, lats, weights, timestamps):
+        """Snaps weighted, timestamped reports to edges; returns per-edge sums (or None) and reports snapped."""
+        point_idx, edge_idx = self.snap(lons, lats)
+        valid = (weights[point_idx] > 0) & np.isfinite(timestamps[point_idx])
+        point_idx, edge_idx = point_idx[valid], edge_idx[valid]
+        if len(point_idx) == 0:
+            return None, 0
+        # log(w * exp(rate * (t - EPOCH))) per report, then a log-sum-exp per edge
+        log_terms = np.log(weights[point_idx]) + self.rate * (timestamps[point_idx] - DECAY_EPOCH)
+        sums = self._edge_sums(edge_idx, log_terms, np.ones(len(edge_idx), dtype="int64"))
+        return sums, len(np.unique(point_idx))
+
+    def _merge_sums(self, total, sums):
+        if total is None or sums is None:
+            return sums if total is None else total
+        merged = pd.concat([total, sums])
+        return self._edge_sums(merged.index.to_numpy(), merged["log_sum"].to_numpy(), merged["complaints"].to_numpy())
+
+    @staticmethod
+    def _epoch_seconds(values):
+        parsed = pd.to_datetime(pd.Series(values), format="ISO8601", errors="coerce", utc=True)
+        return (parsed.astype("int64") // 10**9).where(parsed.notna()).to_numpy(dtype="float64")
+
+    def _311_points(self, conn, chunk, geocoded):
+        return (chunk["longitude"].to_numpy(dtype="float64"), chunk["latitude"].to_numpy(dtype="float64"),
+                complaint_weights(chunk["complaint_type"]), self._epoch_seconds(chunk["created_date"]))
+
+    def _sidewalk_points(self, conn, chunk, geocoded):
+        """Geocodes violation addresses; newly resolved ones collect in `geocoded` for the writer to cache."""
+        addresses = (chunk["house_num"].fillna("").astype(str) + " " + chunk["onstname"].fillna("").astype(str)).str.strip()
+        wanted = set(addresses)
+        resolved, new = self.geocoder.lookup(conn, wanted - geocoded.keys())
+        geocoded.update(new)
+        resolved.update((a, geocoded[a]) for a in wanted & geocoded.keys())
+        coords = np.array([resolved.get(a, (None, None, None))[:2] for a in addresses], dtype="float64")
+        return (coords[:, 1], coords[:, 0], np.full(len(chunk), SIDEWALK_VIOLATION_WEIGHT),
+                self._epoch_seconds(chunk["vissuedate"]))
+
+    def _sources(self):
+        sources = {
+            "nyc_311_requests": (
+                """
+                SELECT id, latitude, longitude, complaint_type, created_date FROM nyc_311_requests
+                WHERE id > ? AND latitude IS NOT NULL AND longitude IS NOT NULL ORDER BY id;
+                """,
+                self._311_points,
+            ),
+        }
+        if self.geocoder is not None:
+            sources["nyc_sidewalk_status"] = (
+                "SELECT id, house_num, onstname, vissuedate FROM nyc_sidewalk_status WHERE id > ? ORDER BY id;",
+                self._sidewalk_points,
+            )
+        return sources
+
+    def prepare_update(self, chunksize=200000, rebuild=False):
+        """
+        The read-only half of update(): snaps 311 requests (and, with a
+        geocoder, sidewalk violations) added since the last update (or, with
+        `rebuild`, all of them) and sums them per edge, without writing.
+        Pass the result to apply_update(), e.g. on the pipeline's writer thread.
+        """
+        conn = self._get_connection()
+        sources = self._sources()
+        seen = {source: self._read_progress(conn, source) for source in sources}
+        # Stored sums built with another half-life (or never) are rebuilt from every source
+        rebuild = rebuild or any(last_id is None for last_id in seen.values())
+        pending = {"rebuild": rebuild, "progress": {}, "sums": None, "geocoded": {}, "snapped": 0}
+        for source, (sql, to_points) in sources.items():
+            last_id, rows = 0 if rebuild else seen[source], 0
+            for chunk in pd.read_sql_query(sql, conn, params=(last_id,), chunksize=chunksize):
+                if chunk.empty:
+                    continue
+                lons, lats, weights, timestamps = to_points(conn, chunk, pending["geocoded"])
+                sums, snapped = self._contributions(lons, lats, weights, timestamps)
+                pending["sums"] = self._merge_sums(pending["sums"], sums)
+                pending["snapped"] += snapped
+                last_id, rows = int(chunk["id"].max()), rows + len(chunk)
+            pending["progress"][source] = (seen[source], last_id, rows)
+        conn.close()
+        return pending
+
+    def apply_update(self, pending):
+        """
+        Writes the result of prepare_update(): scores, progress and newly
+        geocoded addresses commit together, so a crash never double counts.
+        Returns the number of hits, or 0 if another update got there first.
+        """
+        conn = self._get_connection()
+        moved = [source for source, (seen, _, _) in pending["progress"].items()
+                 if self._read_progress(conn, source) != seen]
+        if moved:
+            conn.close()
+            logging.warning(f"Nuisance scores for {moved} changed since they were prepared; skipping this update.")
+            return 0
+        with conn:
+            if self.geocoder is not None:
+                self.geocoder.store(conn, pending["geocoded"])
+            if pending["rebuild"]:
+                conn.execute("DELETE FROM edge_nuisance;")
+                for source in pending["progress"]:
+                    conn.execute("DELETE FROM sync_state WHERE dataset_name = ?;", (self._state_key(source),))
+            sums = pending["sums"]
+            if sums is not None:
+                u, v, key = (self.edges.index.get_level_values(level)[sums.index.to_numpy()] for level in range(3))
+                conn.executemany(
+                    """
+                    INSERT INTO edge_nuisance (u, v, key, log_decay_sum, complaints) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(u, v, key) DO UPDATE SET
+                        log_decay_sum = logaddexp(log_decay_sum, excluded.log_decay_sum),
+                        complaints = complaints + excluded.complaints;
+                    """,
+                    zip(u.tolist(), v.tolist(), key.tolist(), sums["log_sum"].tolist(), sums["complaints"].tolist()),
+                )
+            # Progress is recorded even for an empty source so it isn't treated as never scored
+            for source, (_, last_id, rows) in pending["progress"].items():
+                self._write_progress(conn, source, last_id, rows)
+        conn.close()
+        logging.info(f"Folded {pending['snapped']} new nuisance reports into street edge scores.")
+        return pending["snapped"]
+
+    def update(self, chunksize=200000, rebuild=False):
+        """
+        Folds 311 requests (and, with a geocoder, sidewalk violations) added
+        since the last call into the edge scores, or with `rebuild` rescores
+        every stored row. Returns the number of hits.
+        """
+        return self.apply_update(self.prepare_update(chunksize, rebuild))
+
+    # ==========================
+    # QUERIES
+    # ==========================
+    def edge_scores(self, at=None):
+        """Street edges GeoDataFrame with nuisance_score (decayed to `at`, default now) and complaints."""
+        conn = self._get_connection()
+        stored = load_edge_scores(conn, self.half_life_days, at)
+        conn.close()
+        edges = self.edges[["geometry"] + [c for c in ("name", "highway") if c in self.edges.columns]].copy()
+        edges = edges.join(stored, how="left")
+        edges["nuisance_score"] = edges["nuisance_score"].fillna(0.0)
+        edges["complaints"] = edges["complaints"].fillna(0).astype(int)
+        return edges
+
+    def streets_to_avoid(self, top_n=500, at=None):
+        """The top_n highest-scoring edges, highest first."""
+        scores = self.edge_scores(at)
+        return scores[scores["nuisance_score"] > 0].nlargest(top_n, "nuisance_score")
@@ -0,0 +1,339 @@
+import cProfile
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(level=logging.INFO)
+
+__all__ = ["MetricsRegistry", "METRICS", "stage", "timed", "inc", "observe"]
+
+PREFIX = "line_jb"
+# Upper bounds (seconds) of the stage duration histogram, from a single page or
+# chunk up to a whole dataset; +Inf is implied
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800)
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count", "max")
+
+    def __init__(self, n_buckets):
+        self.counts = [0] * (n_buckets + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+class MetricsRegistry:
+    """
+    In-process counters and stage-duration histograms for one pipeline run.
+
+    Stages are timed with `stage(name, **labels)` (or the `timed` decorator)
+    and land in one histogram keyed by stage name and labels; counters are
+    free-form (`inc`). Recording is a lock, a perf_counter pair and a bisect,
+    cheap enough to stay on around every page, chunk and layer.
+
+    Optional, for chosen stages only:
+    - `profile_stages`: cProfile per stage (accumulated over its calls and
+      written as .prof files by write_profiles). One stage is profiled at a
+      time; overlapping calls on other threads are timed but not profiled.
+    - `trace_memory`: tracemalloc peak per stage. tracemalloc slows Python
+      down severalfold and its peak is process-wide, so use it for
+      diagnosis runs where the traced stages do not overlap.
+
+    Results are exported as a JSON run report (report/write_report) and in
+    the Prometheus text format (prometheus_text/write_prometheus/serve).
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS, profile_stages=(), trace_memory=False,
+                 profile_dir="cache/profiles"):
+        self.buckets = tuple(sorted(buckets))
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._peak_alloc = {}
+        self._profiles = {}
+        self._profile_lock = threading.Lock()
+        self.configure(profile_stages, trace_memory, profile_dir)
+
+    def configure(self, profile_stages=(), trace_memory=False, profile_dir="cache/profiles"):
+        """Sets which stages are profiled ("all" for every stage) and whether memory is traced."""
+        if isinstance(profile_stages, str):
+            profile_stages = [s.strip() for s in profile_stages.split(",") if s.strip()]
+        self.profile_stages = frozenset(profile_stages)
+        self.trace_memory = trace_memory
+        self.profile_dir = profile_dir
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def reset(self):
+        """Drops everything recorded so far and restarts the run clock."""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._peak_alloc.clear()
+            self._profiles.clear()
+            self.started_at = datetime.now(timezone.utc)
+            self._started = time.perf_counter()
+
+    # ==========================
+    # RECORDING
+    # ==========================
+    def inc(self, name, value=1, /, **labels):
+        """Adds `value` to a counter."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, stage_name, seconds, /, **labels):
+        """Records one duration for a stage."""
+        key = (stage_name, _label_key(labels))
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(len(self.buckets))
+            histogram.counts[index] += 1
+            histogram.total += seconds
+            histogram.count += 1
+            if seconds > histogram.max:
+                histogram.max = seconds
+
+    @contextmanager
+    def stage(self, name, /, **labels):
+        """Times the enclosed block as one call of stage `name`."""
+        profiler = None
+        if self.profile_stages and (name in self.profile_stages or "all" in self.profile_stages):
+            profiler = self._start_profile(name, labels)
+        if self.trace_memory:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self._profile_lock.release()
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1] - base
+                key = (name, _label_key(labels))
+                with self._lock:
+                    self._peak_alloc[key] = max(self._peak_alloc.get(key, 0), peak)
+            self.observe(name, elapsed, **labels)
+
+    def _start_profile(self, name, labels):
+        if not self._profile_lock.acquire(blocking=False):
+            return None # Another stage is being profiled (cProfile allows one at a time)
+        key = (name, _label_key(labels))
+        with self._lock:
+            profiler = self._profiles.get(key)
+            if profiler is None:
+                profiler = self._profiles[key] = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError: # Another profiler (e.g. an outer cProfile run) is active
+            self._profile_lock.release()
+            return None
+        return profiler
+
+    def timed(self, name, /, label_args=(), **labels):
+        """
+        Decorator timing every call of a function as stage `name`. Arguments
+        named in `label_args` (e.g. "table_name") become labels of the call.
+        """
+        def decorator(func):
+            signature = inspect.signature(func)
+            positions = {arg: list(signature.parameters).index(arg) for arg in label_args}
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                call_labels = dict(labels)
+                for arg, position in positions.items():
+                    value = kwargs[arg] if arg in kwargs else args[position] if position < len(args) else None
+                    call_labels[arg] = value
+                with self.stage(name, **call_labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # ==========================
+    # EXPORT
+    # ==========================
+    def _quantile(self, histogram, q):
+        """Quantile estimated by linear interpolation within the histogram bucket."""
+        rank = q * histogram.count
+        seen = 0
+        lower = 0.0
+        for upper, count in zip(self.buckets + (histogram.max,), histogram.counts):
+            if count and seen + count >= rank:
+                upper = min(upper, histogram.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return histogram.max
+
+    def report(self):
+        """The run so far as a JSON-serializable dict, slowest stages first."""
+        with self._lock:
+            histograms = list(self._histograms.items())
+            counters = sorted(self._counters.items())
+            peak_alloc = dict(self._peak_alloc)
+        stages = []
+        for (name, label_key), histogram in histograms:
+            record = {
+                "stage": name,
+                "labels": dict(label_key),
+                "count": histogram.count,
+                "total_seconds": round(histogram.total, 6),
+                "mean_seconds": round(histogram.total / histogram.count, 6),
+                "p50_seconds": round(self._quantile(histogram, 0.5), 6),
+                "p95_seconds": round(self._quantile(histogram, 0.95), 6),
+                "max_seconds": round(histogram.max, 6),
+            }
+            if (name, label_key) in peak_alloc:
+                record["peak_alloc_bytes"] = peak_alloc[(name, label_key)]
+            stages.append(record)
+        stages.sort(key=lambda r: r["total_seconds"], reverse=True)
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "elapsed_seconds": round(time.perf_counter() - self._started, 3),
+            "pid": os.getpid(),
+            "stages": stages,
+            "counters": [{"name": name, "labels": dict(label_key), "value": value}
+                         for (name, label_key), value in counters],
+        }
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            peak_alloc = sorted(self._peak_alloc.items())
+        lines = [
+            f"# HELP {PREFIX}_run_start_time_seconds Unix time the run started.",
+            f"# TYPE {PREFIX}_run_start_time_seconds gauge",
+            f"{PREFIX}_run_start_time_seconds {self.started_at.timestamp():.3f}",
+        ]
+        if histograms:
+            metric = f"{PREFIX}_stage_seconds"
+            lines += [f"# HELP {metric} Time spent per call of each pipeline stage.",
+                      f"# TYPE {metric} histogram"]
+            for (name, label_key), histogram in histograms:
+                key = (("stage", name),) + label_key
+                cumulative = 0
+                for upper, count in zip(self.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_format_labels(key, [('le', f'{upper:g}')])} {cumulative}")
+                lines.append(f"{metric}_bucket{_format_labels(key, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{metric}_sum{_format_labels(key)} {histogram.total:.6f}")
+                lines.append(f"{metric}_count{_format_labels(key)} {histogram.count}")
+        if peak_alloc:
+            metric = f"{PREFIX}_stage_peak_alloc_bytes"
+            lines += [f"# HELP {metric} Peak traced allocation during a stage call (tracemalloc).",
+                      f"# TYPE {metric} gauge"]
+            for (name, label_key), value in peak_alloc:
+                lines.append(f"{metric}{_format_labels((('stage', name),) + label_key)} {value}")
+        typed = set()
+        for (name, label_key), value in counters:
+            metric = f"{PREFIX}_{name}_total"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(label_key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path):
+        """Writes report() as JSON and returns it."""
+        report = self.report()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        logging.info(f"Metrics report written to {path}")
+        return report
+
+    def write_prometheus(self, path):
+        """
+        Writes prometheus_text() to `path` atomically, e.g. into the directory
+        read by node_exporter's textfile collector.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def write_profiles(self, profile_dir=None):
+        """Dumps each profiled stage's accumulated cProfile stats; returns the paths written."""
+        profile_dir = profile_dir or self.profile_dir
+        with self._lock:
+            profiles = list(self._profiles.items())
+        paths = []
+        for (name, label_key), profiler in profiles:
+            os.makedirs(profile_dir, exist_ok=True)
+            suffix = "".join(f"-{value}" for _, value in label_key).replace(os.sep, "_")
+            path = os.path.join(profile_dir, f"{name}{suffix}.prof")
+            profiler.dump_stats(path)
+            paths.append(path)
+        if paths:
+            logging.info(f"Wrote {len(paths)} stage profiles to {profile_dir}")
+        return paths
+
+    def serve(self, port=9464, host="127.0.0.1"):
+        """
+        Serves /metrics (Prometheus text) and /report (JSON) from a daemon
+        thread for the life of the process; returns the server.
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] == "/metrics":
+                    body, content_type = registry.prometheus_text(), "text/plain; version=0.0.4"
+                elif self.path.split("?")[0] == "/report":
+                    body, content_type = json.dumps(registry.report()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass # Keep scrapes out of the pipeline log
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+        logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return server
+
+# The process-wide registry the pipeline modules record into
+METRICS = MetricsRegistry()
+stage = METRICS.stage
+timed = METRICS.timed
+inc = METRICS.inc
+observe = METRICS.observe
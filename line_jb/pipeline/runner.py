@@ -0,0 +1,274 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+from line_jb.data_ingestion.fetch_nyc_open_data import iter_nyc_pages
+from line_jb.data_ingestion.insert_manager import iter_chunks
+from line_jb.data_ingestion.sync_state import get_watermark_column
+from line_jb.instrumentation import metrics
+
+logging.basicConfig(level=logging.INFO)
+
+__all__ = ["DatasetSource", "Task", "PipelineRunner", "socrata_source"]
+
+_DONE = object()
+
+@dataclass(frozen=True)
+class DatasetSource:
+    """
+    A dataset the pipeline syncs. fetch(since) yields pages (lists of raw
+    records) for the DATASET_SPECS table `name`; `since` is the stored
+    watermark for incremental sources and None otherwise.
+    """
+    name: str
+    fetch: Callable
+    incremental: bool = True
+
+def socrata_source(dataset_key, **fetch_options):
+    """DatasetSource paging an NYC Open Data dataset; fetch_options go to iter_nyc_pages."""
+    return DatasetSource(dataset_key, lambda since: iter_nyc_pages(dataset_key, since=since, **fetch_options))
+
+@dataclass(frozen=True)
+class Task:
+    """
+    Work that runs once all of its `inputs` (dataset or task names) have
+    finished. Tasks that write to the database run on the writer thread,
+    between chunk commits; the others run on a small thread pool. A writing
+    task with a `prepare` callable runs prepare() on the pool first and
+    then func(prepared) on the writer, so heavy compute never holds the
+    writer.
+    """
+    name: str
+    func: Callable
+    inputs: tuple = ()
+    writes: bool = False
+    prepare: Callable = None
+
+class PipelineRunner:
+    """
+    Syncs datasets and runs the work that depends on them as overlapping
+    stages connected by bounded queues:
+
+        fetch (thread per dataset) -> transform (thread per dataset)
+            -> write (one thread, one connection, every dataset)
+
+    so page N+1 of a dataset downloads while page N is mapped and page N-1
+    commits, and datasets proceed side by side. The writer commits each page
+    with its batch hooks and watermark (InsertManager.write_chunk), so
+    SQLite sees a single writer. A Task starts as soon as its inputs finish
+    rather than after the whole sync. A dataset or task that fails is
+    logged and counts as finished, so its dependents still run on whatever
+    was stored, as the sequential sync did.
+
+    Queue sizes bound memory: at most page_queue_size pages per dataset
+    wait to be mapped and write_queue_size mapped pages wait to be written.
+    """
+    def __init__(self, inserter, page_queue_size=2, write_queue_size=8, task_workers=2):
+        self.inserter = inserter
+        self.page_queue_size = page_queue_size
+        self.write_queue = queue.Queue(maxsize=write_queue_size)
+        self.task_workers = task_workers
+        self.sources = {}
+        self.tasks = {}
+        self.results = {}
+        self._finished = queue.Queue() # Names of finished datasets/tasks, for the scheduler
+        self._lock = threading.Lock()
+
+    def add_dataset(self, source):
+        self._check_name(source.name)
+        self.sources[source.name] = source
+
+    def add_task(self, name, func, inputs=(), writes=False, prepare=None):
+        self._check_name(name)
+        self.tasks[name] = Task(name, func, tuple(inputs), writes or prepare is not None, prepare)
+
+    def _check_name(self, name):
+        if name in self.sources or name in self.tasks:
+            raise ValueError(f"Pipeline already has a dataset or task named {name!r}")
+
+    def _check_graph(self):
+        """Rejects unknown inputs and dependency cycles, which would otherwise stall the run."""
+        known = set(self.sources) | set(self.tasks)
+        for task in self.tasks.values():
+            unknown = [name for name in task.inputs if name not in known]
+            if unknown:
+                raise ValueError(f"Task {task.name!r} depends on unknown {unknown}")
+        done, remaining = set(self.sources), dict(self.tasks)
+        while remaining:
+            ready = [name for name, task in remaining.items() if set(task.inputs) <= done]
+            if not ready:
+                raise ValueError(f"Dependency cycle among tasks {sorted(remaining)}")
+            for name in ready:
+                done.add(name)
+                del remaining[name]
+
+    def _fail(self, name, error):
+        with self._lock:
+            record = self.results[name]
+            if record["status"] == "ok":
+                record.update(status="failed", error=str(error))
+        logging.error(f"[{name}] Pipeline stage failed: {error}")
+
+    # ==========================
+    # DATASET STAGES
+    # ==========================
+    def _fetch(self, source, pages, stop):
+        """Pulls pages from the source into its page queue (blocking when the transform falls behind)."""
+        try:
+            since = self.inserter.get_watermark(source.name) if source.incremental else None
+            if since is not None:
+                logging.info(f"[{source.name}] Syncing from watermark {since}")
+            for page in source.fetch(since):
+                if stop.is_set():
+                    break
+                pages.put(page)
+        except Exception as e:
+            self._fail(source.name, e)
+        finally:
+            pages.put(_DONE)
+
+    def _transform(self, source, pages, stop, mapper):
+        """Maps raw pages to value tuples in order, in chunks of at most the inserter's chunk_size."""
+        while True:
+            page = pages.get()
+            if page is _DONE:
+                break
+            if stop.is_set():
+                continue # Keep draining so the fetcher is never left blocked
+            try:
+                for rows in iter_chunks(page, self.inserter.chunk_size):
+                    with metrics.stage("insert_map", dataset=source.name):
+                        values = mapper(rows)
+                    self.write_queue.put(("batch", source.name, rows, values))
+            except Exception as e:
+                self._fail(source.name, e)
+                stop.set()
+        self.write_queue.put(("done", source.name))
+
+    def _write(self, statements, stops):
+        """The single writer: commits mapped pages and runs writing tasks, in arrival order."""
+        try:
+            conn = self.inserter.open_writer(self.sources)
+        except Exception as e:
+            conn = None # Nothing can be written; drain the queue so the run still finishes
+            for name in self.sources:
+                self._fail(name, e)
+                stops[name].set()
+        while True:
+            item = self.write_queue.get()
+            kind = item[0]
+            if kind == "stop":
+                break
+            if kind == "task":
+                self._run_task(*item[1:])
+                continue
+            name = item[1]
+            record = self.results[name]
+            if kind == "done":
+                record["seconds"] = round(time.perf_counter() - self._started, 3)
+                logging.info(f"[{name}] Synced: {record['attempted']} rows attempted, "
+                             f"{record['inserted']} inserted or updated ({record['status']}).")
+                self._finished.put(name)
+            elif not stops[name].is_set(): # kind == "batch"; pages after a failed map/write are dropped
+                _, _, rows, values = item
+                insert_sql, watermark_column = statements[name]
+                write_start = time.perf_counter()
+                try:
+                    written, record["watermark"] = self.inserter.write_chunk(
+                        conn, name, insert_sql, values, rows, watermark_column, record["watermark"]
+                    )
+                except Exception as e:
+                    # Later pages would move the watermark past the rows lost here
+                    self._fail(name, e)
+                    stops[name].set()
+                    continue
+                record["attempted"] += len(rows)
+                record["inserted"] += written
+                record["write_seconds"] += time.perf_counter() - write_start
+        if conn is not None:
+            conn.close()
+
+    # ==========================
+    # TASKS
+    # ==========================
+    def _run_task(self, task, args=(), start=None):
+        start = start or time.perf_counter()
+        try:
+            with metrics.stage("pipeline_task", task=task.name):
+                task.func(*args)
+        except Exception as e:
+            self._fail(task.name, e)
+        self.results[task.name]["seconds"] = round(time.perf_counter() - start, 3)
+        self._finished.put(task.name)
+
+    def _prepare_task(self, task):
+        """Runs a task's prepare() on the pool and queues its write for the writer thread."""
+        start = time.perf_counter()
+        try:
+            with metrics.stage("pipeline_task_prepare", task=task.name):
+                prepared = task.prepare()
+        except Exception as e:
+            self._fail(task.name, e)
+            self.results[task.name]["seconds"] = round(time.perf_counter() - start, 3)
+            self._finished.put(task.name)
+            return
+        self.write_queue.put(("task", task, (prepared,), start))
+
+    def run(self):
+        """
+        Runs every dataset and task to completion; returns a dict of per-name
+        results (status, error, seconds, and row counts for datasets).
+        """
+        self._check_graph()
+        self._started = time.perf_counter()
+        for name in self.sources:
+            self.results[name] = {"kind": "dataset", "status": "ok", "error": None, "attempted": 0,
+                                  "inserted": 0, "watermark": None, "write_seconds": 0.0, "seconds": None}
+        for name in self.tasks:
+            self.results[name] = {"kind": "task", "status": "ok", "error": None, "seconds": None}
+
+        statements, stops, threads = {}, {}, []
+        for name, source in self.sources.items():
+            insert_sql, mapper = self.inserter.dataset_insert(name)
+            statements[name] = (insert_sql, get_watermark_column(name)[0])
+            stops[name] = threading.Event()
+            pages = queue.Queue(maxsize=self.page_queue_size)
+            threads.append(threading.Thread(target=self._fetch, args=(source, pages, stops[name]),
+                                            name=f"fetch-{name}", daemon=True))
+            threads.append(threading.Thread(target=self._transform, args=(source, pages, stops[name], mapper),
+                                            name=f"transform-{name}", daemon=True))
+        writer = threading.Thread(target=self._write, args=(statements, stops), name="pipeline-writer", daemon=True)
+        writer.start()
+        for thread in threads:
+            thread.start()
+
+        finished, pending = set(), dict(self.tasks)
+        unfinished = set(self.sources) | set(self.tasks)
+        with ThreadPoolExecutor(max_workers=self.task_workers, thread_name_prefix="pipeline-task") as pool:
+            while True:
+                for task in [t for t in pending.values() if set(t.inputs) <= finished]:
+                    del pending[task.name]
+                    if task.prepare is not None:
+                        pool.submit(self._prepare_task, task)
+                    elif task.writes:
+                        self.write_queue.put(("task", task))
+                    else:
+                        pool.submit(self._run_task, task)
+                if not unfinished:
+                    break
+                name = self._finished.get()
+                finished.add(name)
+                unfinished.discard(name)
+
+        self.write_queue.put(("stop",))
+        writer.join()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - self._started
+        failed = [name for name, record in self.results.items() if record["status"] != "ok"]
+        logging.info(f"Pipeline finished in {elapsed:.1f}s "
+                     f"({len(self.sources)} datasets, {len(self.tasks)} tasks, failed: {failed or 'none'}).")
+        return self.results
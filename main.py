@@ -1,11 +1,22 @@
 import os
 import logging
+from functools import partial
 # import streamlit as st
 # from line_jb.data_ingestion.search import fetch_posts_by_hashtag
 import folium # Import folium for LayerControl
 from line_jb.data_ingestion.insert_manager import InsertManager
-from line_jb.data_ingestion.fetch_nyc_open_data import fetch_nyc_data
+from line_jb.data_ingestion.instagram_client import InstagramAccount, USERNAME as IG_USERNAME
+from line_jb.data_ingestion.social_ingest import SocialIngestWorker
 from line_jb.geospatial.geo_processor import GeoProcessor
+from line_jb.geospatial.parquet_cache import ParquetCache, CACHED_TABLES
+from line_jb.geospatial.park_index import ParkIndex, PARK_EVENT_TABLES
+from line_jb.geospatial.geocoder import Geocoder, GEOCODED_TABLES, ADDRESS_SOURCES
+from line_jb.geospatial.street_scoring import NuisanceScorer
+from line_jb.geospatial.proximity import ProximityIndex, ITEM_SOURCES, EVENT_TABLES as PROXIMITY_EVENT_TABLES
+from line_jb.analytics.streaming import TrendMonitor, STREAM_KEYS
+from line_jb.analytics.rollups import ComplaintRollups
+from line_jb.instrumentation.metrics import METRICS
+from line_jb.pipeline.runner import PipelineRunner, DatasetSource, socrata_source
 from line_jb.geospatial.map_renderer import MapRenderer   
 from line_jb.geospatial.osm_utils import OSMUtils         
 
@@ -20,67 +31,174 @@ REQUIRED_TABLES = [
     "nyc_permitted_events_historical"
 ]
 
-def get_insert_method_name(table_name: str) -> str:
+# Bookkeeping and index tables that are not fetched from NYC Open Data
+SUPPORT_TABLES = [
+    "sync_state",
+    "nyc_311_requests_rtree",
+    "linknyc_status_rtree",
+    "nyc_tree_points_rtree",
+    "parks",
+    "park_event_counts",
+    "geocode_cache",
+    "edge_nuisance",
+    "event_nearby",
+    "event_nearby_events",
+    "event_nearby_dirty_items",
+    "nyc_311_hourly",
+    "nyc_311_daily_cells",
+    "trend_events",
+    "social_posts"
+]
+
+# Run metrics: a JSON report per run plus a Prometheus textfile, and optionally
+# a live /metrics endpoint, cProfile for some stages and tracemalloc peaks
+METRICS_DIR = os.environ.get("LINE_JB_METRICS_DIR", "cache/metrics")
+METRICS_PORT = os.environ.get("LINE_JB_METRICS_PORT")
+PROFILE_STAGES = os.environ.get("LINE_JB_PROFILE_STAGES", "") # e.g. "insert_execute,geo_load" or "all"
+TRACE_MEMORY = os.environ.get("LINE_JB_TRACE_MEMORY") == "1"
+
+# When set (e.g. "dbname=line_jb user=postgres"), datasets are synced into
+# PostGIS instead of db/local.db; see sync_postgres
+POSTGRES_DSN = os.environ.get("LINE_JB_POSTGRES_DSN")
+
+# Hashtags whose recent Instagram posts are ingested when IG credentials are configured
+SOCIAL_HASHTAGS = ["nyc", "newyorkcity", "manhattan", "brooklyn", "queens", "bronx", "statenisland", "nycparks"]
+
+def build_dataset_registry(inserter, max_batch, page_workers, pagination):
     """
-    Derives the insert method name from the table name.
-    Strips 'nyc_' prefix if present, and prepends 'insert_'.
+    Every dataset the pipeline syncs, keyed by table: where its pages come
+    from. Rows are written to the DATASET_SPECS table of the same name.
     """
-    if table_name.startswith("nyc_"):
-        base = table_name[len("nyc_"):]
-    else:
-        base = table_name
-    return f"insert_{base}"
+    registry = {
+        table_name: socrata_source(table_name, batch_size=max_batch, workers=page_workers, pagination=pagination)
+        for table_name in REQUIRED_TABLES
+    }
+    # Social posts reuse one logged-in session for every hashtag
+    if IG_USERNAME:
+        social_worker = SocialIngestWorker(inserter, [InstagramAccount()])
+        registry["social_posts"] = DatasetSource(
+            "social_posts", lambda since: social_worker.iter_pages(SOCIAL_HASHTAGS), incremental=False
+        )
+    return registry
+
+def write_run_metrics():
+    """Writes this run's metrics report, Prometheus textfile and any stage profiles."""
+    run_id = METRICS.started_at.strftime("%Y%m%d-%H%M%S")
+    METRICS.write_report(os.path.join(METRICS_DIR, f"run-{run_id}.json"))
+    METRICS.write_prometheus(os.path.join(METRICS_DIR, "line_jb.prom"))
+    METRICS.write_profiles(os.path.join(METRICS_DIR, f"profiles-{run_id}"))
+
+# Bounding box of the five boroughs (min_lon, min_lat, max_lon, max_lat), for PostGIS map layers
+NYC_BBOX = (-74.26, 40.49, -73.69, 40.92)
+
+def sync_postgres(dsn, max_batch, page_workers, pagination):
+    """
+    Syncs every dataset into PostGIS through the same pipeline (COPY into
+    staging, merged with ON CONFLICT), then builds the map from queries
+    pushed down to the database: complaints per park are counted by a
+    PostGIS join and point layers are read through the GiST bbox index.
+    Derived state kept by SQLite batch hooks (geocoding, park assignment,
+    rollups, trends, street scores) is not built there.
+    """
+    # psycopg2 is only needed for this backend
+    from line_jb.data_ingestion.postgres_manager import PostgresInsertManager
+    from line_jb.geospatial.postgis_processor import PostGISProcessor
+
+    PostgresInsertManager.initialize_database(dsn)
+    inserter = PostgresInsertManager(dsn)
+    geo_processor = PostGISProcessor(dsn)
+    map_renderer = MapRenderer()
+    osm_utils = OSMUtils()
+    runner = PipelineRunner(inserter)
+    for source in build_dataset_registry(inserter, max_batch, page_workers, pagination).values():
+        runner.add_dataset(source)
+
+    layers = {}
+    def load_parks():
+        layers["park_polygons"] = osm_utils.get_osm_features(
+            query="New York City, New York, USA",
+            tags={"leisure": "park", "landuse": "park", "boundary": "national_park"},
+            gdf_type='polygons'
+        )
+
+    def count_park_complaints():
+        if layers["park_polygons"].empty:
+            logging.warning("Skipping park complaints layer: no OSM park polygons were loaded.")
+            return
+        layers["parks"] = geo_processor.calculate_event_density_in_db(layers["park_polygons"], "nyc_311_requests")
+
+    def load_layer(key, table_name, columns):
+        layers[key] = geo_processor.query_bbox(table_name, *NYC_BBOX, columns=columns)
+
+    runner.add_task("park_polygons", load_parks)
+    runner.add_task("load:parks", count_park_complaints, inputs=["park_polygons", "nyc_311_requests"])
+    runner.add_task("load:nyc_311_requests", partial(
+        load_layer, "311", "nyc_311_requests", ['complaint_type', 'status', 'created_date', 'borough']
+    ), inputs=["nyc_311_requests"])
+    runner.add_task("load:linknyc_status", partial(
+        load_layer, "linknyc", "linknyc_status", ['status', 'kiosk_type', 'address', 'wifi_status']
+    ), inputs=["linknyc_status"])
+
+    def render_map():
+        if "parks" in layers:
+            map_renderer.add_geodataframe_layer(
+                layers["parks"],
+                name="NYC Parks (311 Complaints Inside)",
+                style_function=lambda feature: {'fillColor': '#32CD32', 'color': '#008000', 'weight': 1,
+                                                'fillOpacity': 0.4},
+                popup_fields=['name', 'event_count']
+            )
+        if "311" in layers:
+            map_renderer.add_geodataframe_layer(layers["311"], name="311 Service Requests", color='red',
+                                                popup_fields=['complaint_type', 'status', 'created_date', 'borough'])
+        if "linknyc" in layers:
+            map_renderer.add_geodataframe_layer(layers["linknyc"], name="LinkNYC Kiosks", color='purple',
+                                                popup_fields=['status', 'kiosk_type', 'address', 'wifi_status'])
+        folium.LayerControl().add_to(map_renderer.get_map_object())
+        map_renderer.save_map("nyc_data_map.html")
+        logging.info("Map generation complete. Open nyc_data_map.html in your browser.")
+
+    runner.add_task("render_map", render_map, inputs=[name for name in runner.tasks if name.startswith("load:")])
+    return runner.run()
 
 def main():
+    METRICS.configure(profile_stages=PROFILE_STAGES, trace_memory=TRACE_MEMORY)
+    if METRICS_PORT:
+        METRICS.serve(int(METRICS_PORT))
+
     max_batch = 1000
+    # Keyset pagination keeps deep pages cheap and stable under upstream writes, but each
+    # page needs the previous page's last key, so a dataset is fetched one page at a time
+    # (datasets still download side by side). "offset" pagination instead fetches
+    # page_workers pages of a dataset in parallel.
+    pagination = "keyset"
+    page_workers = 4 if pagination == "offset" else 1
+    if POSTGRES_DSN:
+        sync_postgres(POSTGRES_DSN, max_batch, page_workers, pagination)
+        return
     db_path = "db/local.db"
     schema_path = "db/schema.sql"
     
     inserter = InsertManager(db_path)
-    geo_processor = GeoProcessor(db_path) # Initialize GeoProcessor
+    parquet_cache = ParquetCache(db_path, cache_dir="cache/parquet")
+    geo_processor = GeoProcessor(db_path, parquet_cache=parquet_cache) # Initialize GeoProcessor
     map_renderer = MapRenderer()         # Initialize MapRenderer
     osm_utils = OSMUtils()               # Initialize OSMUtils
+    park_index = ParkIndex(db_path)      # Assigns events to parks as they are ingested
+    geocoder = Geocoder(db_path)         # Places location-only events using local reference data
 
-    # Check if all tables exist
-    missing_tables = [t for t in REQUIRED_TABLES if not inserter.table_exists(t)]
-    if missing_tables:
-        logging.info(f"Missing tables detected: {missing_tables}. Initializing schema...")
+    # Initialize (or migrate) the schema when a table is missing or the database
+    # was built by an older db/schema.sql; the schema script is idempotent.
+    missing_tables = [t for t in REQUIRED_TABLES + SUPPORT_TABLES if not inserter.table_exists(t)]
+    db_version = InsertManager.schema_version(db_path)
+    if missing_tables or db_version < InsertManager.SCHEMA_VERSION:
+        logging.info(f"Missing tables {missing_tables or 'none'}, schema version {db_version} "
+                     f"(current {InsertManager.SCHEMA_VERSION}). Initializing schema...")
         InsertManager.initialize_database(db_path, schema_path)
     else:
         logging.info("All required tables found. Skipping schema initialization.")
 
-    # Fetch and insert data for each dataset
-    for table_name in REQUIRED_TABLES:
-        dataset_key = table_name
-        insert_method_name = get_insert_method_name(table_name)
-
-        try:
-            logging.info(f"Fetching dataset: {dataset_key}")
-            data = fetch_nyc_data(dataset_key, batch_size=max_batch)
-            logging.info(f"Looking for method '{insert_method_name}' in InsertManager instance.")
-            logging.info(f"Available insert methods: {[m for m in dir(inserter) if m.startswith('insert_')]}")
-            logging.info(f"table_name repr: {repr(table_name)}")
-            insert_func = getattr(inserter, insert_method_name)
-            insert_func(data)
-
-        except AttributeError:
-            logging.error(f"Insert method '{insert_method_name}' not found. Check insert_manager.py for missing or misspelled methods.")
-        except Exception as e:
-            logging.error(f"Failed to process {dataset_key}: {e}")
-
-    # --- Geospatial Processing and Mapping ---
-    logging.info("Starting geospatial processing and map rendering.")
-
-    # 1. Load data with explicit Latitude/Longitude into GeoDataFrames
-    # These are the datasets confirmed to have lat/lon directly:
-    _311_requests_gdf = geo_processor.load_data_as_geodataframe("nyc_311_requests", lat_col='latitude', lon_col='longitude')
-    linknyc_status_gdf = geo_processor.load_data_as_geodataframe("linknyc_status", lat_col='latitude', lon_col='longitude')
-
-    # nyc_parks_events, nyc_sidewalk_status, nyc_tree_points, nyc_permitted_events_historical, nyc_permitted_events_future  are ingested,
-    # but not loaded as GeoDataFrames here as they don't have direct lat/lon for point plotting.
-    # You would need alternative methods for these, e.g., parsing geometry fields or joining with other geo data.
-
-    # 2. Fetch OSM data for relevant areas (e.g., NYC parks for prioritization)
+    # Fetch OSM park polygons up front so events can be assigned to parks while they are inserted.
     # Using a place name for a general query to get park polygons.
     # You might need to refine this query to get accurate park boundaries for NYC.
     nyc_parks_osm_gdf = osm_utils.get_osm_features(
@@ -88,63 +206,206 @@ def main():
         tags={"leisure": "park", "landuse": "park", "boundary": "national_park"}, # Common tags for parks
         gdf_type='polygons'
     )
+    if not nyc_parks_osm_gdf.empty:
+        park_index.load_parks(nyc_parks_osm_gdf)
 
-    # 3. Calculate historical event density for prioritization
-    # This now explicitly uses the 'permitted_events_historical_gdf' as the source of event points.
-    if not nyc_parks_osm_gdf.empty and not permitted_events_historical_gdf.empty:
-        parks_with_event_counts = geo_processor.calculate_historical_event_density(
-            parks_gdf=nyc_parks_osm_gdf.copy(), # Pass a copy to avoid modifying original
-            events_gdf=permitted_events_historical_gdf
-        )
-        
-        # Define a style function for parks based on event count
-        def park_priority_style(feature):
-            event_count = feature['properties'].get('event_count', 0)
-            if event_count >= 10: # Example threshold for "stand out"
-                return {'fillColor': '#006400', 'color': '#003300', 'weight': 2, 'fillOpacity': 0.8} # Darker green
-            elif event_count >= 3:
-                return {'fillColor': '#32CD32', 'color': '#008000', 'weight': 1.5, 'fillOpacity': 0.6} # Medium green
-            else:
-                return {'fillColor': '#90EE90', 'color': '#6B8E23', 'weight': 1, 'fillOpacity': 0.4} # Lighter green
-        
-        # Add the prioritized parks layer
-        map_renderer.add_geodataframe_layer(
-            parks_with_event_counts,
-            name="NYC Parks (Prioritized by Historical Events)",
-            style_function=park_priority_style,
-            popup_fields=['name', 'event_count'] # Assuming 'name' exists in OSM park data
+    # Events are geocoded as they are inserted (hooks run in registration order),
+    # so the park hook sees their new coordinates in the same transaction.
+    geocoder.load_reference()
+    for table_name in GEOCODED_TABLES:
+        inserter.add_batch_hook(table_name, geocoder.batch_hook)
+    if park_index.tree is not None:
+        for table_name in PARK_EVENT_TABLES:
+            inserter.add_batch_hook(table_name, park_index.batch_hook)
+    # Spikes in new complaints are flagged as they stream in (state carries over between runs)
+    trend_monitor = TrendMonitor(db_path, state_path="cache/trends/detectors.pkl")
+    inserter.add_batch_hook("nyc_311_requests", trend_monitor.batch_hook)
+    inserter.add_batch_hook("social_posts", trend_monitor.batch_hook)
+    # New complaints are folded into the hourly/daily rollups once per inserted chunk
+    rollups = ComplaintRollups(db_path)
+    inserter.add_batch_hook("nyc_311_requests", rollups.batch_hook)
+
+    # Every dataset is fetched, mapped and written as overlapping pipeline stages with a
+    # single SQLite writer; the fetch module caps in-flight requests to the Socrata domain.
+    runner = PipelineRunner(inserter)
+    for source in build_dataset_registry(inserter, max_batch, page_workers, pagination).values():
+        runner.add_dataset(source)
+
+    # Derived state and map inputs start as soon as the datasets they read are synced.
+    # Tasks that write run on the writer thread, between chunk commits.
+    layers = {}
+
+    # The address reference grew during the sync; retry locations that did not match before.
+    # Reloading it on the writer thread keeps it from changing under the geocoding hook.
+    runner.add_task("geocoder_reference", geocoder.load_reference, inputs=list(ADDRESS_SOURCES), writes=True)
+    for table_name in GEOCODED_TABLES:
+        runner.add_task(f"geocode:{table_name}", partial(geocoder.geocode_pending, table_name),
+                        inputs=[table_name, "geocoder_reference"], writes=True)
+
+    # Catch up on events left unassigned (e.g. newly geocoded, or after the park polygons changed)
+    if park_index.tree is not None:
+        for table_name in PARK_EVENT_TABLES:
+            geocoded = [f"geocode:{table_name}"] if table_name in GEOCODED_TABLES else []
+            runner.add_task(f"parks:{table_name}", partial(park_index.assign_pending, table_name),
+                            inputs=[table_name] + geocoded, writes=True)
+
+    # Refresh "what's near this event" for events that moved and complaints/outages that arrived
+    event_inputs = [f"geocode:{t}" if t in GEOCODED_TABLES else t for t in PROXIMITY_EVENT_TABLES]
+    runner.add_task("proximity_refresh", ProximityIndex(db_path).refresh,
+                    inputs=event_inputs + list(ITEM_SOURCES), writes=True)
+
+    # Fold in any complaints the batch hook missed (e.g. rollups added to an existing database)
+    runner.add_task("rollups_update", rollups.update, inputs=["nyc_311_requests"], writes=True)
+    runner.add_task("trend_state", trend_monitor.save, inputs=[n for n in runner.sources if n in STREAM_KEYS])
+
+    # Rebuild the columnar copy of each cached table once its sync is done
+    for table_name in CACHED_TABLES:
+        runner.add_task(f"parquet:{table_name}", partial(parquet_cache.refresh, [table_name]), inputs=[table_name])
+
+    # --- Geospatial Processing and Mapping ---
+    # 1. Load data with explicit Latitude/Longitude into GeoDataFrames
+    # Only the columns each map layer shows are read.
+    def load_layer(key, table_name, columns):
+        layers[key] = geo_processor.load_data_as_geodataframe(
+            table_name, lat_col='latitude', lon_col='longitude', columns=columns
         )
+
+    # Read from the Parquet copy once it is rebuilt
+    runner.add_task("load:nyc_311_requests", partial(
+        load_layer, "311", "nyc_311_requests", ['complaint_type', 'status', 'created_date', 'borough']
+    ), inputs=["parquet:nyc_311_requests"])
+    runner.add_task("load:linknyc_status", partial(
+        load_layer, "linknyc", "linknyc_status", ['status', 'kiosk_type', 'address', 'wifi_status']
+    ), inputs=["parquet:linknyc_status"])
+    # Permitted events carry coordinates resolved by the geocoding stage (unmatched locations are skipped)
+    runner.add_task("load:nyc_permitted_events_future", partial(
+        load_layer, "future_events", "nyc_permitted_events_future",
+        ['event_name', 'start_date_time', 'event_type', 'event_borough']
+    ), inputs=["geocode:nyc_permitted_events_future"])
+
+    # Street trees use the coordinates decoded at ingest; at city scale the renderer aggregates them
+    def load_trees():
+        layers["trees"] = geo_processor.load_tree_points(columns=['genusspecies', 'tpcondition', 'dbh'])
+    runner.add_task("load:nyc_tree_points", load_trees, inputs=["nyc_tree_points"])
+
+    # nyc_sidewalk_status has only street addresses; it feeds the streets-to-avoid scores below
+    # through the geocoder rather than a point layer.
+
+    # 2. Historical event density for prioritization
+    # Events were assigned to parks at ingest time, so this reads the maintained per-park counts
+    # instead of re-joining every historical event against every park polygon.
+    if park_index.tree is not None:
+        def load_park_counts():
+            layers["parks"] = park_index.parks_with_counts(["nyc_permitted_events_historical"])
+        runner.add_task("load:parks", load_park_counts, inputs=["parks:nyc_permitted_events_historical"])
     else:
-        logging.warning("Skipping park prioritization layer: OSM parks or historical events data is empty.")
-
-    # 4. Add other layers to the map
-    map_renderer.add_geodataframe_layer(
-        _311_requests_gdf,
-        name="311 Service Requests",
-        color='red',
-        popup_fields=['complaint_type', 'status', 'created_date', 'borough']
-    )
-    map_renderer.add_geodataframe_layer(
-        linknyc_status_gdf,
-        name="LinkNYC Kiosks",
-        color='purple',
-        marker_type='circle_marker', # Specify circle marker for points
-        popup_fields=['status', 'kiosk_type', 'address', 'wifi_status']
-    )
-    map_renderer.add_geodataframe_layer(
-        permitted_events_future_gdf,
-        name="Future Permitted Events",
-        color='orange', # Changed color for distinction
-        marker_type='circle_marker', # Specify circle marker for points
-        popup_fields=['event_name', 'start_date_time', 'event_type', 'event_borough']
-    )
-    
-    # Add a layer control so users can toggle layers on/off
-    folium.LayerControl().add_to(map_renderer.get_map_object())
+        logging.warning("Skipping park prioritization layer: no OSM park polygons were loaded.")
+
+    # 3. Streets to avoid: 311 complaints and sidewalk violations snapped to the walking network.
+    # Only complaints added since the last run are folded into the stored edge scores.
+    # The network download overlaps the sync.
+    def load_street_network():
+        layers["street_graph"] = osm_utils.get_street_network(place_name="Manhattan, New York, USA",
+                                                              network_type="walk")
+
+    # Snapping new complaints runs on the task pool; only the score upsert takes the writer.
+    def prepare_streets_to_avoid():
+        if layers.get("street_graph") is None:
+            logging.warning("Skipping streets-to-avoid layer: street network could not be fetched.")
+            return None
+        nuisance_scorer = NuisanceScorer(db_path, layers["street_graph"], geocoder=geocoder)
+        return nuisance_scorer, nuisance_scorer.prepare_update()
+
+    def write_streets_to_avoid(prepared):
+        if prepared is not None:
+            nuisance_scorer, pending = prepared
+            nuisance_scorer.apply_update(pending)
+            layers["nuisance_scorer"] = nuisance_scorer
+
+    def load_streets_to_avoid():
+        if layers.get("nuisance_scorer") is not None:
+            layers["streets"] = layers["nuisance_scorer"].streets_to_avoid(top_n=500)
+
+    runner.add_task("street_network", load_street_network)
+    runner.add_task("nuisance_update", write_streets_to_avoid, prepare=prepare_streets_to_avoid,
+                    inputs=["street_network", "nyc_311_requests", "nyc_sidewalk_status", "geocoder_reference"])
+    runner.add_task("load:streets", load_streets_to_avoid, inputs=["nuisance_update"])
+
+    # 4. Render once every layer is ready; layers are added in a fixed order
+    def render_map():
+        parks_with_event_counts = layers.get("parks")
+        if parks_with_event_counts is not None:
+            # Define a style function for parks based on event count
+            def park_priority_style(feature):
+                event_count = feature['properties'].get('event_count', 0)
+                if event_count >= 10: # Example threshold for "stand out"
+                    return {'fillColor': '#006400', 'color': '#003300', 'weight': 2, 'fillOpacity': 0.8} # Darker green
+                elif event_count >= 3:
+                    return {'fillColor': '#32CD32', 'color': '#008000', 'weight': 1.5, 'fillOpacity': 0.6} # Medium green
+                else:
+                    return {'fillColor': '#90EE90', 'color': '#6B8E23', 'weight': 1, 'fillOpacity': 0.4} # Lighter green
+
+            # Add the prioritized parks layer
+            map_renderer.add_geodataframe_layer(
+                parks_with_event_counts,
+                name="NYC Parks (Prioritized by Historical Events)",
+                style_function=park_priority_style,
+                popup_fields=['name', 'event_count'] # Assuming 'name' exists in OSM park data
+            )
+
+        streets_to_avoid_gdf = layers.get("streets")
+        if streets_to_avoid_gdf is not None and not streets_to_avoid_gdf.empty:
+            map_renderer.add_geodataframe_layer(
+                streets_to_avoid_gdf.reset_index(),
+                name="Streets to Avoid (Recent Complaints)",
+                style_function=lambda feature: {'color': '#B22222', 'weight': 4, 'opacity': 0.7},
+                popup_fields=[c for c in ['name', 'complaints', 'nuisance_score'] if c in streets_to_avoid_gdf.columns]
+            )
+
+        # Add other layers to the map (a failed load leaves its layer out)
+        if "311" in layers:
+            map_renderer.add_geodataframe_layer(
+                layers["311"],
+                name="311 Service Requests",
+                color='red',
+                popup_fields=['complaint_type', 'status', 'created_date', 'borough']
+            )
+        if "linknyc" in layers:
+            map_renderer.add_geodataframe_layer(
+                layers["linknyc"],
+                name="LinkNYC Kiosks",
+                color='purple',
+                marker_type='circle_marker', # Specify circle marker for points
+                popup_fields=['status', 'kiosk_type', 'address', 'wifi_status']
+            )
+        if "trees" in layers:
+            map_renderer.add_geodataframe_layer(
+                layers["trees"],
+                name="Street Trees",
+                color='green',
+                marker_type='circle_marker',
+                popup_fields=['genusspecies', 'tpcondition', 'dbh']
+            )
+        if "future_events" in layers:
+            map_renderer.add_geodataframe_layer(
+                layers["future_events"],
+                name="Future Permitted Events",
+                color='orange', # Changed color for distinction
+                marker_type='circle_marker', # Specify circle marker for points
+                popup_fields=['event_name', 'start_date_time', 'event_type', 'event_borough']
+            )
+
+        # Add a layer control so users can toggle layers on/off
+        folium.LayerControl().add_to(map_renderer.get_map_object())
+
+        # 5. Save the map to an HTML file
+        map_renderer.save_map("nyc_data_map.html")
+        logging.info("Map generation complete. Open nyc_data_map.html in your browser.")
+
+    runner.add_task("render_map", render_map,
+                    inputs=[name for name in runner.tasks if name.startswith("load:")] + ["nuisance_update"])
 
-    # 5. Save the map to an HTML file
-    map_renderer.save_map("nyc_data_map.html")
-    logging.info("Map generation complete. Open nyc_data_map.html in your browser.")    
+    runner.run()
 
 if __name__ == "__main__":
 #    st.title("Instagram Hashtag Explorer 🔍")
@@ -155,4 +416,7 @@ if __name__ == "__main__":
 #        for post in posts:
 #            st.image(post.thumbnail_url)  # Show post images
 #            st.write(post.caption or "")
-    main()
+    try:
+        main()
+    finally:
+        write_run_metrics()
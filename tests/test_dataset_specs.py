@@ -0,0 +1,25 @@
+"""Vectorized page conversion in dataset_specs."""
+from line_jb.data_ingestion.dataset_specs import DATASET_SPECS, ColumnSpec, convert_records
+
+def parks_dates(values):
+    columns = [c for c in DATASET_SPECS["nyc_parks_events"] if c.name == "date_and_time"]
+    return [row[0] for row in convert_records(columns, [{"date_and_time": v} for v in values])]
+
+def test_parks_dates_parse_iso_and_us_formats_in_one_page():
+    assert parks_dates([
+        "2023-07-04T10:00:00.000",
+        "07/04/2023 10:00:00 AM",
+        "07/04/2023 03:30:00 PM",
+        "not a date",
+        None,
+    ]) == ["2023-07-04 10:00:00", "2023-07-04 10:00:00", "2023-07-04 15:30:00", None, None]
+
+def test_iso_only_pages_take_the_fast_path():
+    assert parks_dates(["2023-07-04T10:00:00", "2024-01-31T23:59:59.000"]) == [
+        "2023-07-04 10:00:00", "2024-01-31 23:59:59",
+    ]
+
+def test_epoch_columns_fall_back_too():
+    column = ColumnSpec("epoch", "epoch", date_format="ISO8601", source="date")
+    rows = [{"date": "1970-01-02T00:00:00"}, {"date": "01/02/1970 12:00:00 AM"}, {"date": "1970-01-02T00:00:00-01:00"}]
+    assert convert_records([column], rows) == [(86400,), (86400,), (90000,)]
@@ -0,0 +1,86 @@
+"""Keyset pagination in fetch_nyc_open_data, against a stubbed Socrata client."""
+import threading
+import pytest
+from line_jb.data_ingestion import fetch_nyc_open_data as nyc
+from line_jb.data_ingestion.fetch_nyc_open_data import build_keyset_query, iter_nyc_pages
+
+class StubClient:
+    """Stands in for sodapy's Socrata: returns scripted pages and records each request's parameters."""
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.requests = []
+
+    def get(self, dataset_id, **params):
+        self.requests.append(params)
+        return self.pages.pop(0) if self.pages else []
+
+@pytest.fixture
+def stub_client(monkeypatch):
+    def install(pages):
+        client = StubClient(pages)
+        monkeypatch.setitem(nyc._clients, nyc.DOMAIN, client)
+        monkeypatch.setitem(nyc._domain_slots, nyc.DOMAIN, threading.BoundedSemaphore(nyc.DOMAIN_CONCURRENCY))
+        return client
+    return install
+
+def complaints(*pairs):
+    return [{":updated_at": updated_at, "unique_key": key} for updated_at, key in pairs]
+
+# ==========================
+# QUERY BUILDING
+# ==========================
+def test_first_page_orders_by_watermark_then_key():
+    query = build_keyset_query("nyc_311_requests")
+    assert query["order"] == ":updated_at, unique_key"
+    assert query["where"] == "unique_key IS NOT NULL"
+    assert query["select"] == ":*, *"
+
+def test_cursor_continues_within_and_after_the_last_watermark():
+    query = build_keyset_query("nyc_311_requests", since="2026-01-01T00:00:00.000",
+                               cursor=("2026-01-02T00:00:00.000", "O'Brien 7"))
+    assert query["where"] == (
+        "unique_key IS NOT NULL AND :updated_at > '2026-01-01T00:00:00.000' AND "
+        "(:updated_at > '2026-01-02T00:00:00.000' OR "
+        "(:updated_at = '2026-01-02T00:00:00.000' AND unique_key > 'O''Brien 7'))"
+    )
+
+def test_watermark_that_is_also_the_key_pages_on_the_key_alone():
+    query = build_keyset_query("nyc_permitted_events_historical", since="100", cursor=("250", "250"))
+    assert query["order"] == "event_id"
+    assert query["where"] == "event_id IS NOT NULL AND event_id > 100 AND event_id > 250"
+
+def test_numeric_cursor_rejects_non_numbers():
+    with pytest.raises(ValueError):
+        build_keyset_query("nyc_permitted_events_historical", cursor=("1 OR 1=1", "1 OR 1=1"))
+
+# ==========================
+# PAGE ITERATION
+# ==========================
+def test_each_page_starts_after_the_last_row_and_a_short_page_ends_the_crawl(stub_client):
+    client = stub_client([
+        complaints(("2026-01-01", "1"), ("2026-01-02", "5")),
+        complaints(("2026-01-02", "9"), ("2026-01-03", "2")),
+        complaints(("2026-01-04", "3")), # Short: nothing further is requested
+    ])
+    pages = list(iter_nyc_pages("nyc_311_requests", batch_size=2))
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert len(client.requests) == 3
+    assert all(request["limit"] == 2 and "offset" not in request for request in client.requests)
+    assert client.requests[0]["where"] == "unique_key IS NOT NULL"
+    assert "(:updated_at = '2026-01-02' AND unique_key > '5')" in client.requests[1]["where"]
+    assert "(:updated_at = '2026-01-03' AND unique_key > '2')" in client.requests[2]["where"]
+
+def test_full_last_page_costs_one_empty_request(stub_client):
+    client = stub_client([complaints(("2026-01-01", "1"), ("2026-01-01", "2"))])
+    pages = list(iter_nyc_pages("nyc_311_requests", batch_size=2))
+    assert [len(page) for page in pages] == [2]
+    assert len(client.requests) == 2
+
+def test_key_watermark_crawl_uses_the_last_key_as_cursor(stub_client):
+    client = stub_client([
+        [{"event_id": "101"}, {"event_id": "150"}],
+        [{"event_id": "151"}],
+    ])
+    pages = list(iter_nyc_pages("nyc_permitted_events_historical", batch_size=2, since="100", workers=4))
+    assert [len(page) for page in pages] == [2, 1]
+    assert client.requests[1]["where"] == "event_id IS NOT NULL AND event_id > 100 AND event_id > 150"
@@ -0,0 +1,139 @@
+"""
+PostgresInsertManager and PostGISProcessor against a live PostGIS database.
+Skipped unless LINE_JB_POSTGRES_DSN points at one, e.g.
+
+    LINE_JB_POSTGRES_DSN="dbname=line_jb_test user=postgres" python -m pytest tests
+
+Each test runs in a throwaway schema that is dropped afterwards.
+"""
+import os
+import uuid
+import geopandas
+import pytest
+import shapely
+
+DSN = os.environ.get("LINE_JB_POSTGRES_DSN")
+if not DSN:
+    pytest.skip("LINE_JB_POSTGRES_DSN is not set", allow_module_level=True)
+psycopg2 = pytest.importorskip("psycopg2")
+
+from psycopg2.extensions import make_dsn
+from line_jb.data_ingestion.postgres_manager import PostgresInsertManager
+from line_jb.geospatial.postgis_processor import PostGISProcessor
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "db", "schema.sql")
+
+@pytest.fixture
+def dsn():
+    """A DSN whose search_path puts the test's own schema first (PostGIS stays reachable in public)."""
+    schema = f"line_jb_test_{uuid.uuid4().hex[:8]}"
+    admin = psycopg2.connect(DSN)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA {schema};")
+    test_dsn = make_dsn(DSN, options=f"-c search_path={schema},public")
+    PostgresInsertManager.initialize_database(test_dsn, SCHEMA_PATH)
+    yield test_dsn
+    with admin.cursor() as cur:
+        cur.execute(f"DROP SCHEMA {schema} CASCADE;")
+    admin.close()
+
+def query(dsn, sql, params=None):
+    conn = psycopg2.connect(dsn)
+    with conn, conn.cursor() as cur:
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def request(key, complaint="Noise", status="Open", lon=-73.98, lat=40.75):
+    return {"unique_key": key, "complaint_type": complaint, "status": status,
+            "created_date": "2026-01-01T10:00:00", "longitude": lon, "latitude": lat}
+
+# ==========================
+# LOADING
+# ==========================
+def test_merge_keeps_last_row_per_key_and_every_null_key(dsn):
+    manager = PostgresInsertManager(dsn, SCHEMA_PATH)
+    stats = manager.insert_dataset("nyc_311_requests", [
+        request("1", status="Open"),
+        request("2"),
+        request("1", status="Closed"), # Same key later in the chunk wins
+        request(None),
+        request(None),                 # NULL keys never conflict
+    ])
+    assert stats["attempted"] == 5
+    assert query(dsn, "SELECT status FROM nyc_311_requests WHERE unique_key = '1';") == [("Closed",)]
+    assert query(dsn, "SELECT COUNT(*) FROM nyc_311_requests WHERE unique_key IS NULL;") == [(2,)]
+
+    (first_id,), = query(dsn, "SELECT id FROM nyc_311_requests WHERE unique_key = '2';")
+    manager.insert_dataset("nyc_311_requests", [request("2", status="Closed")])
+    assert query(dsn, "SELECT id, status FROM nyc_311_requests WHERE unique_key = '2';") == [(first_id, "Closed")]
+    assert query(dsn, "SELECT COUNT(*) FROM nyc_311_requests;") == [(5,)]
+
+def test_copy_keeps_empty_strings_apart_from_nulls(dsn):
+    PostgresInsertManager(dsn, SCHEMA_PATH).insert_dataset("linknyc_status", [
+        {"site_id": "a", "address": "", "city": None, "latitude": 40.75, "longitude": -73.98},
+        {"site_id": "b", "address": 'Say "hi", world\nline 2', "latitude": 40.75, "longitude": -73.98},
+    ])
+    assert query(dsn, "SELECT address, city FROM linknyc_status WHERE site_id = 'a';") == [("", None)]
+    assert query(dsn, "SELECT address FROM linknyc_status WHERE site_id = 'b';") == [('Say "hi", world\nline 2',)]
+
+def test_watermark_commits_with_the_rows(dsn):
+    manager = PostgresInsertManager(dsn, SCHEMA_PATH)
+    manager.insert_dataset("nyc_permitted_events_historical", [{"event_id": "7"}, {"event_id": "12"}])
+    assert manager.get_watermark("nyc_permitted_events_historical") == "12"
+
+# ==========================
+# SCHEMA
+# ==========================
+def test_point_tables_get_a_generated_geom_column_with_a_gist_index(dsn):
+    assert query(dsn, """
+        SELECT is_generated, udt_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'nyc_311_requests' AND column_name = 'geom';
+    """) == [("ALWAYS", "geometry")]
+    indexes = [definition for (definition,) in query(
+        dsn, "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = 'nyc_311_requests';"
+    )]
+    assert any("USING gist (geom)" in definition for definition in indexes)
+    assert any("UNIQUE INDEX" in definition and "(unique_key)" in definition for definition in indexes)
+
+    PostgresInsertManager(dsn, SCHEMA_PATH).insert_dataset("nyc_311_requests", [request("1", lon=-73.9, lat=40.7)])
+    assert query(dsn, "SELECT ST_X(geom), ST_Y(geom), ST_SRID(geom) FROM nyc_311_requests;") == [(-73.9, 40.7, 4326)]
+
+# ==========================
+# PUSHED-DOWN QUERIES
+# ==========================
+def test_query_bbox_returns_only_points_inside(dsn):
+    PostgresInsertManager(dsn, SCHEMA_PATH).insert_dataset("nyc_311_requests", [
+        request("in", lon=-73.98, lat=40.75),
+        request("out", lon=-73.80, lat=40.75),
+        request("unlocated", lon=None, lat=None),
+    ])
+    gdf = PostGISProcessor(dsn).query_bbox("nyc_311_requests", -74.0, 40.7, -73.9, 40.8,
+                                           columns=["unique_key", "complaint_type"])
+    assert gdf["unique_key"].tolist() == ["in"]
+    assert gdf.crs == "EPSG:4326"
+    assert gdf.geometry.iloc[0].equals(shapely.Point(-73.98, 40.75))
+
+def test_event_density_in_db_counts_points_per_polygon(dsn):
+    PostgresInsertManager(dsn, SCHEMA_PATH).insert_dataset("nyc_311_requests", [
+        request("a", lon=-73.97, lat=40.77),
+        request("b", lon=-73.96, lat=40.78),
+        request("c", lon=-73.99, lat=40.69),
+        request("d", lon=-73.80, lat=40.60),
+    ])
+    parks = geopandas.GeoDataFrame(
+        {"name": ["Central", "Prospect", "Empty"]},
+        geometry=[shapely.box(-73.98, 40.76, -73.95, 40.80), shapely.box(-74.0, 40.68, -73.98, 40.70),
+                  shapely.box(-74.2, 40.5, -74.1, 40.55)],
+        crs="EPSG:4326",
+    )
+    counted = PostGISProcessor(dsn).calculate_event_density_in_db(parks, "nyc_311_requests")
+    assert counted["event_count"].tolist() == [2, 1, 0]
+
+    # Filters are pushed into the join; projected polygons are reprojected first
+    counted = PostGISProcessor(dsn).calculate_event_density_in_db(
+        parks.to_crs("EPSG:2263"), "nyc_311_requests", where="e.unique_key <> %s", params=["a"]
+    )
+    assert counted["event_count"].tolist() == [1, 1, 0]
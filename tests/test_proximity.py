@@ -0,0 +1,74 @@
+"""ProximityIndex incremental refresh against a temporary SQLite database."""
+import os
+import sqlite3
+import pytest
+from line_jb.data_ingestion.insert_manager import InsertManager
+from line_jb.geospatial.proximity import ProximityIndex
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "db", "schema.sql")
+
+NEAR = "POINT (-73.9800 40.7505)" # ~180 ft from the event
+FAR = "POINT (-73.9000 40.7000)"
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "proximity.db")
+    InsertManager.initialize_database(path, SCHEMA_PATH)
+    inserter = InsertManager(path)
+    inserter.insert_dataset("nyc_permitted_events_future", [{"event_id": "e1", "event_name": "Block party"}])
+    conn = sqlite3.connect(path)
+    with conn: # As the geocoding stage would place it
+        conn.execute("UPDATE nyc_permitted_events_future SET latitude = 40.75, longitude = -73.98;")
+    conn.close()
+    return path
+
+def store_trees(db_path, trees):
+    InsertManager(db_path).insert_dataset("nyc_tree_points", [
+        {"objectid": objectid, "riskrating": risk, "geometry": geometry} for objectid, risk, geometry in trees
+    ])
+
+def nearby_trees(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        """
+        SELECT t.objectid FROM event_nearby n JOIN nyc_tree_points t ON t.id = n.item_id
+        WHERE n.item_table = 'nyc_tree_points' ORDER BY t.objectid;
+        """
+    ).fetchall()
+    conn.close()
+    return [objectid for (objectid,) in rows]
+
+def test_refresh_follows_trees_updated_in_place(db_path):
+    index = ProximityIndex(db_path)
+    store_trees(db_path, [(1, "3", NEAR), (2, "0", NEAR), (3, "5", FAR)])
+    index.refresh()
+    assert nearby_trees(db_path) == [1]
+
+    # Re-fetched with new risk ratings: same rows, same ids
+    store_trees(db_path, [(1, "0", NEAR), (2, "2", NEAR), (3, "5", FAR)])
+    index.refresh()
+    assert nearby_trees(db_path) == [2]
+
+    # Moved away, and a new risky tree nearby
+    store_trees(db_path, [(2, "2", FAR), (4, "4", NEAR)])
+    index.refresh()
+    assert nearby_trees(db_path) == [4]
+
+def test_refresh_drops_deleted_trees(db_path):
+    index = ProximityIndex(db_path)
+    store_trees(db_path, [(1, "3", NEAR), (2, "3", NEAR)])
+    index.refresh()
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("DELETE FROM nyc_tree_points WHERE objectid = 1;")
+    conn.close()
+    index.refresh()
+    assert nearby_trees(db_path) == [2]
+
+def test_unchanged_upserts_mark_nothing(db_path):
+    store_trees(db_path, [(1, "3", NEAR)])
+    ProximityIndex(db_path).refresh()
+    store_trees(db_path, [(1, "3", NEAR)])
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM event_nearby_dirty_items;").fetchone() == (0,)
+    conn.close()
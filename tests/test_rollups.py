@@ -0,0 +1,114 @@
+"""ComplaintRollups and the rollup triggers against a GROUP BY over nyc_311_requests."""
+import os
+import sqlite3
+import pytest
+from line_jb.analytics.rollups import ComplaintRollups
+from line_jb.data_ingestion.insert_manager import InsertManager
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "db", "schema.sql")
+
+EXPECTED_HOURLY = """
+    SELECT created_epoch - created_epoch % 3600, COALESCE(complaint_type, 'N/A'), COALESCE(borough, 'N/A'), COUNT(*)
+    FROM nyc_311_requests WHERE created_epoch IS NOT NULL GROUP BY 1, 2, 3 ORDER BY 1, 2, 3;
+"""
+ACTUAL_HOURLY = """
+    SELECT hour_start, complaint_type, borough, request_count FROM nyc_311_hourly
+    WHERE request_count > 0 ORDER BY 1, 2, 3;
+"""
+EXPECTED_CELLS = """
+    SELECT created_epoch - created_epoch % 86400, COALESCE(complaint_type, 'N/A'), COALESCE(borough, 'N/A'),
+           CAST((latitude + 90) * 100 AS INTEGER) * 100000 + CAST((longitude + 180) * 100 AS INTEGER), COUNT(*)
+    FROM nyc_311_requests WHERE created_epoch IS NOT NULL AND latitude IS NOT NULL AND longitude IS NOT NULL
+    GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4;
+"""
+ACTUAL_CELLS = """
+    SELECT day_start, complaint_type, borough, cell_id, request_count FROM nyc_311_daily_cells
+    WHERE request_count > 0 ORDER BY 1, 2, 3, 4;
+"""
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "rollups.db")
+    InsertManager.initialize_database(path, SCHEMA_PATH)
+    return path
+
+def inserter(db_path):
+    manager = InsertManager(db_path)
+    manager.add_batch_hook("nyc_311_requests", ComplaintRollups(db_path).batch_hook)
+    return manager
+
+def request(key, complaint="Noise - Residential", borough="BROOKLYN", created="2026-01-05T10:15:00",
+            lat=40.71, lon=-73.95):
+    return {"unique_key": str(key), "complaint_type": complaint, "borough": borough,
+            "created_date": created, "latitude": lat, "longitude": lon}
+
+def assert_rollups_match(db_path):
+    conn = sqlite3.connect(db_path)
+    assert conn.execute(ACTUAL_HOURLY).fetchall() == conn.execute(EXPECTED_HOURLY).fetchall()
+    assert conn.execute(ACTUAL_CELLS).fetchall() == conn.execute(EXPECTED_CELLS).fetchall()
+    conn.close()
+
+def test_rollups_follow_inserts_upserts_and_deletes(db_path):
+    manager = inserter(db_path)
+    manager.insert_dataset("nyc_311_requests", [
+        request(1), request(2), request(3, complaint="Rodent"),
+        request(4, created="2026-01-05T11:59:59"), request(5, borough="QUEENS", lat=40.75, lon=-73.85),
+        request(6, lat=None, lon=None), # Counted hourly but in no cell
+        request(7, created=None),       # In neither
+    ])
+    assert_rollups_match(db_path)
+
+    # Re-fetched rows update in place: unchanged, recategorized, moved, re-dated
+    manager.insert_dataset("nyc_311_requests", [
+        request(1),
+        request(2, complaint="Rodent"),
+        request(3, complaint="Rodent", lat=40.80, lon=-73.96),
+        request(4, created="2026-01-06T09:00:00"),
+        request(7, created="2026-01-05T10:30:00"),
+        request(8, created="2026-01-07T23:00:00"), # New alongside the upserts
+    ])
+    assert_rollups_match(db_path)
+
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("DELETE FROM nyc_311_requests WHERE unique_key IN ('2', '5');")
+    conn.close()
+    assert_rollups_match(db_path)
+
+    rollups = ComplaintRollups(db_path)
+    top = rollups.top_complaint_types()
+    assert dict(zip(top["complaint_type"], top["request_count"])) == {"Noise - Residential": 5, "Rodent": 1}
+    daily = rollups.trend(freq="day")
+    assert daily["request_count"].tolist() == [4, 1, 1]
+    assert rollups.cell_counts()["request_count"].sum() == 5
+
+def test_update_catches_up_and_does_not_double_count(db_path):
+    InsertManager(db_path).insert_dataset("nyc_311_requests", [request(i) for i in range(5)]) # No hook
+    rollups = ComplaintRollups(db_path)
+    assert rollups.update() == 5
+    assert rollups.update() == 0
+    assert_rollups_match(db_path)
+
+def test_legacy_insert_trigger_is_dropped_on_first_fold(db_path):
+    conn = sqlite3.connect(db_path)
+    with conn: # The per-row insert trigger of databases built before the batch fold
+        conn.execute(
+            """
+            CREATE TRIGGER nyc_311_rollup_insert AFTER INSERT ON nyc_311_requests
+            WHEN NEW.created_epoch IS NOT NULL
+            BEGIN
+                INSERT INTO nyc_311_hourly (hour_start, complaint_type, borough, request_count)
+                VALUES (NEW.created_epoch - NEW.created_epoch % 3600, COALESCE(NEW.complaint_type, 'N/A'),
+                        COALESCE(NEW.borough, 'N/A'), 1)
+                ON CONFLICT(hour_start, complaint_type, borough) DO UPDATE SET request_count = request_count + 1;
+            END;
+            """
+        )
+    conn.close()
+    manager = inserter(db_path)
+    manager.insert_dataset("nyc_311_requests", [request(1), request(2)])
+    manager.insert_dataset("nyc_311_requests", [request(3), request(4)])
+    assert_rollups_match(db_path)
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'nyc_311_rollup_insert';").fetchall() == []
+    conn.close()
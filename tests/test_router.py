@@ -0,0 +1,83 @@
+"""CSRRouter A* with ALT landmarks against scipy's plain Dijkstra."""
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from line_jb.geospatial.router import CSRRouter
+
+def grid_router(size=12, seed=0):
+    """A size x size street grid, both directions per block, with random lengths and nuisance."""
+    rng = np.random.default_rng(seed)
+    src, dst = [], []
+    for r in range(size):
+        for c in range(size):
+            node = r * size + c
+            for other in ([node + 1] if c + 1 < size else []) + ([node + size] if r + 1 < size else []):
+                src += [node, other]
+                dst += [other, node]
+    src, dst = np.array(src), np.array(dst)
+    order = np.lexsort((dst, src))
+    src, dst = src[order], dst[order]
+    n = size * size
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(src, minlength=n))))
+    lengths = rng.uniform(50, 150, len(dst))
+    nuisance = np.where(rng.random(len(dst)) < 0.3, rng.uniform(0, 3, len(dst)), 0.0)
+    lons = -74.0 + np.tile(np.arange(size), size) * 0.001
+    lats = 40.7 + np.repeat(np.arange(size), size) * 0.001
+    return CSRRouter(np.arange(n) + 1000, lons, lats, indptr, dst, lengths, nuisance)
+
+def dijkstra_path(router, source, target, avoidance):
+    weights = router.lengths * (1.0 + avoidance * router.nuisance)
+    matrix = csr_matrix((weights, router.indices, router.indptr), shape=(len(router.node_ids),) * 2)
+    costs, predecessors = dijkstra(matrix, indices=source, return_predecessors=True)
+    path = [target]
+    while path[-1] != source:
+        path.append(predecessors[path[-1]])
+    return path[::-1], costs[target]
+
+@pytest.mark.parametrize("landmarks", [False, True])
+@pytest.mark.parametrize("avoidance", [0.0, 1.0, 5.0])
+def test_a_star_matches_dijkstra(landmarks, avoidance):
+    router = grid_router()
+    if landmarks:
+        router.precompute_landmarks(count=4)
+    rng = np.random.default_rng(1)
+    for source, target in rng.integers(0, len(router.node_ids), (25, 2)):
+        path, cost, length_m = router.shortest_path(int(source), int(target), avoidance=avoidance)
+        expected_path, expected_cost = dijkstra_path(router, int(source), int(target), avoidance)
+        assert path == expected_path
+        assert cost == pytest.approx(expected_cost)
+        edges = [router.lengths[e] for a, b in zip(path, path[1:])
+                 for e in range(router.indptr[a], router.indptr[a + 1]) if router.indices[e] == b]
+        assert length_m == pytest.approx(sum(edges))
+
+def test_unreachable_target_returns_none():
+    router = CSRRouter([1, 2, 3], [0.0, 0.1, 0.2], [0.0, 0.0, 0.0], [0, 1, 1, 1], [1], [10.0])
+    router.precompute_landmarks(count=2)
+    assert router.shortest_path(0, 2) is None
+    assert router.shortest_path(0, 1)[0] == [0, 1]
+
+def test_saved_router_loads_the_same_routes(tmp_path):
+    router = grid_router()
+    router.precompute_landmarks(count=4)
+    path = str(tmp_path / "router.npz")
+    router.save(path)
+    loaded = CSRRouter.load(path)
+    assert loaded.shortest_path(0, 143, avoidance=2.0) == router.shortest_path(0, 143, avoidance=2.0)
+    assert list(tmp_path.iterdir()) == [tmp_path / "router.npz"]
+
+def test_score_refresh_keeps_the_parallel_edge_built_from():
+    graph = nx.MultiDiGraph(crs="EPSG:4326")
+    for node, x in ((1, -74.0), (2, -73.999)):
+        graph.add_node(node, x=x, y=40.7)
+    graph.add_edge(1, 2, key=0, length=120.0)
+    graph.add_edge(1, 2, key=1, length=80.0) # Shorter: this is the edge the router keeps
+    graph.add_edge(2, 1, key=0, length=100.0)
+    scores = pd.Series([5.0, 0.5, 0.0], index=pd.MultiIndex.from_tuples([(1, 2, 0), (1, 2, 1), (2, 1, 0)]))
+
+    built = CSRRouter.from_osmnx(graph, edge_scores=scores)
+    refreshed = CSRRouter.from_osmnx(graph)
+    refreshed.set_nuisance(scores)
+    assert built.nuisance.tolist() == refreshed.nuisance.tolist() == [0.5, 0.0]
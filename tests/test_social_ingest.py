@@ -0,0 +1,92 @@
+"""
+SocialIngestWorker against a stub client and a temporary SQLite database,
+with the token bucket on a fake clock so rate-limit waits are exact and
+instant.
+"""
+import os
+import sqlite3
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from line_jb.data_ingestion.insert_manager import InsertManager
+from line_jb.data_ingestion.social_ingest import SocialIngestWorker, TokenBucket
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "db", "schema.sql")
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class StubClient:
+    """Answers hashtag_medias_recent like instagrapi; hashtags in `failing` raise."""
+    def __init__(self, posts, failing=()):
+        self.posts = posts
+        self.failing = set(failing)
+        self.calls = []
+
+    def hashtag_medias_recent(self, hashtag, amount=50):
+        self.calls.append(hashtag)
+        if hashtag in self.failing:
+            raise RuntimeError("rate limited")
+        return self.posts.get(hashtag, [])[:amount]
+
+def media(pk, caption, user="someone", lat=None, lng=None):
+    return SimpleNamespace(
+        pk=pk, code=f"c{pk}", caption_text=caption, taken_at=datetime(2026, 1, 1, 12, 0),
+        user=SimpleNamespace(username=user), like_count=3, comment_count=1, media_type=1,
+        location=SimpleNamespace(lat=lat, lng=lng) if lat is not None else None,
+    )
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "social.db")
+    InsertManager.initialize_database(path, SCHEMA_PATH)
+    return path
+
+def test_worker_stores_posts_reports_failures_and_waits_for_tokens(db_path):
+    client = StubClient({
+        "nyc": [media(1, "Hello #nyc", lat=40.75, lng=-73.98), media(2, "Bridge")],
+        "brooklyn": [media(2, "Bridge"), media(3, "Park")], # Post 2 also tagged here: stored once
+        "queens": [media(4, "Food")],
+        "empty": [],
+    }, failing={"bronx"})
+    clock = FakeClock()
+    worker = SocialIngestWorker(InsertManager(db_path), [client], max_workers=1)
+    worker.buckets = [TokenBucket(rate=0.5, capacity=2, clock=clock, sleep=clock.sleep)]
+
+    stats = worker.run(["#nyc", "brooklyn", "bronx", "queens", "empty"])
+
+    assert stats["failed_hashtags"] == ["bronx"]
+    assert sorted(client.calls) == ["bronx", "brooklyn", "empty", "nyc", "queens"]
+    # Burst of 2, then one token every 2s for the other 3 calls (failed fetches spend one too)
+    assert clock.sleeps == pytest.approx([2.0, 2.0, 2.0])
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT post_id, platform, content, url, latitude, longitude FROM social_posts ORDER BY post_id;"
+    ).fetchall()
+    conn.close()
+    assert [row[0] for row in rows] == ["1", "2", "3", "4"]
+    assert rows[0] == ("1", "instagram", "Hello #nyc", "https://www.instagram.com/p/c1/", 40.75, -73.98)
+    assert rows[1][4:] == (None, None)
+
+def test_token_bucket_refills_while_idle():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1.0, capacity=3, clock=clock, sleep=clock.sleep)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.acquire() == pytest.approx(1.0)
+    clock.now += 10.0 # Idle time refills up to capacity, not beyond
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.acquire() == pytest.approx(1.0)
+
+def test_worker_needs_a_client():
+    with pytest.raises(ValueError):
+        SocialIngestWorker(InsertManager(":memory:"), [])
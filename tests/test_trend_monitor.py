@@ -0,0 +1,45 @@
+"""TrendMonitor progress and saved detector state across runs, against a temporary SQLite database."""
+import os
+import pytest
+from line_jb.analytics.streaming import TrendMonitor
+from line_jb.data_ingestion.insert_manager import InsertManager
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "db", "schema.sql")
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "trends.db")
+    InsertManager.initialize_database(path, SCHEMA_PATH)
+    return path
+
+def complaints(start, stop):
+    return [{"unique_key": str(i), "complaint_type": "Noise", "created_date": "2026-01-01T10:00:00"}
+            for i in range(start, stop)]
+
+def run(db_path, state_path, records, save=True):
+    monitor = TrendMonitor(db_path, state_path=state_path)
+    inserter = InsertManager(db_path)
+    inserter.add_batch_hook("nyc_311_requests", monitor.batch_hook)
+    inserter.insert_dataset("nyc_311_requests", records)
+    if save:
+        monitor.save()
+    return monitor
+
+def noise_count(monitor):
+    detector = monitor.detectors["nyc_311_requests"]
+    return sum(bucket.heavy.counts.get("NOISE", 0) for bucket in detector.open_buckets.values())
+
+def test_upserts_are_counted_once(db_path, tmp_path):
+    state_path = str(tmp_path / "state.pkl")
+    run(db_path, state_path, complaints(0, 20))
+    monitor = run(db_path, state_path, [dict(r, status="Closed") for r in complaints(0, 20)])
+    assert noise_count(monitor) == 20
+
+def test_rows_stored_after_the_last_save_are_fed_again(db_path, tmp_path):
+    state_path = str(tmp_path / "state.pkl")
+    run(db_path, state_path, complaints(0, 20))
+    run(db_path, state_path, complaints(20, 30), save=False) # Crashed before saving its state
+    monitor = run(db_path, state_path, complaints(30, 35))
+    assert noise_count(monitor) == 35
+    assert monitor.fed_ids["nyc_311_requests"] == 35
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]